@@ -35,6 +35,22 @@ import {
 } from '@mui/icons-material';
 import axios from 'axios';
 
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_TIMEOUT_MS = 120000;
+
+// Poll a background job until it succeeds or fails
+async function waitForJob(jobId) {
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const { data } = await axios.get(`/jobs/${jobId}`);
+    if (data.status === 'succeeded' || data.status === 'failed') {
+      return data;
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+  return { status: 'failed', error: 'Verification is taking longer than expected; try again shortly' };
+}
+
 function ApplicationReviewDialog({ open, onClose, applicationId, user }) {
   const [application, setApplication] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -116,11 +132,18 @@ function ApplicationReviewDialog({ open, onClose, applicationId, user }) {
         {}
       );
       
-      if (response.data.success) {
-        setVerificationResults(response.data.verification_results);
+      if (!response.data.success) {
+        setError(response.data.message || 'Verification failed');
+        return;
+      }
+
+      // Verification runs as a background job; poll until it finishes
+      const job = await waitForJob(response.data.job_id);
+      if (job.status === 'succeeded') {
+        setVerificationResults(job.result.verification_results);
         await fetchApplicationDetails(); // Refresh to get updated data
       } else {
-        setError(response.data.message || 'Verification failed');
+        setError(job.error || 'Verification failed');
       }
     } catch (err) {
       setError(err.response?.data?.detail || 'Failed to verify document');
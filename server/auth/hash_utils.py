@@ -1,28 +1,125 @@
+"""
+Password hashing.
+
+bcrypt is deliberately slow (~200 ms per hash at the default cost), so the
+API never runs it on the event loop: ``hash_password_async`` and
+``verify_password_async`` hand the work to a small thread pool (bcrypt
+releases the GIL) and at most ``BCRYPT_MAX_CONCURRENCY`` operations run at
+once; further logins wait their turn without blocking other requests.
+
+The cost factor is calibrated once at startup (``calibrate_rounds``) to the
+largest value whose hash time stays under ``BCRYPT_TARGET_MS``, unless
+``BCRYPT_ROUNDS`` pins it. Hashes with a lower cost are upgraded on the
+next successful login (``needs_rehash``); hashes are never downgraded, so
+workers that calibrated to different costs cannot rehash the same password
+back and forth.
+
+The synchronous ``hash_password``/``verify_password`` remain for CLI scripts.
+"""
+
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import bcrypt
 
-def hash_password(password: str) -> str:
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "14"))
+BCRYPT_MAX_CONCURRENCY = int(os.getenv("BCRYPT_MAX_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+_PINNED_ROUNDS = os.getenv("BCRYPT_ROUNDS")
+
+# Current cost factor; replaced by calibrate_rounds() at startup
+rounds = int(_PINNED_ROUNDS) if _PINNED_ROUNDS else 12
+
+_executor: Optional[ThreadPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _encode(password: str) -> bytes:
+    # bcrypt only uses the first 72 bytes
+    data = password.encode('utf-8')
+    return data[:72]
+
+
+def hash_password(password: str, cost: Optional[int] = None) -> str:
     """Hash a password for storing in the database"""
     try:
-        # Ensure password is not longer than 72 bytes for bcrypt
-        if len(password.encode('utf-8')) > 72:
-            password = password[:72]
-        
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds=cost or rounds)).decode('utf-8')
     except Exception as e:
         print(f"Password hashing error: {e}")
         raise e
 
+
 def verify_password(password: str, hashed: str) -> bool:
     """Verify a plaintext password against its hash"""
     try:
-        # Ensure password is not longer than 72 bytes for bcrypt
-        if len(password.encode('utf-8')) > 72:
-            password = password[:72]
-        
         return bcrypt.checkpw(
-            password.encode('utf-8'), 
+            _encode(password),
             hashed.encode('utf-8') if isinstance(hashed, str) else hashed
         )
     except Exception as e:
         print(f"Password verification error: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12)"""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str) -> bool:
+    cost = hash_rounds(hashed)
+    return cost is None or cost < rounds
+
+
+def calibrate_rounds(target_ms: float = BCRYPT_TARGET_MS) -> int:
+    """Pick the largest cost whose hash time stays under target_ms"""
+    global rounds
+    if _PINNED_ROUNDS:
+        return rounds
+    start = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=BCRYPT_MIN_ROUNDS))
+    elapsed_ms = max((time.perf_counter() - start) * 1000, 0.001)
+    # Each extra round doubles the work
+    extra = int(math.floor(math.log2(target_ms / elapsed_ms))) if target_ms > elapsed_ms else 0
+    rounds = max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, BCRYPT_MIN_ROUNDS + extra))
+    print(f"🔐 bcrypt cost {rounds} (~{elapsed_ms * 2 ** (rounds - BCRYPT_MIN_ROUNDS):.0f}ms per hash)")
+    return rounds
+
+
+async def _run(func, *args):
+    global _executor, _semaphore
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, BCRYPT_MAX_CONCURRENCY), thread_name_prefix="bcrypt")
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, BCRYPT_MAX_CONCURRENCY))
+    async with _semaphore:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await _run(verify_password, password, hashed)
+
+
+async def calibrate() -> int:
+    """Calibrate the cost factor off the event loop (called from the lifespan)"""
+    return await _run(calibrate_rounds)
+
+
+def shutdown() -> None:
+    global _executor, _semaphore
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = None
+    _semaphore = None
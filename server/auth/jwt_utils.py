@@ -1,11 +1,15 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-import bcrypt
 from fastapi import HTTPException, status
+import hashlib
 import os
+import threading
+import time
 from pathlib import Path
 from dotenv import load_dotenv
+from auth import hash_utils
 
 # Always load env from server/.env (single source of truth)
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
@@ -14,35 +18,77 @@ load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-super-secret-jwt-key-change-this-in-production")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Decoded-claims cache size (0 disables caching)
+JWT_CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "10000"))
+
+
+class ClaimsCache:
+    """Bounded LRU of decoded token claims, each valid until the token's exp.
+
+    Keyed by a SHA-256 digest of the token so raw bearer tokens are not kept
+    in memory. Only tokens that passed signature verification are stored, so
+    a hit skips jose's signature check and claim parsing entirely. Safe to use
+    from FastAPI's threadpool (sync dependencies run there).
+    """
+
+    def __init__(self, max_size: int = JWT_CLAIMS_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        if self.max_size <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return dict(payload)
+
+    def put(self, token: str, payload: dict) -> None:
+        exp = payload.get("exp")
+        if self.max_size <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (dict(payload), float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+claims_cache = ClaimsCache()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plaintext password against its hash"""
-    try:
-        # Ensure password is not longer than 72 bytes for bcrypt
-        if len(plain_password.encode('utf-8')) > 72:
-            plain_password = plain_password[:72]
-        
-        return bcrypt.checkpw(
-            plain_password.encode('utf-8'), 
-            hashed_password.encode('utf-8') if isinstance(hashed_password, str) else hashed_password
-        )
-    except Exception as e:
-        print(f"Password verification error: {e}")
-        return False
+    """Verify a plaintext password against its hash (blocking; see hash_utils)"""
+    return hash_utils.verify_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash a password for storing in the database"""
-    try:
-        # Ensure password is not longer than 72 bytes for bcrypt
-        if len(password.encode('utf-8')) > 72:
-            password = password[:72]
-        
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return hashed.decode('utf-8')
-    except Exception as e:
-        print(f"Password hashing error: {e}")
-        raise e
+    """Hash a password for storing in the database (blocking; see hash_utils)"""
+    return hash_utils.hash_password(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a new JWT access token"""
@@ -57,7 +103,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 def verify_token(token: str):
-    """Verify and decode a JWT token"""
+    """Verify and decode a JWT token (signature checked once per token)"""
+    cached = claims_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -67,6 +116,7 @@ def verify_token(token: str):
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        claims_cache.put(token, payload)
         return payload
     except JWTError:
         raise HTTPException(
@@ -81,5 +131,6 @@ def get_current_user_from_token(token: str):
     return {
         "username": payload.get("sub"),
         "role": payload.get("role"),
-        "exp": payload.get("exp")
+        "exp": payload.get("exp"),
+        "claims_version": payload.get("cv", 0)
     }
@@ -1,16 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends, Form
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Form
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import timedelta
 from .models import SignupRequest, LoginRequest
 from .jwt_utils import (
-    verify_password, 
-    get_password_hash, 
     create_access_token, 
     verify_token, 
     get_current_user_from_token,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from config.db import users_collection
+from config.async_db import users_collection
+from services import counters
+from .user_claims import user_claims
+from .hash_utils import hash_password_async, verify_password_async, needs_rehash
 
 router = APIRouter()
 security = HTTPBearer()
@@ -30,27 +31,48 @@ def map_role(old_role: str) -> str:
     }
     return role_mapping.get(old_role, old_role)
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current user from JWT token"""
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Get current user from JWT token, with the role as of the latest admin change"""
     token = credentials.credentials
     user_data = get_current_user_from_token(token)
+    state = await user_claims.current(user_data["username"], user_data.pop("claims_version", 0))
+    if state is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_data["role"] = map_role(state[1])
     return user_data
 
-def authenticate(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def authenticate(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Authenticate user using JWT token (for backward compatibility)"""
-    return get_current_user(credentials)
+    return await get_current_user(credentials)
+
+async def rehash_password(username: str, password: str, old_hash: str):
+    """Upgrade a stored hash to the current bcrypt cost (runs after the response)"""
+    try:
+        new_hash = await hash_password_async(password)
+        # Conditional on the old hash so a concurrent password change wins
+        await users_collection.update_one(
+            {"username": username, "password": old_hash}, {"$set": {"password": new_hash}}
+        )
+    except Exception as e:
+        print(f"Password rehash failed for {username}: {e}")
 
 @router.post("/login")
-async def login(username: str = Form(...), password: str = Form(...)):
+async def login(background_tasks: BackgroundTasks, username: str = Form(...), password: str = Form(...)):
     """Login endpoint that returns JWT token"""
     # Find user in database
-    user = users_collection.find_one({"username": username})
-    if not user or not verify_password(password, user['password']):
+    user = await users_collection.find_one({"username": username})
+    if not user or not await verify_password_async(password, user['password']):
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if needs_rehash(user['password']):
+        background_tasks.add_task(rehash_password, user["username"], password, user['password'])
     
     # Map the role to the new system
     mapped_role = map_role(user["role"])
@@ -58,7 +80,7 @@ async def login(username: str = Form(...), password: str = Form(...)):
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["username"], "role": mapped_role}, 
+        data={"sub": user["username"], "role": mapped_role, "cv": user.get("claims_version", 0)}, 
         expires_delta=access_token_expires
     )
     
@@ -75,9 +97,9 @@ async def login(username: str = Form(...), password: str = Form(...)):
     }
 
 @router.post("/signup") 
-def signup(req: SignupRequest):
+async def signup(req: SignupRequest):
     """Signup endpoint to create new user"""
-    if users_collection.find_one({"username": req.username}):
+    if await users_collection.find_one({"username": req.username}):
         raise HTTPException(status_code=400, detail="User already exists")
 
     requested_role = map_role(req.role)
@@ -85,11 +107,12 @@ def signup(req: SignupRequest):
         if not req.security_code or req.security_code != "0345":
             raise HTTPException(status_code=403, detail="Invalid or missing admin security code")
     
-    users_collection.insert_one({
+    await users_collection.insert_one({
         "username": req.username,
-        "password": get_password_hash(req.password),
+        "password": await hash_password_async(req.password),
         "role": requested_role
     })
+    await counters.user_created(requested_role)
     return {"message": "User created successfully"}
 
 @router.get("/me")
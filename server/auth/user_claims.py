@@ -0,0 +1,103 @@
+"""
+Versioned user-claims cache.
+
+Access tokens carry the role that was current at login plus the user's
+``claims_version`` (``cv`` claim). Admin mutations that change what a token
+grants (role changes) increment ``users.claims_version`` and update this
+process's cache in the same request, so the change applies to existing
+tokens immediately.
+
+Per request, ``get_current_user`` asks :meth:`UserClaimsCache.current` for the
+user's live state:
+
+- cached entry with the token's version: answered from memory (the common case)
+- cached entry newer than the token: answered from memory with the newer role
+- token newer than the entry, no entry, or entry older than
+  ``USER_CLAIMS_CACHE_TTL_S``: one ``users`` read, shared by concurrent
+  requests for the same user
+
+The TTL bounds how long another worker's change can go unnoticed; a deleted
+user is cached as absent and rejected.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config.async_db import users_collection
+
+USER_CLAIMS_CACHE_TTL_S = float(os.getenv("USER_CLAIMS_CACHE_TTL_S", "60"))
+USER_CLAIMS_CACHE_SIZE = int(os.getenv("USER_CLAIMS_CACHE_SIZE", "10000"))
+
+# (claims_version, role) of an existing user, or None for a missing one
+UserState = Optional[Tuple[int, Optional[str]]]
+
+
+class UserClaimsCache:
+    """In-process map of username -> (claims_version, role)"""
+
+    def __init__(self, ttl_s: float = USER_CLAIMS_CACHE_TTL_S, max_size: int = USER_CLAIMS_CACHE_SIZE):
+        self.ttl_s = ttl_s
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[str, Tuple[UserState, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "refetches": 0, "coalesced": 0}
+
+    def _store(self, username: str, state: UserState) -> None:
+        self._entries[username] = (state, time.monotonic())
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _fetch(self, username: str) -> UserState:
+        doc = await users_collection.find_one(
+            {"username": username}, {"_id": 0, "role": 1, "claims_version": 1}
+        )
+        state = None if doc is None else (int(doc.get("claims_version") or 0), doc.get("role"))
+        self._store(username, state)
+        self.stats["refetches"] += 1
+        return state
+
+    async def current(self, username: str, token_version: int = 0) -> UserState:
+        """Live (claims_version, role) of a user, or None if the user is gone"""
+        entry = self._entries.get(username)
+        if entry is not None:
+            state, fetched_at = entry
+            fresh = time.monotonic() - fetched_at < self.ttl_s
+            if fresh and (state is None or state[0] >= token_version):
+                self._entries.move_to_end(username)
+                self.stats["hits"] += 1
+                return state
+
+        pending = self._inflight.get(username)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[username] = future
+        try:
+            state = await self._fetch(username)
+            future.set_result(state)
+            return state
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged as lost
+            future.exception()
+            raise
+        finally:
+            del self._inflight[username]
+
+    def bump(self, username: str, claims_version: int, role: Any) -> None:
+        """Record a mutation made by this process (admin role change)"""
+        self._store(username, (claims_version, getattr(role, "value", role)))
+
+    def forget(self, username: str) -> None:
+        self._entries.pop(username, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+user_claims = UserClaimsCache()
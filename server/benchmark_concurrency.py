@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the API server.
+
+Fires a fixed number of authenticated GET requests at one or more endpoints
+from a pool of client threads and reports throughput and latency percentiles.
+Run it against a single uvicorn worker before and after a change, e.g.:
+
+    uvicorn main:app --workers 1 --port 8000
+    python benchmark_concurrency.py --username analyst1 --password password123 \
+        --path /analyst/dashboard --concurrency 32 --requests 640 --label async
+
+With blocking database calls inside ``async def`` handlers the worker serializes
+every request, so throughput stays flat as --concurrency grows; with the async
+data-access layer it should scale until the database or CPU saturates.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def login(base_url: str, username: str, password: str) -> str:
+    """Obtain a JWT access token via the form-encoded login endpoint"""
+    body = urllib.parse.urlencode({"username": username, "password": password}).encode()
+    req = urllib.request.Request(f"{base_url}/auth/login", data=body, method="POST")
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        return json.loads(resp.read())["access_token"]
+
+
+def timed_get(url: str, token: str) -> tuple:
+    """Return (latency_seconds, status_code) for a single GET"""
+    req = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return time.perf_counter() - start, status
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def run(base_url: str, token: str, paths, concurrency: int, total: int) -> dict:
+    urls = [f"{base_url}{paths[i % len(paths)]}" for i in range(total)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda u: timed_get(u, token), urls))
+    elapsed = time.perf_counter() - started
+
+    latencies = [lat for lat, _ in results]
+    errors = len([s for _, s in results if s < 200 or s >= 400])
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2),
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent request benchmark")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="Endpoint path to hit (repeatable); defaults to /auth/me")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="One or more client concurrency levels to sweep")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--label", default="", help="Tag included in the JSON output (e.g. sync/async)")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON only")
+    args = parser.parse_args()
+
+    paths = args.paths or ["/auth/me"]
+    token = login(args.base_url, args.username, args.password)
+
+    # Warm up connection pools and caches so the first level is not penalized
+    run(args.base_url, token, paths, 1, min(10, args.requests))
+
+    report = {"label": args.label, "paths": paths, "levels": []}
+    for level in args.concurrency:
+        result = run(args.base_url, token, paths, level, args.requests)
+        report["levels"].append(result)
+        if not args.json:
+            lat = result["latency_ms"]
+            print(f"[{args.label or 'run'}] c={level:<4} {result['throughput_rps']:>8} req/s  "
+                  f"p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms errors={result['errors']}")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
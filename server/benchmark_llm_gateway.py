@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the support-chat LLM gateway (services/llm_gateway.py).
+
+Runs the gateway against the fake backend (no network, no API key) and fires
+a burst of support messages drawn from a small pool, so repeats exercise the
+response cache and simultaneous duplicates exercise in-flight coalescing.
+Reports latency percentiles, throughput and how many calls reached the
+backend. Compare runs by varying the concurrency cap or disabling the cache:
+
+    python benchmark_llm_gateway.py --requests 500 --concurrency 100
+    python benchmark_llm_gateway.py --requests 500 --concurrency 100 --no-cache
+    python benchmark_llm_gateway.py --max-in-flight 2 --latency-ms 500 --timeout-s 1
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.llm_gateway import LLMGateway
+
+MESSAGES = [
+    "How do I check my application status?",
+    "how do i check my   application status",
+    "How do I upload documents?",
+    "My token expired, what should I do?",
+    "Who reviews my application after I submit it?",
+    "How is the premium decided?",
+    "Can I edit an application after submitting?",
+    "What documents are required for life insurance?",
+]
+ROLES = ["customer", "analyst", "underwriter"]
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+async def run(args) -> int:
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "LLM_FAKE_LATENCY_MS": str(args.latency_ms),
+        "LLM_MAX_CONCURRENCY": str(args.max_in_flight),
+        "LLM_TIMEOUT_S": str(args.timeout_s),
+        "LLM_CACHE_SIZE": "0" if args.no_cache else "1000",
+    })
+    # Point the gateway at an empty env file so server/.env cannot override the fake backend
+    env_file = Path(tempfile.mkstemp(suffix=".env")[1])
+    gateway = LLMGateway(env_path=env_file)
+    gateway.reload_config(force=True)
+
+    rng = random.Random(args.seed)
+    workload = [(rng.choice(MESSAGES), rng.choice(ROLES)) for _ in range(args.requests)]
+    limiter = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    fallbacks = 0
+
+    async def one(message: str, role: str) -> None:
+        nonlocal fallbacks
+        async with limiter:
+            start = time.perf_counter()
+            answer = await gateway.complete(message, role, "benchmark system prompt", context="ctx")
+            latencies.append(time.perf_counter() - start)
+            if answer is None:
+                fallbacks += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(m, r) for m, r in workload))
+    elapsed = time.perf_counter() - start
+    backend_calls = gateway._backend.calls if gateway._backend is not None else 0
+    await gateway.stop()
+    env_file.unlink(missing_ok=True)
+
+    print(f"📊 {args.requests} requests, client concurrency {args.concurrency}, "
+          f"cap {args.max_in_flight}, backend latency {args.latency_ms}ms")
+    print(f"   throughput: {args.requests / elapsed:.1f} req/s ({elapsed:.2f}s total)")
+    print(f"   latency ms: p50={percentile(latencies, 50) * 1000:.1f} "
+          f"p95={percentile(latencies, 95) * 1000:.1f} "
+          f"max={max(latencies) * 1000:.1f} mean={statistics.mean(latencies) * 1000:.1f}")
+    print(f"   backend calls: {backend_calls}  cache hits: {gateway.stats['cache_hits']}  "
+          f"coalesced: {gateway.stats['coalesced']}  timeouts: {gateway.stats['timeouts']}  "
+          f"fallbacks: {fallbacks}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the LLM gateway with the fake backend")
+    parser.add_argument("--requests", type=int, default=200, help="Total messages to send")
+    parser.add_argument("--concurrency", type=int, default=50, help="Messages in flight from the client side")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="Gateway concurrency cap (LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Fake backend latency per call")
+    parser.add_argument("--timeout-s", type=float, default=10, help="Gateway deadline per call (LLM_TIMEOUT_S)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache")
+    parser.add_argument("--seed", type=int, default=7, help="Workload random seed")
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import os
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo.server_api import ServerApi
+
+# Settings come from config/db.py, which performs no network I/O on import
+from config.db import MONGO_URI, DB_NAME, USE_MOCK_DB, client as sync_client
+
+# Async (Motor) counterpart of config/db.py used by the FastAPI request path.
+# The synchronous module stays in place for CLI scripts; route handlers and
+# ApplicationService must use the collections exposed here so that database
+# round trips yield to the event loop instead of blocking the worker.
+
+import certifi
+
+if USE_MOCK_DB:
+    # Same process-wide storage as config/db.py, behind Motor's call shape
+    from config.memory_db import AsyncMemoryClient, AsyncMemoryGridFSBucket
+
+    client = AsyncMemoryClient(sync_client)
+else:
+    # Motor does not open sockets until the first operation, so importing this
+    # module is free; the pool is shared by every coroutine in the worker.
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        server_api=ServerApi('1'),
+        connectTimeoutMS=30000,
+        socketTimeoutMS=45000,
+        serverSelectionTimeoutMS=30000,
+        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        tls=True,
+        tlsCAFile=certifi.where(),
+    )
+
+db = client[DB_NAME]
+
+# Core collections
+users_collection = db["users"]
+applications_collection = db["applications"]
+documents_collection = db["documents"]
+messages_collection = db["messages"]
+audit_events_collection = db["audit_events"]
+payments_collection = db["payments"]
+counters_collection = db["counters"]
+compliance_issues_collection = db["compliance_issues"]
+jobs_collection = db["jobs"]
+extraction_cache_collection = db["extraction_cache"]
+
+
+def get_gridfs_bucket() -> AsyncIOMotorGridFSBucket:
+    """GridFS bucket bound to the async database (default 'fs' prefix)."""
+    if USE_MOCK_DB:
+        return AsyncMemoryGridFSBucket(db)
+    return AsyncIOMotorGridFSBucket(db)
+
+
+async def connect() -> None:
+    """Open the pool and verify connectivity once per worker (FastAPI lifespan).
+
+    Index management is intentionally absent here: run migrate_indexes.py as a
+    deploy step so worker boot costs a single ping instead of ~20 round trips.
+    """
+    print("🔄 Connecting to MongoDB...")
+    try:
+        await client.admin.command('ping')
+        print("✅ Successfully connected to MongoDB!")
+    except Exception as e:
+        print(f"❌ MongoDB connection failed: {e}")
+        raise
+
+
+def close() -> None:
+    """Release both the async pool and the lazily-created sync pool"""
+    client.close()
+    sync_client.close()
@@ -0,0 +1,155 @@
+"""
+Declared MongoDB indexes and an idempotent migration planner.
+
+Indexes used to be created with ~20 ``create_index`` calls every time
+config/db.py was imported. They are now declared here once and applied by
+``migrate_indexes.py`` (a deploy step), which compares the declaration against
+``list_indexes()`` and only issues the commands that are actually needed.
+"""
+
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# Per-collection index declarations. Index names are left to MongoDB's default
+# naming (``field_1``) so they line up with indexes created by older builds.
+#
+# Compound indexes follow the equality-sort-range rule for the query shapes in
+# config/query_shapes.py; a single-field index whose field is the prefix of a
+# compound index is redundant and is not declared (``migrate_indexes.py
+# --prune`` removes the old copies). Run ``index_advisor.py`` after adding a
+# query to confirm it is covered.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("role", ASCENDING)]),
+    ],
+    "applications": [
+        # Point lookups by application id (every detail/transition endpoint)
+        IndexModel([("id", ASCENDING)]),
+        # Customer dashboard: draft lookup and non-draft list
+        IndexModel([("customer_id", ASCENDING), ("status", ASCENDING)]),
+        # /application-status: latest application for a customer
+        IndexModel([("customer_id", ASCENDING), ("created_at", DESCENDING)]),
+        # Analyst queue: submitted and not yet input_ready
+        IndexModel([("status", ASCENDING), ("input_ready", ASCENDING)]),
+        # Underwriter queue $or branch on workflow state
+        IndexModel([("state", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)]),
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    "documents": [
+        IndexModel([("id", ASCENDING)]),
+        # Detail pages list by application; verification takes the newest upload
+        IndexModel([("application_id", ASCENDING), ("uploaded_at", DESCENDING)]),
+        IndexModel([("type", ASCENDING)]),
+        IndexModel([("uploaded_at", ASCENDING)]),
+    ],
+    "messages": [
+        # Customer dashboard: messages addressed to the customer per application
+        IndexModel([("application_id", ASCENDING), ("to_role", ASCENDING)]),
+        IndexModel([("from_role", ASCENDING)]),
+        IndexModel([("to_role", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)]),
+    ],
+    "audit_events": [
+        # Status and auditor timelines: events of one application in order
+        IndexModel([("application_id", ASCENDING), ("created_at", ASCENDING)]),
+        # Knowledge-document listing (action=document_upload, newest first)
+        IndexModel([("action", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("actor_role", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("document_id", ASCENDING)], sparse=True),
+        IndexModel([("created_at", ASCENDING)]),
+    ],
+    "compliance_issues": [
+        # One record per audit event and missing field (scanner upserts on this)
+        IndexModel([("event_oid", ASCENDING), ("field", ASCENDING)], unique=True),
+        # Integrity check: recorded issues, newest first
+        IndexModel([("detected_at", DESCENDING)]),
+    ],
+    "jobs": [
+        # Status polling by job id
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Repeated submissions resolve to the same job
+        IndexModel([("idempotency_key", ASCENDING)], unique=True, sparse=True),
+        # Runner: oldest due queued job, and running jobs whose lease expired
+        IndexModel([("status", ASCENDING), ("run_after", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)]),
+    ],
+    "extraction_cache": [
+        # Lookup by content hash + extractor version + filename/type digest
+        IndexModel([("key", ASCENDING)], unique=True),
+    ],
+    "payments": [
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+}
+
+# Options that change index semantics; anything else (v, ns, background) is ignored
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _normalize(index_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce an index document (declared or from list_indexes) to a comparable form"""
+    return {
+        # Older servers report directions as floats (1.0); compare numerically
+        "key": [
+            (field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in index_doc["key"].items()
+        ],
+        "options": {k: index_doc[k] for k in _COMPARED_OPTIONS if index_doc.get(k)},
+    }
+
+
+def plan_migration(db) -> Dict[str, Dict[str, List[Any]]]:
+    """Compare declared indexes with the live ones.
+
+    Returns ``{collection: {"create": [IndexModel], "rebuild": [IndexModel],
+    "extra": [name]}}`` containing only collections that need attention.
+    One ``listIndexes`` round trip is made per collection.
+    """
+    plan: Dict[str, Dict[str, List[Any]]] = {}
+    for coll_name, models in INDEXES.items():
+        existing = {ix["name"]: ix for ix in db[coll_name].list_indexes()}
+        create: List[IndexModel] = []
+        rebuild: List[IndexModel] = []
+        declared_names = set()
+        for model in models:
+            name = model.document["name"]
+            declared_names.add(name)
+            current = existing.get(name)
+            if current is None:
+                create.append(model)
+            elif _normalize(current) != _normalize(model.document):
+                rebuild.append(model)
+        extra = [n for n in existing if n != "_id_" and n not in declared_names]
+        if create or rebuild or extra:
+            plan[coll_name] = {"create": create, "rebuild": rebuild, "extra": extra}
+    return plan
+
+
+def apply_migration(db, plan: Dict[str, Dict[str, List[Any]]], prune: bool = False) -> None:
+    """Apply a plan produced by :func:`plan_migration`.
+
+    Changed indexes are dropped and recreated; undeclared indexes are only
+    dropped when ``prune`` is set so that ad-hoc indexes are never lost silently.
+    """
+    for coll_name, actions in plan.items():
+        collection = db[coll_name]
+        for model in actions["rebuild"]:
+            collection.drop_index(model.document["name"])
+        to_create = actions["rebuild"] + actions["create"]
+        if to_create:
+            collection.create_indexes(to_create)
+        if prune:
+            for name in actions["extra"]:
+                collection.drop_index(name)
+
+
+def describe(model: IndexModel) -> str:
+    doc = model.document
+    opts = _normalize(doc)["options"]
+    suffix = f" {opts}" if opts else ""
+    return f"{doc['name']}{suffix}"
@@ -0,0 +1,1589 @@
+"""
+In-process MongoDB-compatible storage engine (``USE_MOCK_DB=1``).
+
+Replaces the old ``MockCollection``/``MockCursor`` stubs with an engine that
+implements the subset of the pymongo/Motor API this service actually uses, with
+MongoDB semantics where they matter (null matches missing, array fields match
+their elements, BSON type bracketing for comparisons, millisecond datetimes).
+
+- Queries: equality, $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin/$exists/$regex/$not/
+  $size/$all/$elemMatch, $and/$or/$nor, $expr comparisons between fields,
+  dotted paths.
+- Updates: $set/$unset/$inc/$mul/$min/$max/$push/$addToSet/$pull/$rename/
+  $setOnInsert/$currentDate, replacement documents, upserts.
+- Cursors: sort/skip/limit/projection, count_documents, distinct,
+  find_one_and_update/delete/replace, bulk_write, a practical aggregate subset.
+- Indexes: hash indexes on the leading field for equality/$in lookups, sorted
+  indexes for timestamp fields (created_at/updated_at/uploaded_at/detected_at)
+  and ``_id`` serving ordered scans and ranges; unique constraints; explain()
+  plans in the same shape as MongoDB so index_advisor.py works offline.
+- GridFS: sync ``MemoryGridFS`` and async ``AsyncMemoryGridFSBucket``.
+
+``AsyncMemoryClient`` wraps the same process-wide storage with Motor's call
+shape (awaitable operations, ``find()`` returning a cursor with ``to_list``),
+so the whole API can run and be profiled without Atlas.
+"""
+
+import asyncio
+import bisect
+import itertools
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import (
+    BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+)
+
+# Leading index fields that get an ordered (bisect) index instead of a hash index
+SORTED_INDEX_FIELDS = {"_id", "created_at", "updated_at", "uploaded_at", "detected_at"}
+
+# Optional artificial per-operation latency for the async facade (benchmarks)
+MOCK_DB_LATENCY_MS = float(os.getenv("MOCK_DB_LATENCY_MS", "0") or 0)
+
+
+# ---------------------------------------------------------------------------
+# Value helpers
+# ---------------------------------------------------------------------------
+
+def _encode(value: Any) -> Any:
+    """Copy a value the way a BSON round trip would (plain types, ms datetimes)"""
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, str):
+        return value if type(value) is str else str.__str__(value)
+    if isinstance(value, int):
+        return value if type(value) is int else int(value)
+    if isinstance(value, float):
+        return value if type(value) is float else float(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=(value.microsecond // 1000) * 1000)
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    return value
+
+
+def _clone(value: Any) -> Any:
+    """Structural copy of stored data (scalars are immutable and shared)"""
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+
+def _resolve(doc: Any, path: str) -> List[Any]:
+    """Values found at a dotted path, expanding arrays; [] means missing"""
+    current = [doc]
+    for part in path.split("."):
+        nxt: List[Any] = []
+        for value in current:
+            if isinstance(value, dict):
+                if part in value:
+                    nxt.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit():
+                    idx = int(part)
+                    if idx < len(value):
+                        nxt.append(value[idx])
+                else:
+                    for el in value:
+                        if isinstance(el, dict) and part in el:
+                            nxt.append(el[part])
+        current = nxt
+    return current
+
+
+def _first(doc: Any, path: str) -> Any:
+    values = _resolve(doc, path)
+    return values[0] if values else None
+
+
+def _expand(values: List[Any]) -> List[Any]:
+    out: List[Any] = []
+    for v in values:
+        out.append(v)
+        if isinstance(v, list):
+            out.extend(v)
+    return out
+
+
+def _rank(value: Any) -> int:
+    """BSON comparison order of type brackets"""
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    rank = _rank(value)
+    if value is None:
+        return (rank, 0)
+    if rank in (4, 5, 10):
+        return (rank, repr(value))
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (rank, value)
+
+
+def _hashable(value: Any) -> Any:
+    if isinstance(value, dict):
+        return ("__doc__", tuple((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("__array__", tuple(_hashable(v) for v in value))
+    if isinstance(value, bool):
+        return ("__bool__", value)
+    if isinstance(value, str) and type(value) is not str:
+        return str.__str__(value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _equal(a: Any, b: Any) -> bool:
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    try:
+        return a == b
+    except Exception:
+        return False
+
+
+def _compare(a: Any, b: Any) -> Optional[int]:
+    """-1/0/1 when both values are in the same type bracket, else None"""
+    if _rank(a) != _rank(b):
+        return None
+    ka, kb = _sort_key(a), _sort_key(b)
+    try:
+        return (ka > kb) - (ka < kb)
+    except TypeError:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Query matching
+# ---------------------------------------------------------------------------
+
+def _is_operator_doc(cond: Any) -> bool:
+    return isinstance(cond, dict) and bool(cond) and all(str(k).startswith("$") for k in cond)
+
+
+def _eq_any(values: List[Any], target: Any) -> bool:
+    if isinstance(target, re.Pattern):
+        return any(isinstance(v, str) and target.search(v) for v in _expand(values))
+    if not values:
+        return target is None
+    return any(_equal(v, target) for v in _expand(values))
+
+
+def _compile_regex(pattern: Any, options: str = "") -> re.Pattern:
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = 0
+    for ch in options or "":
+        flags |= {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}.get(ch, 0)
+    return re.compile(pattern, flags)
+
+
+def _match_field(values: List[Any], cond: Any) -> bool:
+    if not _is_operator_doc(cond):
+        return _eq_any(values, cond)
+    for op, arg in cond.items():
+        if op == "$options":
+            continue
+        if op == "$eq":
+            ok = _eq_any(values, arg)
+        elif op == "$ne":
+            ok = not _eq_any(values, arg)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = False
+            for v in _expand(values):
+                c = _compare(v, arg)
+                if c is None:
+                    continue
+                if (op == "$gt" and c > 0) or (op == "$gte" and c >= 0) or \
+                        (op == "$lt" and c < 0) or (op == "$lte" and c <= 0):
+                    ok = True
+                    break
+        elif op == "$in":
+            ok = any(_eq_any(values, a) for a in arg)
+        elif op == "$nin":
+            ok = not any(_eq_any(values, a) for a in arg)
+        elif op == "$exists":
+            ok = bool(values) == bool(arg)
+        elif op == "$regex":
+            rx = _compile_regex(arg, cond.get("$options", ""))
+            ok = any(isinstance(v, str) and rx.search(v) for v in _expand(values))
+        elif op == "$not":
+            ok = not _match_field(values, arg)
+        elif op == "$size":
+            ok = any(isinstance(v, list) and len(v) == arg for v in values)
+        elif op == "$all":
+            ok = all(_eq_any(values, a) for a in arg)
+        elif op == "$elemMatch":
+            ok = False
+            for v in values:
+                if not isinstance(v, list):
+                    continue
+                for el in v:
+                    if (_matches(el, arg) if isinstance(el, dict) and not _is_operator_doc(arg)
+                            else _match_field([el], arg)):
+                        ok = True
+                        break
+                if ok:
+                    break
+        else:
+            raise NotImplementedError(f"Query operator {op} is not supported by the in-memory engine")
+        if not ok:
+            return False
+    return True
+
+
+def _matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    if not query:
+        return True
+    for key, cond in query.items():
+        if key == "$and":
+            if not all(_matches(doc, q) for q in cond):
+                return False
+        elif key == "$or":
+            if not any(_matches(doc, q) for q in cond):
+                return False
+        elif key == "$nor":
+            if any(_matches(doc, q) for q in cond):
+                return False
+        elif key == "$expr":
+            if not _eval_expr(doc, cond):
+                return False
+        elif key.startswith("$"):
+            raise NotImplementedError(f"Query operator {key} is not supported by the in-memory engine")
+        elif not _match_field(_resolve(doc, key), cond):
+            return False
+    return True
+
+
+def _equality_values(cond: Any) -> Optional[List[Any]]:
+    """Values an index can look up for a field condition, or None"""
+    if isinstance(cond, re.Pattern):
+        return None
+    if not _is_operator_doc(cond):
+        return [cond]
+    if set(cond) == {"$eq"}:
+        return [cond["$eq"]]
+    if set(cond) == {"$in"} and not any(isinstance(v, re.Pattern) for v in cond["$in"]):
+        return list(cond["$in"])
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Updates and projections
+# ---------------------------------------------------------------------------
+
+def _set_path(doc: Dict[str, Any], path: str, value: Any) -> None:
+    parts = path.split(".")
+    target: Any = doc
+    for part in parts[:-1]:
+        if isinstance(target, list) and part.isdigit():
+            target = target[int(part)]
+            continue
+        if part not in target or not isinstance(target[part], (dict, list)):
+            target[part] = {}
+        target = target[part]
+    last = parts[-1]
+    if isinstance(target, list) and last.isdigit():
+        idx = int(last)
+        while len(target) <= idx:
+            target.append(None)
+        target[idx] = value
+    else:
+        target[last] = value
+
+
+def _unset_path(doc: Dict[str, Any], path: str) -> None:
+    parts = path.split(".")
+    target: Any = doc
+    for part in parts[:-1]:
+        if isinstance(target, dict) and part in target:
+            target = target[part]
+        else:
+            return
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+
+
+def _apply_update(doc: Dict[str, Any], update: Dict[str, Any], is_insert: bool = False) -> None:
+    if not any(str(k).startswith("$") for k in update):
+        # Replacement document: keep _id, replace everything else
+        _id = doc.get("_id")
+        doc.clear()
+        doc.update(_encode(update))
+        if _id is not None:
+            doc["_id"] = _id
+        return
+    for op, fields in update.items():
+        if op == "$set":
+            for path, value in fields.items():
+                _set_path(doc, path, _encode(value))
+        elif op == "$setOnInsert":
+            if is_insert:
+                for path, value in fields.items():
+                    _set_path(doc, path, _encode(value))
+        elif op == "$unset":
+            for path in fields:
+                _unset_path(doc, path)
+        elif op in ("$inc", "$mul"):
+            for path, amount in fields.items():
+                current = _first(doc, path)
+                if current is None:
+                    current = 0
+                _set_path(doc, path, current + amount if op == "$inc" else current * amount)
+        elif op in ("$min", "$max"):
+            for path, value in fields.items():
+                current = _resolve(doc, path)
+                value = _encode(value)
+                if not current:
+                    _set_path(doc, path, value)
+                    continue
+                c = _compare(value, current[0])
+                if c is not None and ((op == "$min" and c < 0) or (op == "$max" and c > 0)):
+                    _set_path(doc, path, value)
+        elif op in ("$push", "$addToSet"):
+            for path, value in fields.items():
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                current = _first(doc, path)
+                arr = list(current) if isinstance(current, list) else []
+                for item in items:
+                    item = _encode(item)
+                    if op == "$addToSet" and any(_equal(x, item) for x in arr):
+                        continue
+                    arr.append(item)
+                if isinstance(value, dict) and "$slice" in value:
+                    n = value["$slice"]
+                    arr = arr[n:] if n < 0 else arr[:n]
+                _set_path(doc, path, arr)
+        elif op == "$pull":
+            for path, cond in fields.items():
+                current = _first(doc, path)
+                if isinstance(current, list):
+                    keep = []
+                    for item in current:
+                        hit = (_matches(item, cond) if isinstance(item, dict) and isinstance(cond, dict)
+                               and not _is_operator_doc(cond) else _match_field([item], cond))
+                        if not hit:
+                            keep.append(item)
+                    _set_path(doc, path, keep)
+        elif op == "$rename":
+            for old, new in fields.items():
+                values = _resolve(doc, old)
+                if values:
+                    _unset_path(doc, old)
+                    _set_path(doc, new, values[0])
+        elif op == "$currentDate":
+            for path in fields:
+                _set_path(doc, path, _encode(datetime.utcnow()))
+        else:
+            raise NotImplementedError(f"Update operator {op} is not supported by the in-memory engine")
+
+
+def _upsert_seed(query: Dict[str, Any]) -> Dict[str, Any]:
+    """Document fields implied by the equality parts of an upsert filter"""
+    seed: Dict[str, Any] = {}
+    for key, cond in (query or {}).items():
+        if key == "$and":
+            for sub in cond:
+                seed.update(_upsert_seed(sub))
+        elif key.startswith("$"):
+            continue
+        elif _is_operator_doc(cond):
+            if "$eq" in cond:
+                _set_path(seed, key, _encode(cond["$eq"]))
+        else:
+            _set_path(seed, key, _encode(cond))
+    return seed
+
+
+def _normalize_projection(projection: Any) -> Optional[Dict[str, Any]]:
+    if projection is None:
+        return None
+    if isinstance(projection, (list, tuple)):
+        return {field: 1 for field in projection}
+    return dict(projection)
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return doc
+    include_id = bool(projection.get("_id", 1))
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    inclusive = any(bool(v) for v in fields.values())
+    if inclusive:
+        out: Dict[str, Any] = {}
+        if include_id and "_id" in doc:
+            out["_id"] = doc["_id"]
+        for path in fields:
+            values = _resolve(doc, path)
+            if values and "." not in path:
+                out[path] = values[0]
+            elif values:
+                _set_path(out, path, values[0])
+        return out
+    out = doc
+    for path in fields:
+        _unset_path(out, path)
+    if not include_id:
+        out.pop("_id", None)
+    return out
+
+
+def _sort_docs(docs: List[Dict[str, Any]], sort: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    # Stable sorts applied from the least significant key
+    for field, direction in reversed(sort):
+        docs.sort(key=lambda d, f=field: _sort_key(_first(d, f)), reverse=direction < 0)
+    return docs
+
+
+def _normalize_sort(key_or_list: Any, direction: Optional[int] = None) -> List[Tuple[str, int]]:
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return [(k, int(v)) for k, v in key_or_list.items()]
+    return [(k, int(v)) for k, v in key_or_list]
+
+
+def _index_keys(keys: Any, direction: Optional[int] = None) -> List[Tuple[str, Any]]:
+    if isinstance(keys, str):
+        return [(keys, direction if direction is not None else 1)]
+    if isinstance(keys, dict):
+        return list(keys.items())
+    return [(k, v) for k, v in keys]
+
+
+def _index_name(keys: List[Tuple[str, Any]]) -> str:
+    return "_".join(f"{k}_{v}" for k, v in keys)
+
+
+# ---------------------------------------------------------------------------
+# Indexes
+# ---------------------------------------------------------------------------
+
+class _HashIndex:
+    """Equality index on the leading key (multikey for arrays)"""
+
+    kind = "hash"
+
+    def __init__(self, name: str, keys: List[Tuple[str, Any]], unique: bool = False, sparse: bool = False,
+                 hidden: bool = False):
+        self.name = name
+        self.keys = keys
+        self.field = keys[0][0]
+        self.unique = unique
+        self.sparse = sparse
+        self.hidden = hidden
+        self.entries: Dict[Any, set] = {}
+        self.unique_map: Dict[Any, int] = {}
+
+    def _entry_keys(self, doc: Dict[str, Any]) -> List[Any]:
+        values = _resolve(doc, self.field)
+        if not values:
+            return [] if self.sparse else [None]
+        keys = []
+        for v in values:
+            keys.append(_hashable(v))
+            if isinstance(v, list):
+                keys.extend(_hashable(x) for x in v)
+        return keys
+
+    def _unique_key(self, doc: Dict[str, Any]) -> Any:
+        return tuple(_hashable(_first(doc, field)) for field, _ in self.keys)
+
+    def check_unique(self, seq: int, doc: Dict[str, Any]) -> None:
+        if not self.unique:
+            return
+        if self.sparse and not _resolve(doc, self.field):
+            return
+        owner = self.unique_map.get(self._unique_key(doc))
+        if owner is not None and owner != seq:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error index: {self.name} dup key: {self._unique_key(doc)}", 11000
+            )
+
+    def add(self, seq: int, doc: Dict[str, Any]) -> None:
+        for key in self._entry_keys(doc):
+            self.entries.setdefault(key, set()).add(seq)
+        if self.unique and not (self.sparse and not _resolve(doc, self.field)):
+            self.unique_map[self._unique_key(doc)] = seq
+
+    def remove(self, seq: int, doc: Dict[str, Any]) -> None:
+        for key in self._entry_keys(doc):
+            bucket = self.entries.get(key)
+            if bucket is not None:
+                bucket.discard(seq)
+                if not bucket:
+                    del self.entries[key]
+        if self.unique:
+            ukey = self._unique_key(doc)
+            if self.unique_map.get(ukey) == seq:
+                del self.unique_map[ukey]
+
+    def lookup(self, values: Iterable[Any]) -> set:
+        out: set = set()
+        for v in values:
+            out |= self.entries.get(_hashable(v), set())
+        return out
+
+
+class _SortedIndex(_HashIndex):
+    """Ordered index on the leading key; also answers equality lookups"""
+
+    kind = "sorted"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ordered: List[Tuple[Tuple[int, Any], int]] = []
+
+    def add(self, seq: int, doc: Dict[str, Any]) -> None:
+        super().add(seq, doc)
+        bisect.insort(self.ordered, (_sort_key(_first(doc, self.field)), seq))
+
+    def remove(self, seq: int, doc: Dict[str, Any]) -> None:
+        super().remove(seq, doc)
+        entry = (_sort_key(_first(doc, self.field)), seq)
+        i = bisect.bisect_left(self.ordered, entry)
+        if i < len(self.ordered) and self.ordered[i] == entry:
+            del self.ordered[i]
+
+    def scan(self, cond: Any, direction: int) -> List[int]:
+        """Sequence numbers in key order, narrowed by a range condition if given"""
+        lo, hi = 0, len(self.ordered)
+        if _is_operator_doc(cond):
+            for op, arg in cond.items():
+                key = _sort_key(_encode(arg))
+                if op == "$gt":
+                    lo = max(lo, bisect.bisect_right(self.ordered, (key, float("inf"))))
+                elif op == "$gte":
+                    lo = max(lo, bisect.bisect_left(self.ordered, (key, -1)))
+                elif op == "$lt":
+                    hi = min(hi, bisect.bisect_left(self.ordered, (key, -1)))
+                elif op == "$lte":
+                    hi = min(hi, bisect.bisect_right(self.ordered, (key, float("inf"))))
+        window = self.ordered[lo:hi]
+        if direction < 0:
+            window = list(reversed(window))
+        return [seq for _, seq in window]
+
+
+def _is_range(cond: Any) -> bool:
+    return _is_operator_doc(cond) and bool(set(cond) & {"$gt", "$gte", "$lt", "$lte"}) and \
+        set(cond) <= {"$gt", "$gte", "$lt", "$lte"}
+
+
+# ---------------------------------------------------------------------------
+# Collections and cursors
+# ---------------------------------------------------------------------------
+
+class MemoryCursor:
+    """Lazy cursor with pymongo's chaining API"""
+
+    def __init__(self, collection: "MemoryCollection", filter: Optional[Dict[str, Any]] = None,
+                 projection: Any = None, sort: Any = None, skip: int = 0, limit: int = 0):
+        self._collection = collection
+        self._filter = filter or {}
+        self._projection = _normalize_projection(projection)
+        self._sort = _normalize_sort(sort)
+        self._skip = skip or 0
+        self._limit = limit or 0
+        self._results: Optional[List[Dict[str, Any]]] = None
+        self._pos = 0
+
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> "MemoryCursor":
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, n: int) -> "MemoryCursor":
+        self._skip = n
+        return self
+
+    def limit(self, n: int) -> "MemoryCursor":
+        self._limit = n
+        return self
+
+    def _execute(self) -> List[Dict[str, Any]]:
+        if self._results is None:
+            self._results = self._collection._run_find(
+                self._filter, self._projection, self._sort, self._skip, self._limit
+            )
+        return self._results
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Dict[str, Any]:
+        results = self._execute()
+        if self._pos < len(results):
+            item = results[self._pos]
+            self._pos += 1
+            return item
+        raise StopIteration
+
+    def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = self._execute()[self._pos:]
+        return results[:length] if length else list(results)
+
+    def explain(self) -> Dict[str, Any]:
+        return self._collection._explain(self._filter, self._sort, self._limit)
+
+    def close(self) -> None:
+        self._results = []
+
+
+class MemoryCollection:
+    """A single collection: documents keyed by insertion sequence plus indexes"""
+
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._lock = threading.RLock()
+        self._docs: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._seq = itertools.count()
+        self._id_index = _SortedIndex("_id_", [("_id", 1)], unique=True)
+        self._indexes: Dict[str, _HashIndex] = {}
+
+    # ---- index management ----
+    def _all_indexes(self) -> List[_HashIndex]:
+        return [self._id_index] + list(self._indexes.values())
+
+    def create_index(self, keys: Any, **kwargs) -> str:
+        key_list = _index_keys(keys)
+        name = kwargs.get("name") or _index_name(key_list)
+        with self._lock:
+            if name in self._indexes:
+                return name
+            cls = _SortedIndex if key_list[0][0] in SORTED_INDEX_FIELDS else _HashIndex
+            index = cls(name, key_list, unique=bool(kwargs.get("unique")), sparse=bool(kwargs.get("sparse")))
+            for seq, doc in self._docs.items():
+                index.check_unique(seq, doc)
+                index.add(seq, doc)
+            self._indexes[name] = index
+        return name
+
+    def create_indexes(self, models: List[Any]) -> List[str]:
+        names = []
+        for model in models:
+            doc = dict(model.document)
+            keys = list(doc.pop("key").items())
+            names.append(self.create_index(keys, **doc))
+        return names
+
+    def drop_index(self, name: str) -> None:
+        with self._lock:
+            self._indexes.pop(name, None)
+
+    def list_indexes(self) -> List[Dict[str, Any]]:
+        out = [{"v": 2, "key": {"_id": 1}, "name": "_id_"}]
+        for index in self._indexes.values():
+            info = {"v": 2, "key": dict(index.keys), "name": index.name}
+            if index.unique:
+                info["unique"] = True
+            if index.sparse:
+                info["sparse"] = True
+            out.append(info)
+        return out
+
+    def index_information(self) -> Dict[str, Any]:
+        return {ix["name"]: {"key": list(ix["key"].items())} for ix in self.list_indexes()}
+
+    # ---- planning ----
+    def _plan(self, query: Dict[str, Any], sort: List[Tuple[str, int]]):
+        """Pick candidate sequence numbers for a query.
+
+        Returns (plan, candidates, ordered) where ``ordered`` means candidates
+        are already in the requested sort order.
+        """
+        best = None
+        for field, cond in query.items():
+            if field.startswith("$"):
+                continue
+            values = _equality_values(cond)
+            if values is None:
+                continue
+            for index in self._all_indexes():
+                if index.field != field:
+                    continue
+                seqs = index.lookup(values)
+                # Most selective index wins; ties go to an index that provides the sort
+                rank = (len(seqs), 0 if self._index_serves_sort(index, query, sort) else 1)
+                if best is None or rank < best[0]:
+                    best = (rank, index, seqs)
+        if best is not None:
+            (_, unsorted), index, seqs = best
+            plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": index.name,
+                                                      "keyPattern": dict(index.keys)}}
+            return plan, sorted(seqs), False, not unsorted
+
+        if set(query) == {"$or"}:
+            branch_seqs: set = set()
+            branch_plans = []
+            for branch in query["$or"]:
+                sub_plan, sub_seqs, _, _ = self._plan(branch, [])
+                if sub_plan["stage"] == "COLLSCAN":
+                    break
+                branch_plans.append(sub_plan)
+                branch_seqs |= set(sub_seqs)
+            else:
+                return {"stage": "FETCH", "inputStage": {"stage": "OR", "inputStages": branch_plans}}, \
+                    sorted(branch_seqs), False, False
+
+        for index in self._all_indexes():
+            if index.kind != "sorted":
+                continue
+            cond = query.get(index.field)
+            sort_first = sort[0] if sort else None
+            if cond is not None and _is_range(cond):
+                direction = sort_first[1] if sort_first and sort_first[0] == index.field else 1
+                ordered = bool(sort) and len(sort) == 1 and sort_first[0] == index.field
+                plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": index.name,
+                                                          "keyPattern": dict(index.keys)}}
+                return plan, index.scan(cond, direction), ordered, ordered
+            if cond is None and sort_first and sort_first[0] == index.field and len(sort) == 1:
+                plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": index.name,
+                                                          "keyPattern": dict(index.keys)}}
+                return plan, index.scan(None, sort_first[1]), True, True
+
+        return {"stage": "COLLSCAN", "filter": query}, list(self._docs.keys()), False, False
+
+    @staticmethod
+    def _index_serves_sort(index: _HashIndex, query: Dict[str, Any], sort: List[Tuple[str, int]]) -> bool:
+        if not sort:
+            return True
+        keys = index.keys
+        i = 0
+        while i < len(keys):
+            values = _equality_values(query.get(keys[i][0])) if keys[i][0] in query else None
+            if values is None or len(values) != 1:
+                break
+            i += 1
+        rest = keys[i:]
+        if len(sort) > len(rest):
+            return False
+        if any(rest[j][0] != sort[j][0] for j in range(len(sort))):
+            return False
+        same = all(rest[j][1] == sort[j][1] for j in range(len(sort)))
+        flipped = all(rest[j][1] == -sort[j][1] for j in range(len(sort)))
+        return same or flipped
+
+    def _explain(self, query: Dict[str, Any], sort: List[Tuple[str, int]], limit: int) -> Dict[str, Any]:
+        with self._lock:
+            plan, candidates, _, sort_served = self._plan(query or {}, sort)
+        if sort and not sort_served:
+            plan = {"stage": "SORT", "sortPattern": dict(sort), "inputStage": plan}
+        if limit:
+            plan = {"stage": "LIMIT", "limitAmount": limit, "inputStage": plan}
+        return {
+            "queryPlanner": {"namespace": self.full_name, "parsedQuery": query or {}, "winningPlan": plan},
+            "executionStats": {"totalDocsExamined": len(candidates)},
+            "engine": "in-memory",
+        }
+
+    # ---- reads ----
+    def _matching(self, query: Dict[str, Any], sort: List[Tuple[str, int]] = None,
+                  limit: int = 0, skip: int = 0) -> List[Tuple[int, Dict[str, Any]]]:
+        """(seq, stored_doc) pairs in result order; caller must hold the lock"""
+        sort = sort or []
+        _, candidates, ordered, _ = self._plan(query or {}, sort)
+        out: List[Tuple[int, Dict[str, Any]]] = []
+        stop = (skip + limit) if (ordered or not sort) and limit else 0
+        for seq in candidates:
+            doc = self._docs.get(seq)
+            if doc is not None and _matches(doc, query):
+                out.append((seq, doc))
+                if stop and len(out) >= stop:
+                    break
+        if sort and not ordered:
+            for field, direction in reversed(sort):
+                out.sort(key=lambda p, f=field: _sort_key(_first(p[1], f)), reverse=direction < 0)
+        if skip:
+            out = out[skip:]
+        if limit:
+            out = out[:limit]
+        return out
+
+    def _run_find(self, query, projection, sort, skip, limit) -> List[Dict[str, Any]]:
+        with self._lock:
+            pairs = self._matching(query, sort, limit, skip)
+            return [_project(_clone(doc), projection) for _, doc in pairs]
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Any = None, skip: int = 0,
+             limit: int = 0, sort: Any = None, **kwargs) -> MemoryCursor:
+        return MemoryCursor(self, filter, projection, sort, skip, limit)
+
+    def find_one(self, filter: Any = None, *args, **kwargs) -> Optional[Dict[str, Any]]:
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        kwargs["limit"] = 1
+        for doc in self.find(filter, *args, **kwargs):
+            return doc
+        return None
+
+    def count_documents(self, filter: Dict[str, Any], skip: int = 0, limit: int = 0, **kwargs) -> int:
+        with self._lock:
+            return len(self._matching(filter, None, limit, skip))
+
+    def estimated_document_count(self, **kwargs) -> int:
+        return len(self._docs)
+
+    def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None, **kwargs) -> List[Any]:
+        seen: Dict[Any, Any] = {}
+        with self._lock:
+            for _, doc in self._matching(filter or {}):
+                for value in _resolve(doc, key):
+                    items = value if isinstance(value, list) else [value]
+                    for item in items:
+                        seen.setdefault(_hashable(item), _clone(item))
+        return list(seen.values())
+
+    # ---- writes ----
+    def _store(self, doc: Dict[str, Any]) -> int:
+        seq = next(self._seq)
+        for index in self._all_indexes():
+            index.check_unique(seq, doc)
+        self._docs[seq] = doc
+        for index in self._all_indexes():
+            index.add(seq, doc)
+        return seq
+
+    def _replace_stored(self, seq: int, old: Dict[str, Any], new: Dict[str, Any]) -> None:
+        for index in self._all_indexes():
+            index.check_unique(seq, new)
+        for index in self._all_indexes():
+            index.remove(seq, old)
+        self._docs[seq] = new
+        for index in self._all_indexes():
+            index.add(seq, new)
+
+    def _delete_stored(self, seq: int) -> None:
+        doc = self._docs.pop(seq)
+        for index in self._all_indexes():
+            index.remove(seq, doc)
+
+    def insert_one(self, document: Dict[str, Any], **kwargs) -> InsertOneResult:
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        with self._lock:
+            self._store(_encode(document))
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True, **kwargs) -> InsertManyResult:
+        ids = []
+        with self._lock:
+            for document in documents:
+                if "_id" not in document:
+                    document["_id"] = ObjectId()
+                self._store(_encode(document))
+                ids.append(document["_id"])
+        return InsertManyResult(ids, True)
+
+    def _update(self, query: Dict[str, Any], update: Any, upsert: bool, multi: bool,
+                sort: Any = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Apply an update; returns (raw_result, before, after) for the first match"""
+        with self._lock:
+            pairs = self._matching(query or {}, _normalize_sort(sort), 0 if multi else 1)
+            if not pairs:
+                if not upsert:
+                    return {"n": 0, "nModified": 0}, None, None
+                new_doc = _upsert_seed(query)
+                _apply_update(new_doc, update, is_insert=True)
+                if "_id" not in new_doc:
+                    new_doc["_id"] = ObjectId()
+                self._store(new_doc)
+                return {"n": 1, "nModified": 0, "upserted": new_doc["_id"]}, None, _clone(new_doc)
+            modified = 0
+            before = after = None
+            for seq, stored in pairs:
+                new_doc = _clone(stored)
+                _apply_update(new_doc, update)
+                if before is None:
+                    before, after = _clone(stored), _clone(new_doc)
+                if new_doc != stored:
+                    self._replace_stored(seq, stored, new_doc)
+                    modified += 1
+            return {"n": len(pairs), "nModified": modified}, before, after
+
+    def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+                   **kwargs) -> UpdateResult:
+        raw, _, _ = self._update(filter, update, upsert, multi=False, sort=kwargs.get("sort"))
+        return UpdateResult(raw, True)
+
+    def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+                    **kwargs) -> UpdateResult:
+        raw, _, _ = self._update(filter, update, upsert, multi=True)
+        return UpdateResult(raw, True)
+
+    def replace_one(self, filter: Dict[str, Any], replacement: Dict[str, Any], upsert: bool = False,
+                    **kwargs) -> UpdateResult:
+        raw, _, _ = self._update(filter, replacement, upsert, multi=False)
+        return UpdateResult(raw, True)
+
+    def find_one_and_update(self, filter: Dict[str, Any], update: Dict[str, Any], projection: Any = None,
+                            sort: Any = None, upsert: bool = False,
+                            return_document: bool = ReturnDocument.BEFORE, **kwargs) -> Optional[Dict[str, Any]]:
+        _, before, after = self._update(filter, update, upsert, multi=False, sort=sort)
+        doc = after if return_document == ReturnDocument.AFTER else before
+        return _project(doc, _normalize_projection(projection)) if doc is not None else None
+
+    def find_one_and_replace(self, filter: Dict[str, Any], replacement: Dict[str, Any], projection: Any = None,
+                             sort: Any = None, upsert: bool = False,
+                             return_document: bool = ReturnDocument.BEFORE, **kwargs) -> Optional[Dict[str, Any]]:
+        return self.find_one_and_update(filter, replacement, projection, sort, upsert, return_document)
+
+    def find_one_and_delete(self, filter: Dict[str, Any], projection: Any = None, sort: Any = None,
+                            **kwargs) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            pairs = self._matching(filter or {}, _normalize_sort(sort), 1)
+            if not pairs:
+                return None
+            seq, doc = pairs[0]
+            self._delete_stored(seq)
+            return _project(_clone(doc), _normalize_projection(projection))
+
+    def delete_one(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        with self._lock:
+            pairs = self._matching(filter or {}, None, 1)
+            for seq, _ in pairs:
+                self._delete_stored(seq)
+            return DeleteResult({"n": len(pairs)}, True)
+
+    def delete_many(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        with self._lock:
+            pairs = self._matching(filter or {})
+            for seq, _ in pairs:
+                self._delete_stored(seq)
+            return DeleteResult({"n": len(pairs)}, True)
+
+    def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        result = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        with self._lock:
+            for i, op in enumerate(requests):
+                kind = type(op).__name__
+                if kind == "InsertOne":
+                    self.insert_one(op._doc)
+                    result["nInserted"] += 1
+                elif kind in ("UpdateOne", "UpdateMany", "ReplaceOne"):
+                    raw, _, _ = self._update(op._filter, op._doc, bool(op._upsert), multi=kind == "UpdateMany")
+                    if "upserted" in raw:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": i, "_id": raw["upserted"]})
+                    else:
+                        result["nMatched"] += raw["n"]
+                        result["nModified"] += raw["nModified"]
+                elif kind in ("DeleteOne", "DeleteMany"):
+                    res = (self.delete_one if kind == "DeleteOne" else self.delete_many)(op._filter)
+                    result["nRemoved"] += res.deleted_count
+                else:
+                    raise NotImplementedError(f"Bulk operation {kind} is not supported by the in-memory engine")
+        return BulkWriteResult(result, True)
+
+    def drop(self) -> None:
+        with self._lock:
+            self._docs.clear()
+            for index in self._all_indexes():
+                index.entries.clear()
+                index.unique_map.clear()
+                if isinstance(index, _SortedIndex):
+                    index.ordered.clear()
+
+    # ---- aggregation ----
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> MemoryCursor:
+        stages = list(pipeline)
+        with self._lock:
+            # A leading $match (and $sort) is planned against the indexes
+            if stages and "$match" in stages[0]:
+                docs = [_clone(d) for _, d in self._matching(stages.pop(0)["$match"])]
+            else:
+                docs = [_clone(d) for d in self._docs.values()]
+        docs = _run_pipeline(self.database, docs, stages)
+        cursor = MemoryCursor(self)
+        cursor._results = docs
+        return cursor
+
+
+# ---------------------------------------------------------------------------
+# Aggregation pipeline subset
+# ---------------------------------------------------------------------------
+
+_EXPR_COMPARISONS = {
+    "$eq": lambda c: c == 0, "$ne": lambda c: c != 0, "$gt": lambda c: c > 0,
+    "$gte": lambda c: c >= 0, "$lt": lambda c: c < 0, "$lte": lambda c: c <= 0,
+}
+
+
+def _eval_expr(doc: Dict[str, Any], expr: Any) -> Any:
+    if isinstance(expr, str) and expr.startswith("$"):
+        return _first(doc, expr[1:])
+    if isinstance(expr, dict):
+        if len(expr) == 1:
+            (op, arg), = expr.items()
+            if op == "$literal":
+                return arg
+            if op == "$size":
+                value = _eval_expr(doc, arg)
+                return len(value) if isinstance(value, list) else 0
+            if op == "$ifNull":
+                for candidate in arg:
+                    value = _eval_expr(doc, candidate)
+                    if value is not None:
+                        return value
+                return None
+            if op in _EXPR_COMPARISONS:
+                a, b = (_eval_expr(doc, v) for v in arg)
+                # Aggregation comparisons order across types instead of bracketing
+                ka, kb = _sort_key(a), _sort_key(b)
+                return _EXPR_COMPARISONS[op]((ka > kb) - (ka < kb))
+            if op in ("$toString", "$toLower", "$toUpper"):
+                value = _eval_expr(doc, arg)
+                if value is None:
+                    return None
+                value = str(value)
+                return value.lower() if op == "$toLower" else value.upper() if op == "$toUpper" else value
+            if op.startswith("$"):
+                raise NotImplementedError(f"Expression {op} is not supported by the in-memory engine")
+        return {k: _eval_expr(doc, v) for k, v in expr.items()}
+    if isinstance(expr, list):
+        return [_eval_expr(doc, v) for v in expr]
+    return expr
+
+
+def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    groups: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+    counts: Dict[Any, Dict[str, int]] = {}
+    for doc in docs:
+        key_value = _eval_expr(doc, spec["_id"])
+        key = _hashable(key_value)
+        if key not in groups:
+            groups[key] = {"_id": key_value}
+            counts[key] = {}
+        out = groups[key]
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            (op, arg), = acc.items()
+            value = _eval_expr(doc, arg) if op != "$count" else 1
+            if op in ("$sum", "$count"):
+                inc = value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+                out[field] = out.get(field, 0) + inc
+            elif op == "$avg":
+                if isinstance(value, (int, float)):
+                    n = counts[key].get(field, 0)
+                    out[field] = ((out.get(field) or 0) * n + value) / (n + 1)
+                    counts[key][field] = n + 1
+                else:
+                    out.setdefault(field, None)
+            elif op in ("$min", "$max"):
+                if value is None:
+                    out.setdefault(field, None)
+                    continue
+                current = out.get(field)
+                c = _compare(value, current) if current is not None else None
+                if current is None or (c is not None and ((op == "$min" and c < 0) or (op == "$max" and c > 0))):
+                    out[field] = value
+            elif op == "$first":
+                out.setdefault(field, value)
+            elif op == "$last":
+                out[field] = value
+            elif op == "$push":
+                out.setdefault(field, []).append(value)
+            elif op == "$addToSet":
+                arr = out.setdefault(field, [])
+                if not any(_equal(x, value) for x in arr):
+                    arr.append(value)
+            else:
+                raise NotImplementedError(f"Accumulator {op} is not supported by the in-memory engine")
+    return list(groups.values())
+
+
+def _run_pipeline(database: "MemoryDatabase", docs: List[Dict[str, Any]],
+                  stages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for stage in stages:
+        (op, spec), = stage.items()
+        if op == "$match":
+            docs = [d for d in docs if _matches(d, spec)]
+        elif op == "$group":
+            docs = _group(docs, spec)
+        elif op == "$sort":
+            docs = _sort_docs(docs, _normalize_sort(spec))
+        elif op == "$skip":
+            docs = docs[spec:]
+        elif op == "$limit":
+            docs = docs[:spec]
+        elif op == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        elif op == "$project":
+            plain = {k: v for k, v in spec.items() if isinstance(v, (int, bool))}
+            computed = {k: v for k, v in spec.items() if not isinstance(v, (int, bool))}
+            out = []
+            for d in docs:
+                projected = _project(_clone(d), plain) if plain else (
+                    {"_id": d.get("_id")} if computed and spec.get("_id", 1) else {}
+                )
+                for k, expr in computed.items():
+                    projected[k] = _eval_expr(d, expr)
+                out.append(projected)
+            docs = out
+        elif op in ("$addFields", "$set"):
+            for d in docs:
+                for k, expr in spec.items():
+                    _set_path(d, k, _eval_expr(d, expr))
+        elif op == "$unset":
+            for d in docs:
+                for k in ([spec] if isinstance(spec, str) else spec):
+                    _unset_path(d, k)
+        elif op == "$unwind":
+            path = spec if isinstance(spec, str) else spec["path"]
+            keep_empty = isinstance(spec, dict) and spec.get("preserveNullAndEmptyArrays")
+            field = path.lstrip("$")
+            out = []
+            for d in docs:
+                value = _first(d, field)
+                if isinstance(value, list) and value:
+                    for item in value:
+                        nd = _clone(d)
+                        _set_path(nd, field, item)
+                        out.append(nd)
+                elif keep_empty:
+                    out.append(d)
+                elif value is not None and not isinstance(value, list):
+                    out.append(d)
+            docs = out
+        elif op == "$lookup":
+            foreign = database[spec["from"]]
+            for d in docs:
+                local = _first(d, spec["localField"])
+                d[spec["as"]] = foreign.find({spec["foreignField"]: local}).to_list()
+        else:
+            raise NotImplementedError(f"Pipeline stage {op} is not supported by the in-memory engine")
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# Database / client
+# ---------------------------------------------------------------------------
+
+class MemoryAdmin:
+    def command(self, cmd: Any, *args, **kwargs) -> Dict[str, Any]:
+        return {"ok": 1.0}
+
+
+class MemoryDatabase:
+    def __init__(self, client: "MemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+        self._lock = threading.Lock()
+        # GridFS payloads keyed by (bucket, file_id)
+        self._blobs: Dict[Tuple[str, Any], bytes] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return self.get_collection(name)
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(self, name)
+            return self._collections[name]
+
+    def list_collection_names(self, **kwargs) -> List[str]:
+        return [n for n, c in self._collections.items() if c._docs]
+
+    def drop_collection(self, name: str) -> None:
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def command(self, cmd: Any, *args, **kwargs) -> Dict[str, Any]:
+        return {"ok": 1.0}
+
+
+class MemoryClient:
+    def __init__(self):
+        self.admin = MemoryAdmin()
+        self._databases: Dict[str, MemoryDatabase] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        return self.get_database(name)
+
+    def get_database(self, name: str, **kwargs) -> MemoryDatabase:
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = MemoryDatabase(self, name)
+            return self._databases[name]
+
+    def drop_database(self, name: str) -> None:
+        with self._lock:
+            self._databases.pop(name, None)
+
+    def close(self) -> None:
+        pass
+
+
+_CLIENT: Optional[MemoryClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_memory_client() -> MemoryClient:
+    """Process-wide storage shared by the sync and async facades"""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = MemoryClient()
+        return _CLIENT
+
+
+# ---------------------------------------------------------------------------
+# GridFS
+# ---------------------------------------------------------------------------
+
+DEFAULT_CHUNK_SIZE = 255 * 1024
+
+
+class MemoryGridOut:
+    """Readable stored file (subset of gridfs.GridOut)"""
+
+    def __init__(self, file_doc: Dict[str, Any], data: bytes):
+        self._file = file_doc
+        self._data = data
+        self._pos = 0
+        self._id = file_doc["_id"]
+        self.filename = file_doc.get("filename")
+        self.length = file_doc.get("length", len(data))
+        self.chunk_size = file_doc.get("chunkSize", DEFAULT_CHUNK_SIZE)
+        self.upload_date = file_doc.get("uploadDate")
+        self.metadata = file_doc.get("metadata")
+        self.content_type = file_doc.get("contentType") or (self.metadata or {}).get("content_type")
+
+    def __getattr__(self, name: str) -> Any:
+        # Extra fields passed to GridFS.put() are stored top-level, as in gridfs
+        try:
+            return self.__dict__["_file"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.length - self._pos
+        chunk = self._data[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        return chunk
+
+    def readchunk(self) -> bytes:
+        remainder = self.chunk_size - (self._pos % self.chunk_size)
+        return self.read(remainder)
+
+    def seek(self, pos: int, whence: int = 0) -> int:
+        base = {0: 0, 1: self._pos, 2: self.length}[whence]
+        self._pos = max(0, min(self.length, base + pos))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryGridFS:
+    """Synchronous GridFS replacement (gridfs.GridFS call shape)"""
+
+    def __init__(self, database: MemoryDatabase, collection: str = "fs"):
+        self._db = database
+        self._bucket = collection
+        self._files = database[f"{collection}.files"]
+
+    def put(self, data: Any, **kwargs) -> ObjectId:
+        payload = data.read() if hasattr(data, "read") else data
+        if isinstance(payload, str):
+            payload = payload.encode(kwargs.get("encoding", "utf-8"))
+        file_id = kwargs.pop("_id", None) or ObjectId()
+        doc = {
+            "_id": file_id,
+            "length": len(payload),
+            "chunkSize": kwargs.pop("chunk_size", DEFAULT_CHUNK_SIZE),
+            "uploadDate": datetime.utcnow(),
+        }
+        if "content_type" in kwargs:
+            doc["contentType"] = kwargs.pop("content_type")
+        doc.update(kwargs)
+        self._db._blobs[(self._bucket, file_id)] = bytes(payload)
+        self._files.insert_one(doc)
+        return file_id
+
+    def get(self, file_id: Any) -> MemoryGridOut:
+        doc = self._files.find_one({"_id": file_id})
+        if doc is None:
+            raise NoFile(f"no file in gridfs collection {self._bucket!r} with _id {file_id!r}")
+        return MemoryGridOut(doc, self._db._blobs.get((self._bucket, file_id), b""))
+
+    def exists(self, file_id: Any = None, **kwargs) -> bool:
+        query = {"_id": file_id} if file_id is not None else kwargs
+        return self._files.find_one(query) is not None
+
+    def delete(self, file_id: Any) -> None:
+        self._files.delete_one({"_id": file_id})
+        self._db._blobs.pop((self._bucket, file_id), None)
+
+
+# ---------------------------------------------------------------------------
+# Async (Motor-shaped) facade
+# ---------------------------------------------------------------------------
+
+async def _simulated_io() -> None:
+    # Always yield so the event loop interleaves requests the way real I/O would
+    await asyncio.sleep(MOCK_DB_LATENCY_MS / 1000.0 if MOCK_DB_LATENCY_MS else 0)
+
+
+class AsyncMemoryCursor:
+    def __init__(self, cursor: MemoryCursor):
+        self.delegate = cursor
+
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> "AsyncMemoryCursor":
+        self.delegate.sort(key_or_list, direction)
+        return self
+
+    def skip(self, n: int) -> "AsyncMemoryCursor":
+        self.delegate.skip(n)
+        return self
+
+    def limit(self, n: int) -> "AsyncMemoryCursor":
+        self.delegate.limit(n)
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        await _simulated_io()
+        return self.delegate.to_list(length)
+
+    async def explain(self) -> Dict[str, Any]:
+        await _simulated_io()
+        return self.delegate.explain()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await _simulated_io()
+        for doc in self.delegate:
+            yield doc
+
+    def close(self) -> None:
+        self.delegate.close()
+
+
+class AsyncMemoryCollection:
+    """Awaitable wrapper with AsyncIOMotorCollection's call shape"""
+
+    def __init__(self, database: "AsyncMemoryDatabase", collection: MemoryCollection):
+        self.database = database
+        self.delegate = collection
+        self.name = collection.name
+
+    def find(self, *args, **kwargs) -> AsyncMemoryCursor:
+        return AsyncMemoryCursor(self.delegate.find(*args, **kwargs))
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> AsyncMemoryCursor:
+        return AsyncMemoryCursor(self.delegate.aggregate(pipeline, **kwargs))
+
+    def list_indexes(self) -> AsyncMemoryCursor:
+        cursor = MemoryCursor(self.delegate)
+        cursor._results = self.delegate.list_indexes()
+        return AsyncMemoryCursor(cursor)
+
+
+def _async_proxy(name: str):
+    async def method(self, *args, **kwargs):
+        await _simulated_io()
+        return getattr(self.delegate, name)(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+for _name in (
+    "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "count_documents", "estimated_document_count", "distinct",
+    "find_one_and_update", "find_one_and_replace", "find_one_and_delete", "bulk_write",
+    "create_index", "create_indexes", "drop_index", "index_information", "drop",
+):
+    setattr(AsyncMemoryCollection, _name, _async_proxy(_name))
+
+
+class AsyncMemoryAdmin:
+    async def command(self, cmd: Any, *args, **kwargs) -> Dict[str, Any]:
+        await _simulated_io()
+        return {"ok": 1.0}
+
+
+class AsyncMemoryDatabase:
+    def __init__(self, client: "AsyncMemoryClient", database: MemoryDatabase):
+        self.client = client
+        self.delegate = database
+        self.name = database.name
+        self._collections: Dict[str, AsyncMemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> AsyncMemoryCollection:
+        return self.get_collection(name)
+
+    def get_collection(self, name: str, **kwargs) -> AsyncMemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = AsyncMemoryCollection(self, self.delegate[name])
+        return self._collections[name]
+
+    async def list_collection_names(self, **kwargs) -> List[str]:
+        return self.delegate.list_collection_names()
+
+    async def command(self, cmd: Any, *args, **kwargs) -> Dict[str, Any]:
+        await _simulated_io()
+        return {"ok": 1.0}
+
+
+class AsyncMemoryClient:
+    def __init__(self, client: Optional[MemoryClient] = None):
+        self.delegate = client or get_memory_client()
+        self.admin = AsyncMemoryAdmin()
+        self._databases: Dict[str, AsyncMemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> AsyncMemoryDatabase:
+        return self.get_database(name)
+
+    def get_database(self, name: str, **kwargs) -> AsyncMemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = AsyncMemoryDatabase(self, self.delegate[name])
+        return self._databases[name]
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncMemoryGridOut:
+    """Async view of a stored file (AsyncIOMotorGridOut call shape)"""
+
+    def __init__(self, grid_out: MemoryGridOut):
+        self.delegate = grid_out
+        self._id = grid_out._id
+        self.filename = grid_out.filename
+        self.length = grid_out.length
+        self.chunk_size = grid_out.chunk_size
+        self.upload_date = grid_out.upload_date
+        self.metadata = grid_out.metadata
+        self.content_type = grid_out.content_type
+
+    async def read(self, size: int = -1) -> bytes:
+        await _simulated_io()
+        return self.delegate.read(size)
+
+    async def readchunk(self) -> bytes:
+        await _simulated_io()
+        return self.delegate.readchunk()
+
+    def seek(self, pos: int, whence: int = 0) -> int:
+        return self.delegate.seek(pos, whence)
+
+    def tell(self) -> int:
+        return self.delegate.tell()
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncMemoryGridIn:
+    """Writable upload stream (AsyncIOMotorGridIn call shape)"""
+
+    def __init__(self, fs: MemoryGridFS, filename: str, metadata: Optional[Dict[str, Any]],
+                 chunk_size: int, file_id: Any = None):
+        self._fs = fs
+        self._id = file_id or ObjectId()
+        self.filename = filename
+        self._metadata = metadata
+        self._chunk_size = chunk_size
+        self._parts: List[bytes] = []
+        self.closed = False
+
+    async def write(self, data: bytes) -> None:
+        await _simulated_io()
+        self._parts.append(bytes(data))
+
+    async def abort(self) -> None:
+        self._parts = []
+        self.closed = True
+
+    async def close(self) -> None:
+        if self.closed:
+            return
+        kwargs: Dict[str, Any] = {"_id": self._id, "filename": self.filename, "chunk_size": self._chunk_size}
+        if self._metadata is not None:
+            kwargs["metadata"] = _encode(self._metadata)
+        self._fs.put(b"".join(self._parts), **kwargs)
+        self._parts = []
+        self.closed = True
+
+
+class AsyncMemoryGridFSBucket:
+    """AsyncIOMotorGridFSBucket replacement backed by MemoryGridFS"""
+
+    def __init__(self, database: Any, bucket_name: str = "fs", chunk_size_bytes: int = DEFAULT_CHUNK_SIZE):
+        raw_db = database.delegate if isinstance(database, AsyncMemoryDatabase) else database
+        self._fs = MemoryGridFS(raw_db, bucket_name)
+        self._chunk_size = chunk_size_bytes
+
+    def open_upload_stream(self, filename: str, chunk_size_bytes: Optional[int] = None,
+                           metadata: Optional[Dict[str, Any]] = None) -> AsyncMemoryGridIn:
+        return AsyncMemoryGridIn(self._fs, filename, metadata, chunk_size_bytes or self._chunk_size)
+
+    def open_upload_stream_with_id(self, file_id: Any, filename: str, chunk_size_bytes: Optional[int] = None,
+                                   metadata: Optional[Dict[str, Any]] = None) -> AsyncMemoryGridIn:
+        return AsyncMemoryGridIn(self._fs, filename, metadata, chunk_size_bytes or self._chunk_size, file_id)
+
+    async def upload_from_stream(self, filename: str, source: Any, chunk_size_bytes: Optional[int] = None,
+                                 metadata: Optional[Dict[str, Any]] = None) -> ObjectId:
+        stream = self.open_upload_stream(filename, chunk_size_bytes, metadata)
+        payload = source.read() if hasattr(source, "read") else source
+        await stream.write(payload)
+        await stream.close()
+        return stream._id
+
+    async def open_download_stream(self, file_id: Any) -> AsyncMemoryGridOut:
+        await _simulated_io()
+        return AsyncMemoryGridOut(self._fs.get(file_id))
+
+    async def delete(self, file_id: Any) -> None:
+        await _simulated_io()
+        if not self._fs.exists(file_id):
+            raise NoFile(f"File id {file_id!r} not found")
+        self._fs.delete(file_id)
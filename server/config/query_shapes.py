@@ -0,0 +1,255 @@
+"""
+Registry of the query shapes issued by the API.
+
+``index_advisor.py`` runs ``explain()`` on every entry and reports plans that
+fall back to a collection scan (COLLSCAN) or an in-memory SORT. When adding a
+query to a route or service, register its shape here (placeholder values are
+fine; only the fields and operators matter to the planner) and make sure a
+matching index is declared in config/indexes.py.
+"""
+
+from typing import Any, Dict, List
+
+# Each shape: name, collection, filter, and optional sort/limit.
+QUERY_SHAPES: List[Dict[str, Any]] = [
+    # ---- applications ----
+    {
+        "name": "application_by_id",
+        "source": "ApplicationService.* / analyst, customer routes",
+        "collection": "applications",
+        "filter": {"id": "APP-00000000"},
+    },
+    {
+        "name": "customer_owned_application",
+        "source": "routes/customer.py (pay, receipt, upload, status)",
+        "collection": "applications",
+        "filter": {"id": "APP-00000000", "customer_id": "customer1"},
+    },
+    {
+        "name": "customer_draft",
+        "source": "ApplicationService.get_customer_applications",
+        "collection": "applications",
+        "filter": {"customer_id": "customer1", "status": "draft"},
+    },
+    {
+        "name": "customer_submitted",
+        "source": "ApplicationService.get_customer_applications",
+        "collection": "applications",
+        "filter": {"customer_id": "customer1", "status": {"$ne": "draft"}},
+    },
+    {
+        "name": "customer_latest_application",
+        "source": "main.py /application-status",
+        "collection": "applications",
+        "filter": {"customer_id": "customer1"},
+        "sort": [("created_at", -1)],
+        "limit": 1,
+    },
+    {
+        "name": "analyst_queue",
+        "source": "ApplicationService.get_analyst_applications",
+        "collection": "applications",
+        "filter": {"status": "submitted", "input_ready": {"$ne": True}},
+    },
+    {
+        "name": "underwriter_case_queue",
+        "source": "ApplicationService.get_underwriter_applications",
+        "collection": "applications",
+        "filter": {"$or": [
+            {"status": "analyst_approved"},
+            {"state": "underwriter_review"},
+            {"status": "submitted", "input_ready": True},
+        ]},
+    },
+    {
+        "name": "underwriter_under_review",
+        "source": "ApplicationService.get_underwriter_applications",
+        "collection": "applications",
+        "filter": {"$or": [{"status": "under_review"}, {"state": "under_review"}]},
+    },
+    {
+        "name": "newest_applications",
+        "source": "routes/auditor.py",
+        "collection": "applications",
+        "filter": {},
+        "sort": [("created_at", -1)],
+        "limit": 500,
+    },
+    {
+        "name": "verification_sweep_candidates",
+        "source": "services/verification_jobs.py run_verification_sweep",
+        "collection": "applications",
+        "filter": {"status": {"$in": ["submitted"]}, "verification_data": {"$exists": False}},
+    },
+    # ---- documents ----
+    {
+        "name": "documents_of_application",
+        "source": "ApplicationService.get_application_details",
+        "collection": "documents",
+        "filter": {"application_id": "APP-00000000"},
+    },
+    {
+        "name": "latest_document_of_application",
+        "source": "routes/analyst.py verify_application_document",
+        "collection": "documents",
+        "filter": {"application_id": "APP-00000000"},
+        "sort": [("uploaded_at", -1)],
+        "limit": 1,
+    },
+    {
+        "name": "documents_of_sweep_batch",
+        "source": "services/verification_jobs.py _documents_by_application",
+        "collection": "documents",
+        "filter": {"application_id": {"$in": ["APP-00000000", "APP-00000001"]}},
+    },
+    {
+        "name": "document_for_download",
+        "source": "docs/routes.py download_application_document",
+        "collection": "documents",
+        "filter": {"id": "DOC-00000000", "application_id": "APP-00000000"},
+        "limit": 1,
+    },
+    # ---- messages ----
+    {
+        "name": "messages_of_application",
+        "source": "ApplicationService.get_application_details",
+        "collection": "messages",
+        "filter": {"application_id": "APP-00000000"},
+    },
+    {
+        "name": "customer_messages",
+        "source": "ApplicationService.get_customer_applications",
+        "collection": "messages",
+        "filter": {"application_id": {"$in": ["APP-00000000", "APP-00000001"]}, "to_role": "customer"},
+    },
+    # ---- audit_events ----
+    {
+        "name": "application_timeline",
+        "source": "routes/auditor.py, routes/customer.py, main.py",
+        "collection": "audit_events",
+        "filter": {"application_id": "APP-00000000"},
+        "sort": [("created_at", 1)],
+    },
+    {
+        "name": "recent_audit_events",
+        "source": "routes/auditor.py auditor_dashboard / list_audit_events",
+        "collection": "audit_events",
+        "filter": {},
+        "sort": [("created_at", -1)],
+        "limit": 100,
+    },
+    {
+        "name": "audit_events_by_action",
+        "source": "routes/auditor.py list_audit_events",
+        "collection": "audit_events",
+        "filter": {"action": "submitted"},
+        "sort": [("created_at", -1)],
+        "limit": 100,
+    },
+    {
+        "name": "audit_events_by_actor_role",
+        "source": "routes/auditor.py list_audit_events",
+        "collection": "audit_events",
+        "filter": {"actor_role": "analyst"},
+        "sort": [("created_at", -1)],
+        "limit": 100,
+    },
+    {
+        "name": "knowledge_document_uploads",
+        "source": "routes/admin.py list_knowledge_documents",
+        "collection": "audit_events",
+        "filter": {"action": "document_upload"},
+        "sort": [("created_at", -1)],
+    },
+    {
+        "name": "knowledge_document_by_id",
+        "source": "routes/admin.py delete_knowledge_document",
+        "collection": "audit_events",
+        "filter": {"document_id": "00000000-0000-0000-0000-000000000000"},
+    },
+    {
+        "name": "compliance_scan_batch",
+        "source": "services/compliance_scanner.py ComplianceScanner.scan",
+        "collection": "audit_events",
+        "filter": {"_id": {"$gt": "000000000000000000000000", "$lt": "ffffffffffffffffffffffff"}},
+        "sort": [("_id", 1)],
+        "limit": 1000,
+    },
+    # ---- compliance_issues ----
+    {
+        "name": "compliance_issue_upsert",
+        "source": "services/compliance_scanner.py ComplianceScanner.scan",
+        "collection": "compliance_issues",
+        "filter": {"event_oid": "000000000000000000000000", "field": "action"},
+    },
+    {
+        "name": "recent_compliance_issues",
+        "source": "services/compliance_scanner.py ComplianceScanner.list_issues",
+        "collection": "compliance_issues",
+        "filter": {},
+        "sort": [("detected_at", -1)],
+    },
+    # ---- jobs ----
+    {
+        "name": "job_by_id",
+        "source": "services/jobs.py JobRunner.get",
+        "collection": "jobs",
+        "filter": {"id": "JOB-00000000"},
+    },
+    {
+        "name": "job_by_idempotency_key",
+        "source": "services/jobs.py JobRunner.enqueue",
+        "collection": "jobs",
+        "filter": {"idempotency_key": "verify-document:APP-00000000:DOC-00000000"},
+    },
+    {
+        "name": "job_claim_queued",
+        "source": "services/jobs.py JobRunner._claim",
+        "collection": "jobs",
+        "filter": {"status": "queued", "run_after": {"$lte": "2024-01-01T00:00:00"}},
+        "sort": [("run_after", 1)],
+        "limit": 1,
+    },
+    {
+        "name": "job_claim_expired_lease",
+        "source": "services/jobs.py JobRunner._claim",
+        "collection": "jobs",
+        "filter": {"status": "running", "lease_until": {"$lt": "2024-01-01T00:00:00"},
+                   "$expr": {"$lt": ["$attempts", "$max_attempts"]}},
+        "sort": [("lease_until", 1)],
+        "limit": 1,
+    },
+    {
+        "name": "job_fail_exhausted_lease",
+        "source": "services/jobs.py JobRunner._fail_exhausted_leases",
+        "collection": "jobs",
+        "filter": {"status": "running", "lease_until": {"$lt": "2024-01-01T00:00:00"},
+                   "$expr": {"$gte": ["$attempts", "$max_attempts"]}},
+    },
+    # ---- extraction cache ----
+    {
+        "name": "extraction_cache_entry",
+        "source": "services/extraction_cache.py ExtractionCache.get/put",
+        "collection": "extraction_cache",
+        "filter": {"key": "0" * 64 + ":simulated-1:0000000000000000"},
+    },
+    # ---- users / payments ----
+    {
+        "name": "user_by_username",
+        "source": "auth/routes.py login/signup",
+        "collection": "users",
+        "filter": {"username": "customer1"},
+    },
+    {
+        "name": "payment_method_of_user",
+        "source": "routes/customer.py",
+        "collection": "payments",
+        "filter": {"user_id": "customer1"},
+    },
+    {
+        "name": "payment_receipt",
+        "source": "routes/customer.py get_payment_receipt",
+        "collection": "payments",
+        "filter": {"id": "PMT-00000000", "application_id": "APP-00000000", "user_id": "customer1"},
+    },
+]
@@ -7,37 +7,38 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from auth.hash_utils import hash_password
+from auth.hash_utils import calibrate_rounds, hash_password
 from config.db import users_collection
 
 def create_test_users():
     """Create test users for different roles"""
+    calibrate_rounds()
     
     # Test users data
     test_users = [
         {
             "username": "customer1",
-            "password": hash_password("password123"),
+            "password": "password123",
             "role": "customer"
         },
         {
             "username": "analyst1", 
-            "password": hash_password("password123"),
+            "password": "password123",
             "role": "analyst"
         },
         {
             "username": "underwriter1",
-            "password": hash_password("password123"), 
+            "password": "password123", 
             "role": "underwriter"
         },
         {
             "username": "admin1",
-            "password": hash_password("password123"),
+            "password": "password123",
             "role": "admin"
         },
         {
             "username": "auditor1",
-            "password": hash_password("password123"),
+            "password": "password123",
             "role": "auditor"
         }
     ]
@@ -48,13 +49,13 @@ def create_test_users():
         if existing_user:
             print(f"User {user_data['username']} already exists, skipping...")
         else:
-            users_collection.insert_one(user_data)
+            users_collection.insert_one({**user_data, "password": hash_password(user_data["password"])})
             print(f"Created user: {user_data['username']} with role: {user_data['role']}")
     
     print("\nTest users created successfully!")
     print("You can now log in with any of these credentials:")
     for user_data in test_users:
-        print(f"  Username: {user_data['username']}, Password: password123, Role: {user_data['role']}")
+        print(f"  Username: {user_data['username']}, Password: {user_data['password']}, Role: {user_data['role']}")
 
 if __name__ == "__main__":
     try:
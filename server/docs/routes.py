@@ -1,6 +1,12 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Optional, Tuple
+from urllib.parse import quote
 from auth.routes import get_current_user
 from routes.support import load_vectorstore
+from services.application_service import ApplicationService
+from services.blob_store import BlobNotFound, blob_ref, get_blob_store
+import hashlib
 import uuid
 
 router = APIRouter()
@@ -23,13 +29,148 @@ async def upload_docs(
     try:
         doc_id = str(uuid.uuid4())
         print(f"Generated doc_id: {doc_id}")
-        await load_vectorstore([file], role, doc_id)  # ✅ AWAIT here
+        stored = await load_vectorstore([file], role, doc_id)
         print(f"Vectorstore loaded successfully for {file.filename}")
         return {
             "message": f"{file.filename} uploaded successfully",
             "doc_id": doc_id,
-            "accessible_to": role
+            "accessible_to": role,
+            "sha256": stored["files"][0]["sha256"],
+            "size": stored["files"][0]["size"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in upload_docs: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+
+# -------- Application document download --------
+# Reviewers page through large PDFs with Range requests; bytes are streamed
+# from the blob store (only the requested range is read) and never buffered.
+DOWNLOAD_ROLES = {"analyst", "underwriter", "admin", "auditor"}
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(start, end exclusive) of a single ``bytes=`` range, or None to send everything.
+
+    Multi-range and malformed headers are ignored (full response); a
+    well-formed range outside the file raises ValueError (416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    if not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+        return None
+    if size == 0:
+        # No byte of an empty file can be addressed
+        raise ValueError("range not satisfiable")
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    end = int(last) + 1 if last else size
+    return start, min(end, size)
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """Weak comparison used by If-None-Match"""
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return "*" in tags or any((t[2:] if t.startswith("W/") else t) == bare for t in tags)
+
+
+@router.get("/applications/{application_id}/documents/{document_id}/download")
+async def download_application_document(
+    application_id: str,
+    document_id: str,
+    request: Request,
+    user=Depends(get_current_user)
+):
+    """Stream an application document (supports Range, ETag and If-None-Match)"""
+    from config.async_db import applications_collection
+
+    if user["role"] not in DOWNLOAD_ROLES:
+        if user["role"] != "customer":
+            raise HTTPException(status_code=403, detail="Not allowed to download documents")
+        owned = await applications_collection.find_one(
+            {"id": application_id, "customer_id": user["username"]}, {"_id": 1}
+        )
+        if not owned:
+            raise HTTPException(status_code=404, detail="Document not found")
+
+    document = await ApplicationService.get_document_metadata(application_id, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    ref = blob_ref(document)
+    inline = None
+    if ref:
+        store = get_blob_store(ref["backend"])
+        try:
+            size = await store.size(ref["key"])
+        except BlobNotFound:
+            raise HTTPException(status_code=404, detail="Document content not found")
+        # Uploads since the streaming blob store carry their SHA-256; older
+        # blobs are immutable, so key + size identifies them (weak tag)
+        etag = f'"{document["sha256"]}"' if document.get("sha256") else f'W/"{ref["key"]}-{size}"'
+    else:
+        # Legacy record with inline bytes (until migrate_document_blobs.py runs)
+        inline = await ApplicationService.get_document_content(document)
+        if inline is None:
+            raise HTTPException(status_code=404, detail="Document content not found")
+        if isinstance(inline, str):
+            inline = inline.encode("utf-8")
+        size = len(inline)
+        etag = f'"{hashlib.sha256(inline).hexdigest()}"'
+
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"inline; filename*=UTF-8''{quote(document.get('filename') or document_id)}",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and (if_range != etag or etag.startswith("W/")):
+        # The client's partial copy is stale: send the whole current file
+        range_header = None
+    try:
+        byte_range = _parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, end = 0, size
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+
+    media_type = document.get("content_type") or "application/octet-stream"
+    path = store.local_path(ref["key"]) if inline is None else None
+    if path is not None and status_code == 200 and not request.headers.get("range"):
+        # Whole file on local disk: let the server send it (pathsend/zero-copy when supported)
+        return FileResponse(path, media_type=media_type, headers=headers)
+    if inline is not None:
+        body = iter([inline[start:end]])
+    else:
+        body = store.stream(ref["key"], start=start, end=end)
+    return StreamingResponse(
+        body,
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
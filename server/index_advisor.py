@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Index advisor
+
+Runs explain() for every query shape registered in config/query_shapes.py and
+reports winning plans that contain a COLLSCAN (no usable index) or a blocking
+in-memory SORT stage (index does not provide the requested order).
+
+Usage:
+    python index_advisor.py              # report all shapes
+    python index_advisor.py --only-issues
+    python index_advisor.py --strict     # exit 1 if any shape has an issue (CI)
+    python index_advisor.py --shape analyst_queue
+"""
+
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from typing import Any, Dict, List
+
+from config.db import get_database
+from config.query_shapes import QUERY_SHAPES
+
+# Stages that indicate the plan is not served by an index
+PROBLEM_STAGES = {
+    "COLLSCAN": "collection scan",
+    "SORT": "in-memory sort",
+}
+
+
+def _collect_stages(node: Any, out: List[str]) -> None:
+    """Walk an explain plan (classic or SBE layout) and collect every stage name"""
+    if isinstance(node, dict):
+        stage = node.get("stage")
+        if isinstance(stage, str):
+            out.append(stage)
+        for value in node.values():
+            _collect_stages(value, out)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_stages(value, out)
+
+
+def _index_names(node: Any, out: List[str]) -> None:
+    if isinstance(node, dict):
+        if node.get("stage") == "IXSCAN" and node.get("indexName"):
+            out.append(node["indexName"])
+        for value in node.values():
+            _index_names(value, out)
+    elif isinstance(node, list):
+        for value in node:
+            _index_names(value, out)
+
+
+def analyze_shape(db, shape: Dict[str, Any]) -> Dict[str, Any]:
+    """Explain one shape and summarize the winning plan"""
+    cursor = db[shape["collection"]].find(shape.get("filter", {}))
+    if shape.get("sort"):
+        cursor = cursor.sort(shape["sort"])
+    if shape.get("limit"):
+        cursor = cursor.limit(shape["limit"])
+    explain = cursor.explain()
+
+    winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+    stages: List[str] = []
+    _collect_stages(winning, stages)
+    indexes: List[str] = []
+    _index_names(winning, indexes)
+
+    issues = [PROBLEM_STAGES[s] for s in PROBLEM_STAGES if s in stages]
+    return {
+        "name": shape["name"],
+        "collection": shape["collection"],
+        "source": shape.get("source", ""),
+        "stages": stages,
+        "indexes": sorted(set(indexes)),
+        "issues": issues,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Explain registered query shapes")
+    parser.add_argument("--shape", action="append", help="Only analyze the named shape (repeatable)")
+    parser.add_argument("--only-issues", action="store_true", help="Hide shapes with healthy plans")
+    parser.add_argument("--strict", action="store_true", help="Exit with status 1 if any issue is found")
+    args = parser.parse_args()
+
+    db = get_database()
+    shapes = [s for s in QUERY_SHAPES if not args.shape or s["name"] in args.shape]
+    if not shapes:
+        print("❌ No matching query shapes")
+        return 1
+
+    print("🔎 INDEX ADVISOR")
+    print("=" * 60)
+    problem_count = 0
+    for shape in shapes:
+        try:
+            report = analyze_shape(db, shape)
+        except Exception as e:
+            problem_count += 1
+            print(f"❌ {shape['name']} ({shape['collection']}): explain failed: {e}")
+            continue
+        if report["issues"]:
+            problem_count += 1
+            print(f"⚠️  {report['name']} ({report['collection']}): {', '.join(report['issues'])}")
+            print(f"    filter: {shape.get('filter', {})} sort: {shape.get('sort')}")
+            print(f"    source: {report['source']}")
+            print(f"    plan:   {' <- '.join(report['stages'])}")
+        elif not args.only_issues:
+            print(f"✅ {report['name']} ({report['collection']}): {', '.join(report['indexes']) or 'index'}")
+
+    print("=" * 60)
+    print(f"📊 {len(shapes)} shapes analyzed, {problem_count} with issues")
+    if problem_count:
+        print("💡 Declare a matching index in config/indexes.py and run migrate_indexes.py")
+    return 1 if (args.strict and problem_count) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
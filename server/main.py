@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI, Form, File, HTTPException, UploadFile, Depends
 from auth.routes import router as auth_router, get_current_user
 from docs.routes import router as docs_router
@@ -7,12 +8,49 @@ from routes.underwriter import router as underwriter_router
 from routes.admin import router as admin_router
 from routes.support import router as support_router
 from routes.auditor import router as auditor_router
+from routes.jobs import router as jobs_router
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from config import async_db
+from services.audit_writer import audit_writer
+from services import counters
+from services.counters import counter_reconciler
+from services.compliance_scanner import compliance_scanner
+from auth.user_claims import user_claims
+from auth import hash_utils
+from services.support_index import support_index
+from services.llm_gateway import llm_gateway
+from services.jobs import job_runner
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker startup/shutdown: one connectivity ping, no index round trips"""
+    await async_db.connect()
+    await hash_utils.calibrate()
+    await asyncio.to_thread(support_index.refresh)
+    llm_gateway.start()
+    audit_writer.start()
+    counter_reconciler.start()
+    compliance_scanner.start()
+    job_runner.start()
+    yield
+    # Interrupted jobs are re-claimed by another worker when their lease expires
+    await job_runner.stop()
+    await llm_gateway.stop()
+    await compliance_scanner.stop()
+    await counter_reconciler.stop()
+    # Drain buffered audit events before the pool goes away
+    await audit_writer.stop()
+    hash_utils.shutdown()
+    async_db.close()
+
 
 app = FastAPI(
     title="Financial RBAC RAG System",
     description="A comprehensive financial system with role-based access control and interconnected workflows",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -33,6 +71,7 @@ app.include_router(underwriter_router, prefix="/underwriter", tags=["Underwriter
 app.include_router(admin_router, prefix="/admin", tags=["Admin Operations"])
 app.include_router(support_router, prefix="/support", tags=["Support"])
 app.include_router(auditor_router, prefix="/auditor", tags=["Auditor Operations"])
+app.include_router(jobs_router, prefix="/jobs", tags=["Background Jobs"])
 
 @app.get("/")
 async def root():
@@ -54,13 +93,14 @@ async def health_check():
     return {"status": "healthy", "timestamp": "2024-01-01T00:00:00Z"}
 
 @app.delete("/admin/reset-database")
-def reset_database(user=Depends(get_current_user)):
+async def reset_database(user=Depends(get_current_user)):
     """Reset the entire database - remove all users, applications, and documents"""
     if user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail="Only admin can reset database")
     
     try:
-        from config.db import users_collection, applications_collection, documents_collection, audit_events_collection, payments_collection
+        from config.async_db import users_collection, applications_collection, documents_collection, audit_events_collection, payments_collection, jobs_collection, extraction_cache_collection
+        from services.extraction_cache import extraction_cache
         
         # Delete all collections
         collections = [
@@ -69,12 +109,18 @@ def reset_database(user=Depends(get_current_user)):
             ("documents", documents_collection),
             ("audit_events", audit_events_collection),
             ("payments", payments_collection),
+            ("jobs", jobs_collection),
+            ("extraction_cache", extraction_cache_collection),
         ]
         
         results = {}
         for name, collection in collections:
-            delete_result = collection.delete_many({})
+            delete_result = await collection.delete_many({})
             results[name] = f"Deleted {delete_result.deleted_count} documents"
+        await counters.reconcile()
+        await compliance_scanner.reset()
+        user_claims.clear()
+        extraction_cache.clear()
         
         return {
             "message": "Database reset successfully",
@@ -85,24 +131,17 @@ def reset_database(user=Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Error resetting database: {str(e)}")
 
 @app.get("/stats")
-def get_live_stats(user=Depends(get_current_user)):
+async def get_live_stats(user=Depends(get_current_user)):
     """Get live statistics for dashboard widgets based on actual data"""
     try:
-        from config.db import applications_collection, documents_collection, users_collection
-        
-        # Count applications by status
-        active_applications = applications_collection.count_documents({"status": {"$in": ["submitted", "under_review", "pending"]}})
-        applications_pending = applications_collection.count_documents({"status": "pending"})
-        approved_today = applications_collection.count_documents({
-            "status": "approved",
-            "updated_at": {"$gte": "2024-01-01"}  # Today's date logic can be improved
-        })
-        
-        # Count documents
-        documents_count = documents_collection.count_documents({})
-        
-        # Count users
-        active_users = users_collection.count_documents({})
+        # One read of the materialized counters (services/counters.py)
+        stats = await counters.get_counters()
+        app_stats = stats.get("applications") or {}
+        active_applications = sum(max(0, int(app_stats.get(s, 0))) for s in ("submitted", "under_review", "pending"))
+        applications_pending = max(0, int(app_stats.get("pending", 0)))
+        approved_today = counters.approved_today(stats)
+        documents_count = int(stats.get("documents_total", 0))
+        active_users = int(stats.get("users_total", 0))
         
         # Mock some counts that would need more complex logic
         support_tickets = 0  # Would need a support tickets collection
@@ -193,16 +232,16 @@ async def upload_docs_direct(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @app.get("/application-status")
-def get_application_status(user=Depends(get_current_user)):
+async def get_application_status(user=Depends(get_current_user)):
     """Get the latest application status for the current customer"""
     if user["role"] != "customer":
         raise HTTPException(status_code=403, detail="Only customers can access application status")
     
     try:
-        from config.db import applications_collection, audit_events_collection
+        from config.async_db import applications_collection, audit_events_collection
         
         # Find the latest application for this customer (most recent by created_at)
-        latest_application = applications_collection.find_one(
+        latest_application = await applications_collection.find_one(
             {"customer_id": user["username"]},
             sort=[("created_at", -1)]  # Sort by created_at descending to get latest first
         )
@@ -210,11 +249,12 @@ def get_application_status(user=Depends(get_current_user)):
         if not latest_application:
             raise HTTPException(status_code=404, detail="No applications found for this customer")
         
-        # Get audit events for this application
-        audit_events = list(audit_events_collection.find(
+        # Get audit events for this application (including still-buffered ones)
+        await audit_writer.flush()
+        audit_events = await audit_events_collection.find(
             {"application_id": latest_application["id"]},
             sort=[("created_at", 1)]  # Sort chronologically
-        ))
+        ).to_list(length=None)
         
         # Convert ObjectIds to strings for JSON serialization
         for event in audit_events:
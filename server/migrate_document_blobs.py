@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Document blob migration
+
+Moves legacy inline ``content`` out of the ``documents`` collection into the
+blob store (services/blob_store.py) in batches. Each document's bytes are
+written under a key derived from its ``_id``, then the record is switched to
+``blob_backend``/``blob_key`` and ``content`` is unset in one conditional
+update. Interrupting the run is safe: already-moved records no longer match,
+and re-writing a blob for a half-migrated record is idempotent.
+
+Usage:
+    python migrate_document_blobs.py                  # move everything
+    python migrate_document_blobs.py --dry-run        # count what would move
+    python migrate_document_blobs.py --backend local  # target a specific backend
+    python migrate_document_blobs.py --batch-size 50 --limit 1000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+
+from config import async_db
+from services.blob_store import BLOB_STORE_BACKEND, store_document_blob
+
+LEGACY_FILTER = {"content": {"$exists": True}}
+
+
+def blob_key_for(doc_id) -> str:
+    """Deterministic blob key for a document ``_id`` (valid for every backend).
+
+    ObjectIds are used as-is; any other ``_id`` maps to an ObjectId built
+    from the SHA-256 of its string form, so a rerun after a crash between
+    writing the blob and updating the record reuses the same blob.
+    """
+    if isinstance(doc_id, ObjectId):
+        return str(doc_id)
+    return str(ObjectId(hashlib.sha256(str(doc_id).encode("utf-8")).digest()[:12]))
+
+
+async def migrate(backend: str, batch_size: int, limit: int, dry_run: bool) -> int:
+    documents = async_db.documents_collection
+    pending = await documents.count_documents(LEGACY_FILTER)
+    print(f"📦 {pending} document(s) with inline content")
+    if dry_run or not pending:
+        return 0
+
+    moved = 0
+    last_id = None
+    while not limit or moved < limit:
+        query = dict(LEGACY_FILTER)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        size = batch_size if not limit else min(batch_size, limit - moved)
+        batch = await documents.find(query).sort("_id", 1).limit(size).to_list(length=size)
+        if not batch:
+            break
+
+        for doc in batch:
+            last_id = doc["_id"]
+            content = doc.get("content")
+            if isinstance(content, str):
+                content = content.encode("utf-8")
+            content = bytes(content or b"")
+            # Deterministic key: a retried document overwrites (or reuses) its own blob
+            key = blob_key_for(doc["_id"])
+            blob_fields = await store_document_blob(
+                content,
+                doc.get("filename") or str(doc["_id"]),
+                doc.get("content_type"),
+                metadata={"application_id": doc.get("application_id"), "document_id": doc.get("id")},
+                backend=backend,
+                key=key,
+            )
+            result = await documents.update_one(
+                {"_id": doc["_id"], "content": {"$exists": True}},
+                {"$set": blob_fields, "$unset": {"content": ""}},
+            )
+            moved += result.modified_count
+
+        print(f"   ✅ {moved}/{pending} moved")
+
+    remaining = await documents.count_documents(LEGACY_FILTER)
+    print(f"📊 {moved} moved to '{backend}', {remaining} remaining")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Move inline document content into the blob store")
+    parser.add_argument("--backend", default=BLOB_STORE_BACKEND, choices=["gridfs", "local"],
+                        help="Target blob store backend (default: BLOB_STORE_BACKEND)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Documents read per batch")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after moving this many documents")
+    parser.add_argument("--dry-run", action="store_true", help="Only count documents to migrate")
+    args = parser.parse_args()
+
+    async def run() -> int:
+        await async_db.connect()
+        try:
+            return await migrate(args.backend, args.batch_size, args.limit, args.dry_run)
+        finally:
+            async_db.close()
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        print(f"❌ Document blob migration failed: {e}")
+        sys.exit(1)
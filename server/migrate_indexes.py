@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Index migration tool
+
+Compares the indexes declared in config/indexes.py with the ones that exist
+in MongoDB and creates/rebuilds only what differs. Safe to run repeatedly
+(e.g. on every deploy); a second run reports that everything is up to date.
+
+Usage:
+    python migrate_indexes.py            # apply missing/changed indexes
+    python migrate_indexes.py --dry-run  # only show the plan
+    python migrate_indexes.py --prune    # also drop undeclared indexes
+"""
+
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.db import get_database
+from config.indexes import plan_migration, apply_migration, describe
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Apply declared MongoDB indexes")
+    parser.add_argument("--dry-run", action="store_true", help="Print the plan without changing anything")
+    parser.add_argument("--prune", action="store_true", help="Drop indexes that are not declared")
+    args = parser.parse_args()
+
+    db = get_database()
+    print("🔍 Comparing declared indexes with list_indexes()...")
+    plan = plan_migration(db)
+
+    if not plan:
+        print("✅ Indexes are up to date. Nothing to do.")
+        return 0
+
+    for coll_name, actions in plan.items():
+        print(f"\n📂 {coll_name}")
+        for model in actions["create"]:
+            print(f"   + create  {describe(model)}")
+        for model in actions["rebuild"]:
+            print(f"   ~ rebuild {describe(model)}")
+        for name in actions["extra"]:
+            marker = "- drop   " if args.prune else "? extra  "
+            print(f"   {marker} {name}")
+
+    if args.dry_run:
+        print("\n💡 Dry run only; no changes applied.")
+        return 0
+
+    apply_migration(db, plan, prune=args.prune)
+    print("\n✅ Index migration completed.")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        print(f"❌ Index migration failed: {e}")
+        sys.exit(1)
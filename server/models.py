@@ -163,6 +163,12 @@ class RequestInfoRequest(BaseModel):
 class MarkReadyRequest(BaseModel):
     input_ready: bool
 
+class VerificationSweepRequest(BaseModel):
+    # Applications in these statuses are verified in one background job
+    statuses: List[ApplicationStatus] = Field(default_factory=lambda: [ApplicationStatus.SUBMITTED])
+    unverified_only: bool = True
+    limit: Optional[int] = None
+
 class DecisionRequest(BaseModel):
     decision: str  # "approve", "decline", "pend"
     reason: str
@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Form
 from typing import List, Dict, Any
+import asyncio
 import uuid
 from datetime import datetime
 from auth.routes import get_current_user
+from auth.user_claims import user_claims
 from models import CreateUserRequest
-from auth.jwt_utils import get_password_hash
+from auth.hash_utils import hash_password_async
 from routes.support import load_vectorstore
+from services.audit_writer import audit_writer
+from services.knowledge_index import knowledge_index
+from services import counters
+from pymongo import ReturnDocument
 
 router = APIRouter()
 
@@ -16,10 +22,10 @@ async def admin_dashboard(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Only admins can access this dashboard")
     
     try:
-        from config.db import applications_collection, users_collection, audit_events_collection, client
+        from config.async_db import applications_collection, users_collection, client
 
         # Users: fetch and normalize
-        raw_users = list(users_collection.find({}))
+        raw_users = await users_collection.find({}).to_list(length=None)
         users = []
         for u in raw_users:
             users.append({
@@ -32,48 +38,26 @@ async def admin_dashboard(user=Depends(get_current_user)):
             })
 
         # Applications: fetch and sanitize
-        raw_apps = list(applications_collection.find({}))
+        raw_apps = await applications_collection.find({}).to_list(length=None)
         applications = []
         for a in raw_apps:
             a = dict(a)
             a.pop("_id", None)
             applications.append(a)
 
-        # System stats
+        # System stats and distributions: one read of the materialized counters
+        stats = await counters.get_counters()
         total_applications = len(applications)
         total_users = len(users)
-        total_audit_events = audit_events_collection.count_documents({})
-
-        # Application status distribution (cover new statuses)
-        def count_status(s):
-            return applications_collection.count_documents({"status": s})
-        application_stats = {
-            "submitted": count_status("submitted"),
-            "analyst_approved": count_status("analyst_approved"),
-            "under_review": count_status("under_review"),
-            "approved": count_status("approved"),
-            "rejected": count_status("rejected"),
-            "declined": count_status("declined"),
-            "pending_more_info": count_status("pending_more_info"),
-            "draft": count_status("draft")
-        }
-
-        # User distribution by role
-        def count_role(r):
-            return users_collection.count_documents({"role": r})
-        user_stats = {
-            "customers": count_role("customer"),
-            "analysts": count_role("analyst"),
-            "underwriters": count_role("underwriter"),
-            "admins": count_role("admin"),
-            "auditors": count_role("auditor")
-        }
+        total_audit_events = int(stats.get("audit_events_total", 0))
+        application_stats = counters.application_stats(stats)
+        user_stats = counters.user_stats(stats)
 
         # Build system health (MongoDB ping + high-level metrics)
         db_ok = True
         db_error = None
         try:
-            client.admin.command('ping')
+            await client.admin.command('ping')
         except Exception as e:
             db_ok = False
             db_error = str(e)
@@ -114,9 +98,9 @@ async def list_users(user=Depends(get_current_user)):
     if user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admins can list users")
     try:
-        from config.db import users_collection
+        from config.async_db import users_collection
         from datetime import datetime
-        raw_users = list(users_collection.find({}))
+        raw_users = await users_collection.find({}).to_list(length=None)
         users = []
         for u in raw_users:
             users.append({
@@ -137,16 +121,17 @@ async def create_user(req: CreateUserRequest, user=Depends(get_current_user)):
     if user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admins can create users")
     try:
-        from config.db import users_collection
-        if users_collection.find_one({"username": req.username}):
+        from config.async_db import users_collection
+        if await users_collection.find_one({"username": req.username}):
             raise HTTPException(status_code=400, detail="User already exists")
-        users_collection.insert_one({
+        await users_collection.insert_one({
             "username": req.username,
-            "password": get_password_hash(req.password),
+            "password": await hash_password_async(req.password),
             "role": req.role,
             "name": req.name,
             "email": req.email
         })
+        await counters.user_created(req.role)
         return {"message": "User created successfully", "user": {
             "username": req.username,
             "role": req.role,
@@ -164,14 +149,20 @@ async def update_user_role(username: str, role: str = Form(...), user=Depends(ge
     if user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admins can update roles")
     try:
-        from config.db import users_collection
+        from config.async_db import users_collection
         valid_roles = ["customer", "analyst", "underwriter", "admin", "auditor"]
         if role not in valid_roles:
             raise HTTPException(status_code=400, detail=f"Invalid role. Must be one of: {valid_roles}")
-        res = users_collection.update_one({"username": username}, {"$set": {"role": role}})
-        if res.matched_count == 0:
+        user_doc = await users_collection.find_one_and_update(
+            {"username": username}, {"$set": {"role": role}, "$inc": {"claims_version": 1}},
+            return_document=ReturnDocument.BEFORE
+        )
+        if user_doc is None:
             raise HTTPException(status_code=404, detail="User not found")
-        user_doc = users_collection.find_one({"username": username})
+        # Existing tokens of this user pick up the new role on their next request
+        user_claims.bump(username, int(user_doc.get("claims_version") or 0) + 1, role)
+        await counters.user_role_changed(user_doc.get("role"), role)
+        user_doc["role"] = role
         return {"message": "Role updated", "user": {
             "username": user_doc.get("username"),
             "role": user_doc.get("role"),
@@ -189,30 +180,10 @@ async def get_reports_summary(user=Depends(get_current_user)):
     if user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admins can view reports")
     try:
-        from config.db import applications_collection, users_collection
-        # Aggregate application stats
-        def count_status(s):
-            return applications_collection.count_documents({"status": s})
-        app_stats = {
-            "draft": count_status("draft"),
-            "submitted": count_status("submitted"),
-            "analyst_approved": count_status("analyst_approved"),
-            "under_review": count_status("under_review"),
-            "approved": count_status("approved"),
-            "rejected": count_status("rejected"),
-            "declined": count_status("declined"),
-            "pending_more_info": count_status("pending_more_info")
-        }
-        # User distribution
-        def count_role(r):
-            return users_collection.count_documents({"role": r})
-        user_stats = {
-            "customers": count_role("customer"),
-            "analysts": count_role("analyst"),
-            "underwriters": count_role("underwriter"),
-            "admins": count_role("admin"),
-            "auditors": count_role("auditor")
-        }
+        # Materialized counters: a single document read
+        stats = await counters.get_counters()
+        app_stats = counters.application_stats(stats)
+        user_stats = counters.user_stats(stats)
         return {"application_stats": app_stats, "user_stats": user_stats}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error building summary report: {str(e)}")
@@ -263,15 +234,10 @@ async def upload_knowledge_documents(
         # Generate unique document ID
         doc_id = str(uuid.uuid4())
         
-        # Load documents into vector store
-        await load_vectorstore(files, role, doc_id)
+        # Save the files and add them to the knowledge index
+        stored = await load_vectorstore(files, role, doc_id)
         
         # Log the document upload
-        from config.db import audit_events_collection
-        from datetime import datetime
-        
-        # Create audit event
-        import uuid
         audit_id = f"AUDIT-{str(uuid.uuid4())[:8].upper()}"
         audit_event = {
             "id": audit_id,
@@ -281,19 +247,24 @@ async def upload_knowledge_documents(
             "role_access": role,
             "file_count": len(files),
             "file_names": [file.filename for file in files],
+            "file_sha256": [f["sha256"] for f in stored["files"]],
+            "total_bytes": sum(f["size"] for f in stored["files"]),
             "description": description,
             "created_at": datetime.utcnow()
         }
         
-        audit_events_collection.insert_one(audit_event)
+        await audit_writer.write(audit_event)
         
         return {
             "message": f"Successfully uploaded {len(files)} document(s) to knowledge base",
             "document_id": doc_id,
             "role_access": role,
-            "files": [file.filename for file in files]
+            "files": [file.filename for file in files],
+            "chunks_indexed": stored["chunks"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error uploading documents: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -305,13 +276,14 @@ async def list_knowledge_documents(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Only admins can view knowledge documents")
     
     try:
-        from config.db import audit_events_collection
+        from config.async_db import audit_events_collection
+        await audit_writer.flush()
         
         # Get all document upload events
-        document_uploads = list(audit_events_collection.find(
+        document_uploads = await audit_events_collection.find(
             {"action": "document_upload"},
             sort=[("created_at", -1)]
-        ))
+        ).to_list(length=None)
         
         # Convert ObjectIds to strings
         for doc in document_uploads:
@@ -333,14 +305,15 @@ async def delete_knowledge_document(document_id: str, user=Depends(get_current_u
         raise HTTPException(status_code=403, detail="Only admins can delete knowledge documents")
     
     try:
-        from config.db import audit_events_collection
+        from config.async_db import audit_events_collection
+        await audit_writer.flush()
         
         # Find the document upload record
-        doc_record = audit_events_collection.find_one({"document_id": document_id})
+        doc_record = await audit_events_collection.find_one({"document_id": document_id})
         if not doc_record:
             raise HTTPException(status_code=404, detail="Document not found")
         
-    # Note: In local-only mode, no external vector deletion is required
+        removed = await asyncio.to_thread(knowledge_index.delete_document, document_id)
         
         # Log the deletion
         audit_id = f"AUDIT-{str(uuid.uuid4())[:8].upper()}"
@@ -350,14 +323,15 @@ async def delete_knowledge_document(document_id: str, user=Depends(get_current_u
             "admin_username": user["username"],
             "document_id": document_id,
             "deleted_files": doc_record.get("file_names", []),
+            "chunks_removed": removed,
             "created_at": datetime.utcnow()
         }
         
-        audit_events_collection.insert_one(audit_event)
+        await audit_writer.write(audit_event)
         
         return {
             "message": f"Document {document_id} deletion logged",
-            "note": "Vector store cleanup may be required separately"
+            "chunks_removed": removed
         }
         
     except Exception as e:
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import Optional
 from auth.routes import get_current_user
-from services.application_service import ApplicationService
-from services.document_verification import DocumentVerificationService
-from models import RequestInfoRequest, MarkReadyRequest, UserRole
-from config.db import applications_collection, documents_collection, db, messages_collection
+from services.application_service import ApplicationService, ANALYST_ACTIONABLE_STATUSES
+from services.jobs import job_runner
+from services.verification_jobs import VERIFICATION_SWEEP_JOB, VERIFY_DOCUMENT_JOB, sweep_filter
+from services.audit_writer import audit_writer
+from services import counters
+from models import RequestInfoRequest, MarkReadyRequest, UserRole, VerificationSweepRequest
+from config.async_db import applications_collection, messages_collection
 from datetime import datetime
+from pymongo import ReturnDocument
 import uuid
-from bson import ObjectId
-import gridfs
 
 router = APIRouter()
 
@@ -18,7 +21,7 @@ async def get_analyst_dashboard(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Analyst access required")
     
     try:
-        dashboard_data = ApplicationService.get_analyst_applications()
+        dashboard_data = await ApplicationService.get_analyst_applications()
         return dashboard_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -30,7 +33,7 @@ async def get_submitted_applications(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Analyst access required")
     
     try:
-        dashboard_data = ApplicationService.get_analyst_applications()
+        dashboard_data = await ApplicationService.get_analyst_applications()
         return {"applications": dashboard_data["submitted_applications"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -45,7 +48,7 @@ async def get_application_details(
         raise HTTPException(status_code=403, detail="Analyst access required")
     
     try:
-        details = ApplicationService.get_application_details(
+        details = await ApplicationService.get_application_details(
             application_id, UserRole.ANALYST
         )
         return details
@@ -65,7 +68,7 @@ async def request_additional_information(
         raise HTTPException(status_code=403, detail="Analyst access required")
     
     try:
-        result = ApplicationService.request_info_from_customer(
+        result = await ApplicationService.request_info_from_customer(
             application_id,
             request_data.message,
             user["username"]
@@ -90,7 +93,7 @@ async def mark_ready_for_underwriter(
         raise HTTPException(status_code=403, detail="Analyst access required")
     
     try:
-        result = ApplicationService.mark_analyst_review_complete(
+        result = await ApplicationService.mark_analyst_review_complete(
             application_id,
             user["username"],
             mark_data.input_ready
@@ -108,25 +111,28 @@ async def mark_ready_for_underwriter(
 @router.post("/applications/{application_id}/verify-document")
 async def verify_application_document(
     application_id: str,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
     user=Depends(get_current_user)
 ):
     """
-    Verify application documents using LLM-based extraction and cross-checking
+    Queue verification of all the application's documents (LLM-based
+    extraction and cross-checking, merged into one verdict).
+
+    Returns 202 with a job id right away; poll ``GET /jobs/{job_id}`` for the
+    result (``result.verification_results`` once ``status`` is ``succeeded``).
     """
     if user["role"] != "analyst":
         raise HTTPException(status_code=403, detail="Analyst access required")
     
     try:
         # Get application
-        application = applications_collection.find_one({"id": application_id})
+        application = await applications_collection.find_one({"id": application_id}, {"_id": 0, "id": 1, "updated_at": 1})
         if not application:
             raise HTTPException(status_code=404, detail="Application not found")
         
-        # Get the most recent document for this application
-        document = documents_collection.find_one(
-            {"application_id": application_id},
-            sort=[("uploaded_at", -1)]
-        )
+        # Get the most recent document for this application (metadata only)
+        document = await ApplicationService.get_latest_document_metadata(application_id)
         if not document:
             return {
                 "success": False,
@@ -134,96 +140,75 @@ async def verify_application_document(
                 "verification_results": None
             }
         
-        # Retrieve document content
-        file_content = None
-        
-        # 1) If legacy inline content exists, use it
-        if document.get("content"):
-            file_content = document["content"]
-        else:
-            # 2) Try GridFS using file_id (string or ObjectId)
-            fs = gridfs.GridFS(db)
-            file_id = document.get("file_id")
-            if file_id:
-                try:
-                    # Convert string to ObjectId if needed
-                    fid = ObjectId(file_id) if isinstance(file_id, str) else file_id
-                    grid_file = fs.get(fid)
-                    file_content = grid_file.read()
-                except Exception as e:
-                    print(f"Warning: Could not retrieve document from GridFS: {str(e)}")
-        
-        # 3) Final fallback to mock content for testing
-        if not file_content:
-            file_content = b"Mock document content for testing purposes"
-            print(f"Warning: No retrievable content for document {document.get('_id')}, using mock content")
-        
-        # Extract information from document using LLM/OCR
-        extracted_info = DocumentVerificationService.extract_document_info(
-            file_content,
-            document["filename"],
-            document["content_type"]
+        # Repeated clicks for the same uploads and application state share one job
+        # (shared across analysts; client-supplied keys are scoped to the caller)
+        key = f"{user['username']}:{idempotency_key}" if idempotency_key else "verify-document:{}:{}:{}".format(
+            application_id, document.get("id"), application.get("updated_at")
         )
-        
-        # Cross-check with application data
-        verification_results = DocumentVerificationService.cross_check_information(
-            application["data"],
-            extracted_info
-        )
-        
-        # Generate summary
-        verification_summary = DocumentVerificationService.generate_verification_summary(
-            verification_results
-        )
-        
-        # Store verification results in application
-        applications_collection.update_one(
-            {"id": application_id},
-            {
-                "$set": {
-                    "verification_data": {
-                        "extracted_info": extracted_info,
-                        "verification_results": verification_results,
-                        "verification_summary": verification_summary,
-                        "verified_by": user["username"],
-                        "verified_at": datetime.now()
-                    },
-                    "updated_at": datetime.now()
-                }
-            }
+        job = await job_runner.enqueue(
+            VERIFY_DOCUMENT_JOB,
+            {"application_id": application_id, "actor_id": user["username"]},
+            created_by=user["username"],
+            idempotency_key=key,
         )
         
-        # Create audit event
-        from config.db import audit_events_collection
-        import uuid
-        audit_id = f"AUDIT-{str(uuid.uuid4())[:8].upper()}"
-        audit_events_collection.insert_one({
-            "id": audit_id,
-            "application_id": application_id,
-            "action": "document_verified",
-            "actor_role": "analyst",
-            "actor_id": user["username"],
-            "details": f"Document verification completed. Status: {verification_results['overall_status']}",
-            "created_at": datetime.now()
-        })
-        
+        response.status_code = 202
         return {
             "success": True,
-            "message": "Document verification completed",
-            "extracted_info": extracted_info,
-            "verification_results": verification_results,
-            "verification_summary": verification_summary
+            "message": "Document verification queued",
+            "job_id": job["id"],
+            "status": job["status"],
+            "status_url": f"/jobs/{job['id']}"
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error verifying document: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        print(f"Error queuing document verification: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error verifying document: {str(e)}")
 
 
+@router.post("/verification-sweep")
+async def start_verification_sweep(
+    request: VerificationSweepRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    user=Depends(get_current_user)
+):
+    """
+    Verify every application matching the filter in one background job.
+
+    Returns 202 with a job id; ``GET /jobs/{job_id}`` reports ``progress``
+    (processed/total, throughput) and the final counts.
+    """
+    if user["role"] != "analyst":
+        raise HTTPException(status_code=403, detail="Analyst access required")
+    if request.limit is not None and request.limit <= 0:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    
+    statuses = [s.value for s in request.statuses]
+    matching = await applications_collection.count_documents(sweep_filter(statuses, request.unverified_only))
+    job = await job_runner.enqueue(
+        VERIFICATION_SWEEP_JOB,
+        {"statuses": statuses, "unverified_only": request.unverified_only, "limit": request.limit,
+         "actor_id": user["username"]},
+        created_by=user["username"],
+        idempotency_key=f"{user['username']}:{idempotency_key}" if idempotency_key else None,
+        # A failed sweep is re-run by submitting it again (already verified ones are skipped)
+        max_attempts=1,
+    )
+    
+    response.status_code = 202
+    return {
+        "success": True,
+        "message": "Verification sweep queued",
+        "job_id": job["id"],
+        "status": job["status"],
+        "matching_applications": min(matching, request.limit) if request.limit else matching,
+        "status_url": f"/jobs/{job['id']}"
+    }
+
+
 @router.post("/applications/{application_id}/approve")
 async def approve_application(
     application_id: str,
@@ -236,22 +221,13 @@ async def approve_application(
         raise HTTPException(status_code=403, detail="Analyst access required")
     
     try:
-        # Get application
-        application = applications_collection.find_one({"id": application_id})
-        if not application:
-            raise HTTPException(status_code=404, detail="Application not found")
-        
-        # Check if document verification was done
-        verification_data = application.get("verification_data")
-        if not verification_data:
-            return {
-                "success": False,
-                "message": "Please verify documents before approving"
-            }
-        
-        # Update application status
-        applications_collection.update_one(
-            {"id": application_id},
+        # Verified and still awaiting analyst review -> underwriter queue, atomically
+        application = await applications_collection.find_one_and_update(
+            {
+                "id": application_id,
+                "status": {"$in": ANALYST_ACTIONABLE_STATUSES},
+                "verification_data": {"$nin": [None, {}]},
+            },
             {
                 "$set": {
                     "status": "analyst_approved",
@@ -260,13 +236,28 @@ async def approve_application(
                     "analyst_approved_at": datetime.now(),
                     "updated_at": datetime.now()
                 }
-            }
+            },
+            projection={"_id": 0, "status": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if application is None:
+            current = await applications_collection.find_one(
+                {"id": application_id}, {"status": 1, "verification_data": 1}
+            )
+            if not current:
+                raise HTTPException(status_code=404, detail="Application not found")
+            # Check if document verification was done
+            if not current.get("verification_data"):
+                return {
+                    "success": False,
+                    "message": "Please verify documents before approving"
+                }
+            raise HTTPException(status_code=409, detail=f"Application is already {current.get('status')}")
+        await counters.application_status_changed(application.get("status"), "analyst_approved")
         
         # Create audit event
-        from config.db import audit_events_collection
         audit_id = f"AUDIT-{str(uuid.uuid4())[:8].upper()}"
-        audit_events_collection.insert_one({
+        await audit_writer.write({
             "id": audit_id,
             "application_id": application_id,
             "action": "analyst_approved",
@@ -277,9 +268,9 @@ async def approve_application(
         })
         # Notify customer
         try:
-            from config.db import messages_collection
+            from config.async_db import messages_collection
             msg_id = ApplicationService.generate_id("MSG")
-            messages_collection.insert_one({
+            await messages_collection.insert_one({
                 "id": msg_id,
                 "application_id": application_id,
                 "from_role": "analyst",
@@ -317,14 +308,9 @@ async def reject_application(
         raise HTTPException(status_code=403, detail="Analyst access required")
     
     try:
-        # Get application
-        application = applications_collection.find_one({"id": application_id})
-        if not application:
-            raise HTTPException(status_code=404, detail="Application not found")
-        
-        # Update application status
-        applications_collection.update_one(
-            {"id": application_id},
+        # Update application status (only while it is still awaiting analyst review)
+        application = await applications_collection.find_one_and_update(
+            {"id": application_id, "status": {"$in": ANALYST_ACTIONABLE_STATUSES}},
             {
                 "$set": {
                     "status": "rejected",
@@ -334,13 +320,20 @@ async def reject_application(
                     "rejected_at": datetime.now(),
                     "updated_at": datetime.now()
                 }
-            }
+            },
+            projection={"_id": 0, "status": 1, "customer_id": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if application is None:
+            current = await applications_collection.find_one({"id": application_id}, {"status": 1})
+            if not current:
+                raise HTTPException(status_code=404, detail="Application not found")
+            raise HTTPException(status_code=409, detail=f"Application is already {current.get('status')}")
+        await counters.application_status_changed(application.get("status"), "rejected")
         
         # Create audit event
-        from config.db import audit_events_collection
         audit_id = f"AUDIT-{str(uuid.uuid4())[:8].upper()}"
-        audit_events_collection.insert_one({
+        await audit_writer.write({
             "id": audit_id,
             "application_id": application_id,
             "action": "analyst_rejected",
@@ -353,10 +346,9 @@ async def reject_application(
         # Notify customer via message
         try:
             msg_id = ApplicationService.generate_id("MSG")
-            app = applications_collection.find_one({"id": application_id})
-            customer_id = app.get("customer_id") if app else None
+            customer_id = application.get("customer_id")
             if customer_id:
-                messages_collection.insert_one({
+                await messages_collection.insert_one({
                     "id": msg_id,
                     "application_id": application_id,
                     "from_role": "analyst",
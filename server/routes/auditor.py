@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Dict, Any, Optional
+from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
 
 from auth.routes import get_current_user
+from services import counters
+from services.audit_writer import audit_writer
+from services.compliance_scanner import compliance_scanner, public_issue
+from services.integrity import integrity_checker, report_issues
 
 router = APIRouter()
 
@@ -35,44 +39,31 @@ async def auditor_dashboard(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Only auditors can access this dashboard")
 
     try:
-        from config.db import (
-            audit_events_collection,
-            applications_collection,
-            users_collection,
-        )
+        from config.async_db import audit_events_collection
+        await audit_writer.flush()
 
-        total_audit_events = audit_events_collection.count_documents({})
-        total_users = users_collection.count_documents({})
-        total_applications = applications_collection.count_documents({})
+        totals = await counters.get_counters()
+        total_audit_events = totals.get("audit_events_total", 0)
+        total_users = totals.get("users_total", 0)
+        total_applications = totals.get("applications_total", 0)
 
         # recent audit events
-        recent = list(audit_events_collection.find({}, sort=[("created_at", -1)], limit=20))
+        recent = await audit_events_collection.find({}, sort=[("created_at", -1)], limit=20).to_list(length=None)
         recent = [_sanitize(a) for a in recent]
 
-        # simple integrity checks on a sample of apps
-        sample_apps = list(applications_collection.find({}, sort=[("created_at", -1)], limit=200))
-        missing_trail = 0
-        for app in sample_apps:
-            app_id = app.get("id")
-            if not audit_events_collection.find_one({"application_id": app_id}):
-                missing_trail += 1
-
-        # Compliance snapshot
-        # - ensure audit events have required fields and timestamps
-        issues: List[Dict[str, Any]] = []
-        check_sample = list(audit_events_collection.find({}, sort=[("created_at", -1)], limit=200))
-        for ev in check_sample:
-            if not ev.get("action"):
-                issues.append({"type": "missing_field", "field": "action", "id": ev.get("id")})
-            if not ev.get("actor_role"):
-                issues.append({"type": "missing_field", "field": "actor_role", "id": ev.get("id")})
-            if 'created_at' not in ev or ev.get('created_at') is None:
-                issues.append({"type": "missing_field", "field": "created_at", "id": ev.get("id")})
+        # Integrity snapshot over all applications (cached); field compliance
+        # is precomputed by the background scanner
+        report = await integrity_checker.check()
+        missing_trail = len(report["applications_missing_audit_trail"])
+        scan_state = await compliance_scanner.get_state()
+        field_issues = scan_state.get("issues_total", 0)
 
         compliance = {
             "data_integrity_ok": missing_trail == 0,
-            "required_fields_ok": len([i for i in issues if i.get("type") == "missing_field"]) == 0,
-            "total_issues": len(issues)
+            "required_fields_ok": field_issues == 0,
+            "total_issues": missing_trail + field_issues,
+            "events_scanned": scan_state.get("events_scanned", 0),
+            "scanned_at": _serialize_dt(scan_state.get("scanned_at")),
         }
 
         return {
@@ -80,6 +71,8 @@ async def auditor_dashboard(user=Depends(get_current_user)):
                 "total_users": total_users,
                 "total_applications": total_applications,
                 "total_audit_events": total_audit_events,
+                "applications_missing_audit_trail": missing_trail,
+                # Kept for existing clients; now covers every application
                 "applications_missing_audit_trail_sample": missing_trail,
             },
             "recent_events": recent,
@@ -102,7 +95,8 @@ async def list_audit_events(
         raise HTTPException(status_code=403, detail="Only auditors can list audit events")
 
     try:
-        from config.db import audit_events_collection
+        from config.async_db import audit_events_collection
+        await audit_writer.flush()
         q: Dict[str, Any] = {}
         if action:
             q["action"] = action
@@ -111,7 +105,7 @@ async def list_audit_events(
         if application_id:
             q["application_id"] = application_id
 
-        events = list(audit_events_collection.find(q, sort=[("created_at", -1)], limit=limit))
+        events = await audit_events_collection.find(q, sort=[("created_at", -1)], limit=limit).to_list(length=None)
         events = [_sanitize(e) for e in events]
         return {"events": events, "count": len(events)}
     except Exception as e:
@@ -125,8 +119,9 @@ async def get_application_audit(application_id: str, user=Depends(get_current_us
         raise HTTPException(status_code=403, detail="Only auditors can view application audit")
 
     try:
-        from config.db import audit_events_collection
-        events = list(audit_events_collection.find({"application_id": application_id}, sort=[("created_at", 1)]))
+        from config.async_db import audit_events_collection
+        await audit_writer.flush()
+        events = await audit_events_collection.find({"application_id": application_id}, sort=[("created_at", 1)]).to_list(length=None)
         events = [_sanitize(e) for e in events]
         return {"application_id": application_id, "events": events}
     except Exception as e:
@@ -140,29 +135,21 @@ async def run_integrity_check(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Only auditors can run integrity checks")
 
     try:
-        from config.db import applications_collection, audit_events_collection
-        issues: List[Dict[str, Any]] = []
-
-        # Applications with no audit events
-        recent_apps = list(applications_collection.find({}, sort=[("created_at", -1)], limit=500))
-        for app in recent_apps:
-            app_id = app.get("id")
-            if not audit_events_collection.find_one({"application_id": app_id}):
-                issues.append({
-                    "type": "missing_audit_trail",
-                    "application_id": app_id
-                })
-
-        # Events missing required fields (sample)
-        sample_events = list(audit_events_collection.find({}, sort=[("created_at", -1)], limit=500))
-        for ev in sample_events:
-            if not ev.get("action"):
-                issues.append({"type": "missing_field", "field": "action", "id": ev.get("id")})
-            if not ev.get("actor_role"):
-                issues.append({"type": "missing_field", "field": "actor_role", "id": ev.get("id")})
-            if 'created_at' not in ev or ev.get('created_at') is None:
-                issues.append({"type": "missing_field", "field": "created_at", "id": ev.get("id")})
-
-        return {"issues": issues, "count": len(issues)}
+        await audit_writer.flush()
+        report = await integrity_checker.check()
+        issues = report_issues(report)
+
+        # Recorded issues plus the events the scanner has not reached yet
+        # (scanning stays in the background task, off the request path)
+        field_issues = await compliance_scanner.list_issues()
+        field_issues.extend(await compliance_scanner.pending_issues())
+        issues.extend(public_issue(i) for i in field_issues)
+
+        return {
+            "issues": issues,
+            "count": len(issues),
+            "applications_checked": report["applications_checked"],
+            "checked_at": _serialize_dt(report["checked_at"]),
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error running integrity check: {str(e)}")
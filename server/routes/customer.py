@@ -4,6 +4,8 @@ import json
 
 from auth.routes import get_current_user
 from services.application_service import ApplicationService
+from services import counters
+from services.uploads import UploadTooLarge
 from models import (
     CreateApplicationRequest, UpdateApplicationRequest, SubmitApplicationRequest,
     ApplicationData, UserRole
@@ -18,8 +20,8 @@ async def get_payment_method(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Customer access required")
 
     try:
-        from config.db import payments_collection
-        pm = payments_collection.find_one({"user_id": user["username"]})
+        from config.async_db import payments_collection
+        pm = await payments_collection.find_one({"user_id": user["username"]})
         if not pm:
             return {"paymentMethod": None}
         # Only return safe fields
@@ -55,7 +57,7 @@ async def upsert_payment_method(
             raise HTTPException(status_code=400, detail="last4 must be 4 digits")
 
         from datetime import datetime
-        from config.db import payments_collection
+        from config.async_db import payments_collection
 
         record = {
             "user_id": user["username"],
@@ -67,7 +69,7 @@ async def upsert_payment_method(
         }
 
         # Unset brand if it existed previously to keep schema clean
-        payments_collection.update_one(
+        await payments_collection.update_one(
             {"user_id": user["username"]},
             {"$set": record, "$unset": {"brand": ""}},
             upsert=True,
@@ -91,10 +93,10 @@ async def pay_for_application(
 
     try:
         from datetime import datetime
-        from config.db import applications_collection, payments_collection
+        from config.async_db import applications_collection, payments_collection
 
         # Verify app ownership
-        app = applications_collection.find_one({"id": application_id, "customer_id": user["username"]})
+        app = await applications_collection.find_one({"id": application_id, "customer_id": user["username"]})
         if not app:
             raise HTTPException(status_code=404, detail="Application not found or not owned by you")
 
@@ -113,7 +115,7 @@ async def pay_for_application(
             raise HTTPException(status_code=503, detail="payment is disabled")
 
         # Check saved payment method
-        pm = payments_collection.find_one({"user_id": user["username"]})
+        pm = await payments_collection.find_one({"user_id": user["username"]})
         if not pm:
             raise HTTPException(status_code=400, detail="No saved payment method. Please add one first.")
 
@@ -133,11 +135,11 @@ async def pay_for_application(
             "method_last4": pm.get("last4"),
             "created_at": datetime.utcnow(),
         }
-        payments_collection.insert_one(payment_record)
+        await payments_collection.insert_one(payment_record)
 
         # Update application as paid and activate policy
         policy_number = ApplicationService.generate_id("POL")
-        applications_collection.update_one(
+        await applications_collection.update_one(
             {"id": application_id},
             {"$set": {
                 "payment_status": "paid",
@@ -165,8 +167,8 @@ async def get_payment_receipt(
         raise HTTPException(status_code=403, detail="Customer access required")
 
     try:
-        from config.db import applications_collection, payments_collection
-        app = applications_collection.find_one({"id": application_id, "customer_id": user["username"]})
+        from config.async_db import applications_collection, payments_collection
+        app = await applications_collection.find_one({"id": application_id, "customer_id": user["username"]})
         if not app:
             raise HTTPException(status_code=404, detail="Application not found or not owned by you")
         if app.get("payment_status") != "paid":
@@ -174,7 +176,7 @@ async def get_payment_receipt(
         receipt_id = app.get("payment_receipt_id")
         if not receipt_id:
             raise HTTPException(status_code=404, detail="Receipt not found")
-        rec = payments_collection.find_one({"id": receipt_id, "application_id": application_id, "user_id": user["username"]})
+        rec = await payments_collection.find_one({"id": receipt_id, "application_id": application_id, "user_id": user["username"]})
         if not rec:
             raise HTTPException(status_code=404, detail="Receipt not found")
         # sanitize
@@ -199,7 +201,7 @@ async def get_customer_dashboard(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Customer access required")
     
     try:
-        dashboard_data = ApplicationService.get_customer_applications(user["username"])
+        dashboard_data = await ApplicationService.get_customer_applications(user["username"])
         # Ensure payload is JSON-safe (strip any leftover Mongo _id fields)
         import copy
         safe = copy.deepcopy(dashboard_data)
@@ -227,22 +229,19 @@ async def upload_application_document(
         raise HTTPException(status_code=403, detail="Customer access required")
 
     try:
-        from config.db import applications_collection
+        from config.async_db import applications_collection
 
         # Verify application belongs to this customer
-        app = applications_collection.find_one({"id": application_id, "customer_id": user["username"]})
+        app = await applications_collection.find_one({"id": application_id, "customer_id": user["username"]})
         if not app:
             raise HTTPException(status_code=404, detail="Application not found or not owned by you")
 
-        # Read file content
-        file_content = await document.read()
-
-        # Store using application service (stores inline content + audit event)
-        doc_id = ApplicationService.upload_document(
+        # Streamed into the blob store by the application service (+ audit event)
+        doc_id = await ApplicationService.upload_document(
             application_id,
             document.filename,
             document.content_type or "application/octet-stream",
-            file_content,
+            document,
             UserRole.CUSTOMER,
             user["username"]
         )
@@ -250,6 +249,8 @@ async def upload_application_document(
         return {"success": True, "message": "Document uploaded", "document_id": doc_id}
     except HTTPException:
         raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
 
@@ -266,29 +267,29 @@ async def create_application(
     
     try:
         # Parse the JSON data
-        application_data = json.loads(data)
+        application_data = ApplicationData(**json.loads(data))
+        
+        # Stream every file under one request budget before anything is
+        # persisted, so an oversized upload leaves no draft behind
+        app_id = ApplicationService.generate_id()
+        staged = await ApplicationService.stage_document_uploads(app_id, documents or [], user["username"])
         
         # Create application
-        application = ApplicationService.create_application(
-            user["username"], ApplicationData(**application_data)
-        )
+        try:
+            application = await ApplicationService.create_application(
+                user["username"], application_data, app_id=app_id
+            )
+        except Exception:
+            await ApplicationService.discard_staged_documents(staged)
+            raise
         
-        # Handle file uploads if any
-        if documents:
-            for doc in documents:
-                # Save document to database
-                ApplicationService.upload_document(
-                    application.id,
-                    doc.filename,
-                    doc.content_type,
-                    doc.file.read(),
-                    UserRole.CUSTOMER,
-                    user["username"]
-                )
+        # Record the uploaded documents
+        for entry in staged:
+            await ApplicationService.record_document(application.id, entry, UserRole.CUSTOMER, user["username"])
         
         # Auto-submit the application if all required fields are present
         try:
-            application = ApplicationService.submit_application(
+            application = await ApplicationService.submit_application(
                 application.id, UserRole.CUSTOMER, user["username"]
             )
             return {"message": "Application submitted successfully", "application": application}
@@ -298,6 +299,8 @@ async def create_application(
             
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON data")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -312,7 +315,7 @@ async def update_application(
         raise HTTPException(status_code=403, detail="Customer access required")
     
     try:
-        application = ApplicationService.update_application(
+        application = await ApplicationService.update_application(
             application_id, request.data, UserRole.CUSTOMER, user["username"]
         )
         return {"message": "Application updated successfully", "application": application}
@@ -331,7 +334,7 @@ async def submit_application(
         raise HTTPException(status_code=403, detail="Customer access required")
     
     try:
-        application = ApplicationService.submit_application(
+        application = await ApplicationService.submit_application(
             application_id, UserRole.CUSTOMER, user["username"]
         )
         # Application submitted successfully
@@ -351,7 +354,7 @@ async def get_application_details(
         raise HTTPException(status_code=403, detail="Customer access required")
     
     try:
-        details = ApplicationService.get_application_details(
+        details = await ApplicationService.get_application_details(
             application_id, UserRole.CUSTOMER
         )
         return details
@@ -370,10 +373,10 @@ async def get_application_status_by_id(
         raise HTTPException(status_code=403, detail="Customer access required")
     
     try:
-        from config.db import applications_collection, audit_events_collection
+        from config.async_db import applications_collection, audit_events_collection
         
         # Find the application and verify it belongs to this customer
-        application = applications_collection.find_one({
+        application = await applications_collection.find_one({
             "id": application_id,
             "customer_id": user["username"]  # Ensure customer can only see their own applications
         })
@@ -381,11 +384,13 @@ async def get_application_status_by_id(
         if not application:
             raise HTTPException(status_code=404, detail="Application not found or you do not have access to it")
         
-        # Get audit events for this application
-        audit_events = list(audit_events_collection.find(
+        # Get audit events for this application (including still-buffered ones)
+        from services.audit_writer import audit_writer
+        await audit_writer.flush()
+        audit_events = await audit_events_collection.find(
             {"application_id": application_id},
             sort=[("created_at", 1)]  # Sort chronologically
-        ))
+        ).to_list(length=None)
         
         # Convert datetime objects to ISO strings for JSON serialization
         def serialize_datetime(dt):
@@ -467,10 +472,10 @@ async def submit_insurance_application(
         raise HTTPException(status_code=403, detail="Customer access required")
     
     try:
-        from config.db import applications_collection, documents_collection
+        from config.async_db import applications_collection, documents_collection
         from datetime import datetime, date
-        import gridfs
-        from config.db import db
+        import uuid
+        from services.blob_store import store_document_upload
         
         # Helper to compute age from date string (YYYY-MM-DD)
         def compute_age(dob_str: str) -> int:
@@ -562,47 +567,48 @@ async def submit_insurance_application(
                 "propertyValue": propertyValue
             })
         
-        # Insert application
-        applications_collection.insert_one(application_data)
-        
-        # Handle document upload if provided
+        # Stream the document into the blob store first, so an oversized
+        # upload is rejected before the application is created
+        doc_record = None
         if document and document.filename:
-            # Use GridFS for file storage
-            fs = gridfs.GridFS(db)
-            
-            # Read file content
-            file_content = await document.read()
-            
-            # Store in GridFS
-            file_id = fs.put(
-                file_content,
-                filename=document.filename,
-                content_type=document.content_type,
-                application_id=applicationId,
-                uploaded_by=customerId,
-                uploaded_at=datetime.now()
-            )
-            
             # Generate document ID
-            import uuid
             doc_id = f"DOC-{str(uuid.uuid4())[:8].upper()}"
             
+            # Store bytes in the blob store; the record only references them
+            blob_fields = await store_document_upload(
+                document,
+                metadata={
+                    "application_id": applicationId,
+                    "document_id": doc_id,
+                    "uploaded_by": customerId,
+                }
+            )
+            
             # Create document record
             doc_record = {
                 "id": doc_id,
                 "application_id": applicationId,
                 "type": "supporting_document",
-                "file_id": str(file_id),
+                "blob_backend": blob_fields["blob_backend"],
+                "blob_key": blob_fields["blob_key"],
+                "sha256": blob_fields["sha256"],
                 "filename": document.filename,
                 "content_type": document.content_type,
-                "size": len(file_content),
+                "size": blob_fields["file_size"],
                 "uploaded_by": customerId,
                 "uploaded_at": datetime.now()
             }
-            documents_collection.insert_one(doc_record)
+        
+        # Insert application
+        await applications_collection.insert_one(application_data)
+        await counters.application_created(application_data["status"])
+        
+        if doc_record is not None:
+            await documents_collection.insert_one(doc_record)
+            await counters.documents_added()
         
         # Create audit event
-        from config.db import audit_events_collection
+        from services.audit_writer import audit_writer
         audit_id = f"AUDIT-{str(uuid.uuid4())[:8].upper()}"
         audit_event = {
             "id": audit_id,
@@ -613,7 +619,7 @@ async def submit_insurance_application(
             "details": f"New {insuranceType} insurance application submitted",
             "created_at": datetime.now()
         }
-        audit_events_collection.insert_one(audit_event)
+        await audit_writer.write(audit_event)
         
         return {
             "success": True,
@@ -622,6 +628,8 @@ async def submit_insurance_application(
             "status": "submitted"
         }
         
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"Error submitting application: {str(e)}")
         import traceback
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from auth.routes import get_current_user
+from services.jobs import job_runner, public_job
+from services.verification_jobs import VERIFICATION_SWEEP_JOB, VERIFY_DOCUMENT_JOB
+
+router = APIRouter()
+
+# Job types shared by a team: verification jobs are deduplicated per
+# application state, so a second analyst is handed the first one's job
+SHARED_JOB_ROLES = {
+    VERIFY_DOCUMENT_JOB: {"analyst", "underwriter"},
+    VERIFICATION_SWEEP_JOB: {"analyst", "underwriter"},
+}
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, user=Depends(get_current_user)):
+    """Status of a background job (and its result once it has succeeded)"""
+    job = await job_runner.get(job_id)
+    # Jobs are visible to whoever submitted them, to admins and, for shared
+    # job types, to every user of the roles working on them
+    visible = job is not None and (
+        job.get("created_by") == user["username"]
+        or user["role"] == "admin"
+        or user["role"] in SHARED_JOB_ROLES.get(job.get("type"), ())
+    )
+    if not visible:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_job(job)
@@ -1,11 +1,13 @@
+import asyncio
+import json
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from auth.routes import get_current_user
 
-# Note: We will resolve GROQ_* on each request to allow hot-reload via .env
+# GROQ_* settings are hot-reloaded from server/.env by services/llm_gateway.py
 
 router = APIRouter()
 
@@ -19,101 +21,19 @@ def _normalize(text: str) -> str:
 
 
 # -------- Unified: Local context retrieval (was docs/context_search.py) --------
-from typing import List, Tuple
-
-PROJECT_ROOT = Path(__file__).resolve().parents[2]
-
-
-def _candidate_files() -> List[Path]:
-    names = [
-        "README.md",
-        "QUICK_START_GUIDE.md",
-        "JWT_AUTHENTICATION_GUIDE.md",
-        "JWT_QUICK_START.md",
-        "AUTHENTICATION_FIX.md",
-        "AUTH_FIX_GUIDE.md",
-        "REVIEW_BUTTON_FIX.md",
-        "REVIEW_BUTTON_DEBUGGING.md",
-        "ANALYST_WORKFLOW_IMPLEMENTATION.md",
-        "ANALYST_REVIEW_WORKFLOW.md",
-        "REALTIME_STATUS_TRACKING.md",
-        "IMPLEMENTATION_SUMMARY.md",
-        "PROJECT_SUMMARY.md",
-        "TROUBLESHOOTING_GUIDE.md",
-        "DOCUMENTATION_INDEX.md",
-        "ADMIN_SETUP.md",
-        "MONGODB_QUICK_REFERENCE.md",
-        "MONGODB_ATLAS_COLLECTIONS.md",
-        "HIGH_VALUE_INSURANCE_IMPLEMENTATION.md",
-        "TEST_REVIEW_BUTTON.md",
-        "TEST_DATA_SAMPLES.md",
-        "WORKFLOW_DIAGRAMS.md",
-    ]
-    files: List[Path] = []
-    for n in names:
-        p = PROJECT_ROOT / n
-        if p.exists():
-            files.append(p)
-    return files
-
-
-def _read(path: Path) -> str:
-    try:
-        return path.read_text(encoding="utf-8", errors="ignore")
-    except Exception:
-        return ""
-
-
-def _split_sections(text: str) -> List[Tuple[str, str]]:
-    lines = text.splitlines()
-    sections: List[Tuple[str, str]] = []
-    buf: List[str] = []
-    title = "Intro"
-    for ln in lines:
-        if ln.strip().startswith("#"):
-            if buf:
-                sections.append((title, "\n".join(buf).strip()))
-                buf = []
-            title = ln.strip().lstrip("# ")
-        else:
-            buf.append(ln)
-    if buf:
-        sections.append((title, "\n".join(buf).strip()))
-    return sections
-
-
-def _score(section: str, query_tokens: List[str]) -> int:
-    text = section.lower()
-    score = 0
-    for tok in query_tokens:
-        if not tok:
-            continue
-        score += text.count(tok)
-    return score
+# Sections of the project guides are ranked by a prebuilt BM25 index
+# (services/support_index.py); no files are read per request.
+from typing import List, Optional, Tuple
+from services.support_index import support_index
+from services.llm_gateway import llm_gateway
+from services.knowledge_index import extract_text, knowledge_index
+from services.uploads import UploadBudget, UploadTooLarge, store_content_addressed
 
 
-def get_context_snippets(query: str, max_chars: int = 1800, max_sections: int = 6) -> str:
-    q = (query or "").lower()
-    tokens = [t for t in [w.strip(".,:;!?()[]{}\"'`)\n\t ") for w in q.split()] if len(t) > 2]
-    if not tokens:
-        return ""
-    ranked: List[Tuple[int, str]] = []
-    for path in _candidate_files():
-        content = _read(path)
-        if not content:
-            continue
-        for title, sec in _split_sections(content):
-            s = _score(sec, tokens)
-            if s > 0:
-                header = f"From {path.name} > {title}:\n"
-                snippet = header + sec
-                ranked.append((s, snippet))
-    if not ranked:
-        return ""
-    ranked.sort(key=lambda x: x[0], reverse=True)
+def _join_snippets(ranked: List[Tuple[float, str]], max_chars: int) -> str:
     pieces: List[str] = []
     used = 0
-    for _, snip in ranked[: max_sections * 3]:
+    for _, snip in ranked:
         if used + len(snip) + 2 > max_chars:
             break
         pieces.append(snip)
@@ -121,18 +41,47 @@ def get_context_snippets(query: str, max_chars: int = 1800, max_sections: int =
     return "\n\n---\n\n".join(pieces)
 
 
+def get_context_snippets(query: str, max_chars: int = 1800, max_sections: int = 6) -> str:
+    return _join_snippets(support_index.search(query, limit=max_sections * 3), max_chars)
+
+
+def _retrieve(message: str, role: str) -> List[Tuple[float, str]]:
+    """Uploaded knowledge chunks visible to the role first, then guide sections"""
+    return knowledge_index.search(message, role, k=3) + support_index.search(message, limit=18)
+
+
 # -------- Unified: Simple vectorstore upload (was docs/vectorstore.py) --------
 UPLOAD_DIR = "./uploaded_docs"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
 async def load_vectorstore(uploaded_files, role: str, doc_id: str):
-    """Store uploaded files locally (embeddings removed in this build)."""
-    for file in uploaded_files:
-        save_path = Path(UPLOAD_DIR) / file.filename
-        with open(save_path, "wb") as f:
-            f.write(file.file.read())
-    return {"saved": True, "count": len(uploaded_files), "doc_id": doc_id, "role": role}
+    """Stream uploaded files to content-addressed storage and add them to the knowledge index.
+
+    Raises 413 if a file or the request as a whole exceeds its size limit;
+    files already stored by the failed request are removed.
+    """
+    budget = UploadBudget()
+    stored: List[dict] = []
+    try:
+        for file in uploaded_files:
+            stored.append(await store_content_addressed(file, Path(UPLOAD_DIR), budget))
+    except UploadTooLarge as e:
+        for item in stored:
+            if item["created"]:
+                item["path"].unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail=str(e))
+
+    chunks = 0
+    for item in stored:
+        chunks += await asyncio.to_thread(_index_stored_file, doc_id, role, item)
+    files = [{k: (str(v) if k == "path" else v) for k, v in item.items() if k != "created"} for item in stored]
+    return {"saved": True, "count": len(stored), "doc_id": doc_id, "role": role, "chunks": chunks, "files": files}
+
+
+def _index_stored_file(doc_id: str, role: str, item: dict) -> int:
+    text = extract_text(item["filename"], item["path"].read_bytes())
+    return knowledge_index.add_document(doc_id, item["filename"], role, text)
 
 
 def _build_response(message: str, role: str) -> str:
@@ -201,14 +150,32 @@ def _build_response(message: str, role: str) -> str:
     )
 
 
-@router.post("/chat")
-def support_chat(payload: SupportMessage, user=Depends(get_current_user)):
-    if not payload.message or not payload.message.strip():
-        raise HTTPException(status_code=400, detail="Message is required")
-    role = user.get("role", "user")
+def build_system_prompt(role: str, ctx_text: str) -> str:
+    context_block = f"\n\nContext (use if relevant):\n{ctx_text}\n"
+    identity_block = "\n\nIdentity: Infintech AI developed by Sathwik Reddy Chelemela.\n"
+    return (
+        "You are a concise support assistant for an insurance app (health, auto, home, life, and more). "
+        "Answer briefly (<= 3 sentences) and avoid hallucinations. "
+        "Do not assume medical-only; keep guidance applicable across insurance lines and adapt to any user-provided context. "
+        "Use these rules when applicable: "
+        "1) Status: Direct users to dashboard status areas by role. "
+        "2) Upload: Customers upload in application; staff review attachments. "
+        "3) Auth: JWT-based login; re-login on expiry. "
+        "4) Workflow: Customer -> Analyst -> Underwriter. "
+        f"User role: {role}."
+        f"{identity_block}"
+        f"{context_block}"
+    )
+
+
+IDENTITY_LINE = "Identity: Infintech AI developed by Sathwik Reddy Chelemela."
+
+
+def _fixed_answer(message: str, config) -> Optional[str]:
+    """Deterministic replies that never go to the LLM"""
+    lower_msg = message.strip().lower()
 
     # Deterministic reply for name inquiries
-    lower_msg = payload.message.strip().lower()
     if any(k in lower_msg for k in [
         "your name",
         "what is your name",
@@ -218,76 +185,124 @@ def support_chat(payload: SupportMessage, user=Depends(get_current_user)):
         "name?",
         "name"
     ]):
-        return {"answer": "Infintech AI developed by Sathwik Reddy Chelemela."}
+        return "Infintech AI developed by Sathwik Reddy Chelemela."
 
     # Deterministic reply for model inquiries (before LLM), to avoid ambiguity
     if any(k in lower_msg for k in ["which model", "what model", "model are you using", "groq model", "llama model", "using now?"]):
-        # Ensure latest env
-        load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env", override=True)
-        groq_api_key = os.getenv("GROQ_API_KEY")
-        model = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
-        if groq_api_key:
-            return {"answer": f"Groq model: {model}"}
+        if config.enabled:
+            if config.backend != "groq":
+                return f"LLM backend: {config.backend}"
+            return f"Groq model: {config.model}"
         else:
-            return {"answer": "Rule-based support (LLM disabled)."}
-
-    # Reload .env on each request so new GROQ_* values take effect without restart
-    load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env", override=True)
-
-    # If Groq is configured, use LLM with a constrained system prompt and retrieved context
-    groq_api_key = os.getenv("GROQ_API_KEY")
-    model = os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile")
-    if groq_api_key:
-        try:
-            from groq import Groq  # type: ignore
-
-            client = Groq(api_key=groq_api_key)
-
-            context = get_context_snippets(payload.message)
-            identity_line = "Identity: Infintech AI developed by Sathwik Reddy Chelemela."
-            # Always include identity inside the LLM context; append doc snippets if available
-            ctx_text = identity_line + (f"\n\n{context}" if context else "")
-            context_block = f"\n\nContext (use if relevant):\n{ctx_text}\n"
-            identity_block = "\n\nIdentity: Infintech AI developed by Sathwik Reddy Chelemela.\n"
-
-            system_prompt = (
-                "You are a concise support assistant for an insurance app (health, auto, home, life, and more). "
-                "Answer briefly (<= 3 sentences) and avoid hallucinations. "
-                "Do not assume medical-only; keep guidance applicable across insurance lines and adapt to any user-provided context. "
-                "Use these rules when applicable: "
-                "1) Status: Direct users to dashboard status areas by role. "
-                "2) Upload: Customers upload in application; staff review attachments. "
-                "3) Auth: JWT-based login; re-login on expiry. "
-                "4) Workflow: Customer -> Analyst -> Underwriter. "
-                f"User role: {role}."
-                f"{identity_block}"
-                f"{context_block}"
-            )
-            user_msg = payload.message.strip()
-
-            resp = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_msg},
-                ],
-                temperature=0.2,
-                max_tokens=256,
-            )
-            text = (resp.choices[0].message.content or "").strip()
-            if text:
-                return {"answer": text}
-            # If empty, fall through to rule-based
-        except Exception:
-            # Fall back silently to rule-based on any LLM error
-            pass
-
-    # Fallback rule-based support with best-effort context snippet
-    answer = _build_response(payload.message, role)
-    ctx = get_context_snippets(payload.message, max_chars=600, max_sections=2)
-    identity_line = "Identity: Infintech AI developed by Sathwik Reddy Chelemela."
+            return "Rule-based support (LLM disabled)."
+    return None
+
+
+def _llm_context(ranked: List[Tuple[float, str]]) -> str:
+    context = _join_snippets(ranked, max_chars=1800)
+    # Always include identity inside the LLM context; append doc snippets if available
+    return IDENTITY_LINE + (f"\n\n{context}" if context else "")
+
+
+def _fallback_answer(message: str, role: str, ranked: List[Tuple[float, str]]) -> str:
+    """Rule-based support with best-effort context snippet"""
+    answer = _build_response(message, role)
+    ctx = _join_snippets(ranked[:6], max_chars=600)
     if ctx:
-        answer = answer + "\n\nReference:\n" + identity_line + "\n\n" + ctx
-    else:
-        answer = answer + "\n\n" + identity_line
-    return {"answer": answer}
+        return answer + "\n\nReference:\n" + IDENTITY_LINE + "\n\n" + ctx
+    return answer + "\n\n" + IDENTITY_LINE
+
+
+@router.post("/chat")
+async def support_chat(payload: SupportMessage, user=Depends(get_current_user)):
+    if not payload.message or not payload.message.strip():
+        raise HTTPException(status_code=400, detail="Message is required")
+    role = user.get("role", "user")
+
+    # GROQ_* changes in server/.env are picked up by the gateway's watcher
+    config = llm_gateway.get_config()
+    fixed = _fixed_answer(payload.message, config)
+    if fixed is not None:
+        return {"answer": fixed}
+
+    # One retrieval serves both the LLM prompt and the rule-based fallback
+    ranked = await asyncio.to_thread(_retrieve, payload.message, role)
+
+    # If an LLM is configured, use it with a constrained system prompt and retrieved context
+    if config.enabled:
+        ctx_text = _llm_context(ranked)
+        text = await llm_gateway.complete(
+            payload.message, role, build_system_prompt(role, ctx_text), context=ctx_text
+        )
+        if text:
+            return {"answer": text}
+        # Disabled, failed, timed out or empty: fall through to rule-based
+
+    return {"answer": _fallback_answer(payload.message, role, ranked)}
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def _chunk_text(text: str, size: int = 6) -> List[str]:
+    """Split a finished answer into word groups for streaming"""
+    words = text.split(" ")
+    return [" ".join(words[i:i + size]) + (" " if i + size < len(words) else "")
+            for i in range(0, len(words), size)]
+
+
+@router.post("/chat/stream")
+async def support_chat_stream(payload: SupportMessage, user=Depends(get_current_user)):
+    """Same answers as /support/chat, sent as server-sent events while generated.
+
+    Events: ``data: {"delta": "..."}`` per chunk, then ``event: done`` with
+    ``{"answer": <full text>, "source": "llm" | "rules"}``. If the LLM stream
+    breaks off after some text was sent, ``done`` carries what was sent plus
+    ``"partial": true`` and ``"error"``.
+    """
+    if not payload.message or not payload.message.strip():
+        raise HTTPException(status_code=400, detail="Message is required")
+    role = user.get("role", "user")
+    message = payload.message
+    config = llm_gateway.get_config()
+
+    async def events():
+        fixed = _fixed_answer(message, config)
+        if fixed is not None:
+            yield _sse({"delta": fixed})
+            yield _sse({"answer": fixed, "source": "rules"}, event="done")
+            return
+
+        ranked = await asyncio.to_thread(_retrieve, message, role)
+        parts: List[str] = []
+        outcome: dict = {}
+        if config.enabled:
+            ctx_text = _llm_context(ranked)
+            async for chunk in llm_gateway.stream(
+                message, role, build_system_prompt(role, ctx_text), context=ctx_text, outcome=outcome
+            ):
+                parts.append(chunk)
+                yield _sse({"delta": chunk})
+        answer = "".join(parts).strip()
+        if answer and not outcome.get("complete"):
+            # Text already went out, so no fallback: flag the answer as cut off
+            yield _sse({"answer": answer, "source": "llm", "partial": True,
+                        "error": outcome.get("error") or "LLM stream interrupted"}, event="done")
+            return
+        if answer:
+            yield _sse({"answer": answer, "source": "llm"}, event="done")
+            return
+
+        # LLM disabled or produced nothing: stream the rule-based reply
+        answer = _fallback_answer(message, role, ranked)
+        for chunk in _chunk_text(answer):
+            yield _sse({"delta": chunk})
+        yield _sse({"answer": answer, "source": "rules"}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -17,7 +17,7 @@ async def get_underwriter_dashboard(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Underwriter access required")
     
     try:
-        dashboard_data = ApplicationService.get_underwriter_applications()
+        dashboard_data = await ApplicationService.get_underwriter_applications()
         return dashboard_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -29,7 +29,7 @@ async def get_case_queue(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Underwriter access required")
     
     try:
-        dashboard_data = ApplicationService.get_underwriter_applications()
+        dashboard_data = await ApplicationService.get_underwriter_applications()
         return {"case_queue": dashboard_data["case_queue"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -44,7 +44,7 @@ async def get_application_details(
         raise HTTPException(status_code=403, detail="Underwriter access required")
     
     try:
-        details = ApplicationService.get_application_details(
+        details = await ApplicationService.get_application_details(
             application_id, UserRole.UNDERWRITER
         )
         return details
@@ -64,7 +64,7 @@ async def make_decision(
         raise HTTPException(status_code=403, detail="Underwriter access required")
     
     try:
-        application = ApplicationService.make_decision(
+        application = await ApplicationService.make_decision(
             application_id=application_id,
             decision=request.decision,
             reason=request.reason,
@@ -74,11 +74,11 @@ async def make_decision(
         )
         # Notify customer about decision
         try:
-            from config.db import messages_collection
+            from config.async_db import messages_collection
             msg_id = ApplicationService.generate_id("MSG")
             status_text = "approved" if request.decision == "approve" else ("declined" if request.decision == "decline" else "pended for review")
             body = f"Your application has been {status_text} by the underwriter. Reason: {request.reason}"
-            messages_collection.insert_one({
+            await messages_collection.insert_one({
                 "id": msg_id,
                 "application_id": application_id,
                 "from_role": "underwriter",
@@ -105,7 +105,7 @@ async def get_risk_assessment(
         raise HTTPException(status_code=403, detail="Underwriter access required")
     
     try:
-        details = ApplicationService.get_application_details(
+        details = await ApplicationService.get_application_details(
             application_id, UserRole.UNDERWRITER
         )
         # Calculate risk score using the type-aware model
@@ -1,8 +1,11 @@
+import asyncio
 import uuid
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 
-from config.db import (
+from pymongo import ReturnDocument
+
+from config.async_db import (
     applications_collection, documents_collection, 
     messages_collection, audit_events_collection
 )
@@ -10,6 +13,30 @@ from models import (
     Application, ApplicationData, ApplicationStatus, UserRole, AuditAction,
     Document, Message, AuditEvent, DocumentType
 )
+from services import counters
+from services.audit_writer import audit_writer
+from services.blob_store import (
+    BlobNotFound, blob_ref, delete_document_blob, get_blob_store, store_document_blob, store_document_upload
+)
+from services.uploads import UploadBudget
+
+# Fields an application needs before it can leave draft
+REQUIRED_SUBMISSION_FIELDS = ["age", "insuranceType", "coverageNeeds", "assetValuation", "income", "debt"]
+
+# Values treated as "missing" for a required field (mirrors ``not data.get(field)``)
+_EMPTY_FIELD_VALUES = [None, "", 0, False]
+
+# Statuses an analyst may still act on, and those an underwriter may decide
+ANALYST_ACTIONABLE_STATUSES = [
+    ApplicationStatus.SUBMITTED, ApplicationStatus.UNDER_REVIEW, ApplicationStatus.PENDING_MORE_INFO
+]
+UNDERWRITER_DECIDABLE_STATUSES = [
+    ApplicationStatus.SUBMITTED, ApplicationStatus.ANALYST_APPROVED, ApplicationStatus.UNDER_REVIEW
+]
+
+# Metadata reads of the documents collection never transfer file bytes; use
+# ApplicationService.get_document_content() when the bytes are needed.
+DOCUMENT_METADATA_PROJECTION = {"content": 0}
 
 class ApplicationService:
     
@@ -19,7 +46,7 @@ class ApplicationService:
         return f"{prefix}-{str(uuid.uuid4())[:8].upper()}"
     
     @staticmethod
-    def create_audit_event(
+    async def create_audit_event(
         application_id: str,
         actor_role: UserRole,
         actor_id: str,
@@ -37,13 +64,48 @@ class ApplicationService:
             "payload": payload or {},
             "created_at": datetime.now()
         }
-        audit_events_collection.insert_one(audit_event)
+        await audit_writer.write(audit_event)
         return audit_id
     
     @staticmethod
-    def create_application(customer_id: str, data: ApplicationData) -> Application:
+    async def _transition(
+        application_id: str,
+        precondition: Dict[str, Any],
+        update_data: Dict[str, Any],
+        error: str
+    ) -> Dict[str, Any]:
+        """Apply ``update_data`` only if the application still matches ``precondition``.
+
+        One atomic find_one_and_update round trip, so two concurrent actors
+        cannot both perform the same transition. The pre-image is returned (the
+        dashboard counters need the old status) and the ``$set`` is applied to
+        it locally to produce the updated document. The losing side gets
+        ``error`` (or "Application not found"); only that failure path pays for
+        an extra read to tell the two apart.
+
+        Callers write the audit event after this returns, through the
+        write-behind audit writer: the state change is atomic, but its audit
+        event is not in the same unit of work and is lost if the process dies
+        before the writer flushes.
+        """
+        before = await applications_collection.find_one_and_update(
+            {"id": application_id, **precondition},
+            {"$set": update_data},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            if not await applications_collection.find_one({"id": application_id}, {"_id": 1}):
+                raise ValueError("Application not found")
+            raise ValueError(error)
+        if "status" in update_data:
+            await counters.application_status_changed(before.get("status"), update_data["status"])
+        return {**before, **update_data}
+
+    @staticmethod
+    async def create_application(customer_id: str, data: ApplicationData, app_id: Optional[str] = None) -> Application:
         """Create new application (Customer only)"""
-        app_id = ApplicationService.generate_id()
+        app_id = app_id or ApplicationService.generate_id()
         now = datetime.now()
         
         application = {
@@ -58,29 +120,28 @@ class ApplicationService:
             "premium_range": None
         }
         
-        applications_collection.insert_one(application)
+        await applications_collection.insert_one(application)
+        # insert_one adds the (non JSON-serializable) Mongo _id to the dict
+        application.pop("_id", None)
+        await counters.application_created(ApplicationStatus.DRAFT)
         
         # Create audit event
-        ApplicationService.create_audit_event(
+        await ApplicationService.create_audit_event(
             app_id, UserRole.CUSTOMER, customer_id, AuditAction.CREATED
         )
         
         return Application(**application)
     
     @staticmethod
-    def update_application(
+    async def update_application(
         application_id: str, 
         data: ApplicationData, 
         actor_role: UserRole,
         actor_id: str
     ) -> Application:
         """Update application (Customer only for drafts)"""
-        app = applications_collection.find_one({"id": application_id})
-        if not app:
-            raise ValueError("Application not found")
-        
         # Only customers can update their own draft applications
-        if actor_role != UserRole.CUSTOMER or app["status"] != ApplicationStatus.DRAFT:
+        if actor_role != UserRole.CUSTOMER:
             raise ValueError("Cannot update application")
         
         update_data = {
@@ -88,78 +149,88 @@ class ApplicationService:
             "updated_at": datetime.now()
         }
         
-        applications_collection.update_one(
-            {"id": application_id}, {"$set": update_data}
+        updated_app = await ApplicationService._transition(
+            application_id,
+            {"status": ApplicationStatus.DRAFT},
+            update_data,
+            "Cannot update application"
         )
         
         # Create audit event
-        ApplicationService.create_audit_event(
+        await ApplicationService.create_audit_event(
             application_id, actor_role, actor_id, AuditAction.UPDATED
         )
         
-        updated_app = applications_collection.find_one({"id": application_id})
-        # Remove Mongo-specific field to ensure JSON-serializable response
-        if updated_app and "_id" in updated_app:
-            updated_app.pop("_id", None)
         return Application(**updated_app)
     
     @staticmethod
-    def submit_application(
+    async def submit_application(
         application_id: str, 
         actor_role: UserRole,
         actor_id: str
     ) -> Application:
         """Submit application (Customer only)"""
-        app = applications_collection.find_one({"id": application_id})
-        if not app:
-            raise ValueError("Application not found")
-        
-        if actor_role != UserRole.CUSTOMER or app["status"] != ApplicationStatus.DRAFT:
+        if actor_role != UserRole.CUSTOMER:
             raise ValueError("Cannot submit application")
         
-        # Validate required fields
-        data = app["data"]
-        required_fields = ["age", "insuranceType", "coverageNeeds", "assetValuation", "income", "debt"]
-        for field in required_fields:
-            if not data.get(field):
-                raise ValueError(f"Missing required field: {field}")
+        # Required fields are part of the filter so validation and the status
+        # change happen atomically against the same version of the document
+        precondition: Dict[str, Any] = {"status": ApplicationStatus.DRAFT}
+        for field in REQUIRED_SUBMISSION_FIELDS:
+            precondition[f"data.{field}"] = {"$nin": _EMPTY_FIELD_VALUES}
         
         update_data = {
             "status": ApplicationStatus.SUBMITTED,
             "updated_at": datetime.now()
         }
         
-        applications_collection.update_one(
-            {"id": application_id}, {"$set": update_data}
+        before = await applications_collection.find_one_and_update(
+            {"id": application_id, **precondition},
+            {"$set": update_data},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
         )
+        if before is None:
+            # Failure path only: one read to report why the transition was refused
+            app = await applications_collection.find_one(
+                {"id": application_id}, {"status": 1, "data": 1}
+            )
+            if not app:
+                raise ValueError("Application not found")
+            if app.get("status") != ApplicationStatus.DRAFT:
+                raise ValueError("Cannot submit application")
+            data = app.get("data") or {}
+            for field in REQUIRED_SUBMISSION_FIELDS:
+                if not data.get(field):
+                    raise ValueError(f"Missing required field: {field}")
+            raise ValueError("Cannot submit application")
+        updated_app = {**before, **update_data}
+        await counters.application_status_changed(ApplicationStatus.DRAFT, ApplicationStatus.SUBMITTED)
         
         # Create audit event
-        ApplicationService.create_audit_event(
+        await ApplicationService.create_audit_event(
             application_id, actor_role, actor_id, AuditAction.SUBMITTED
         )
         
-        updated_app = applications_collection.find_one({"id": application_id})
         return Application(**updated_app)
     
     @staticmethod
-    def request_info(
+    async def request_info(
         application_id: str,
         message: str,
         actor_role: UserRole,
         actor_id: str
     ) -> Message:
         """Request more info from customer (Analyst only)"""
-        app = applications_collection.find_one({"id": application_id})
-        if not app:
-            raise ValueError("Application not found")
-        
         if actor_role != UserRole.ANALYST:
             raise ValueError("Only analysts can request info")
         
         # Update application status
-        applications_collection.update_one(
-            {"id": application_id}, 
-            {"$set": {"status": ApplicationStatus.PENDING_MORE_INFO, "updated_at": datetime.now()}}
+        await ApplicationService._transition(
+            application_id,
+            {},
+            {"status": ApplicationStatus.PENDING_MORE_INFO, "updated_at": datetime.now()},
+            "Cannot request info for this application"
         )
         
         # Create message
@@ -173,10 +244,11 @@ class ApplicationService:
             "created_at": datetime.now()
         }
         
-        messages_collection.insert_one(message_data)
+        await messages_collection.insert_one(message_data)
+        message_data.pop("_id", None)
         
         # Create audit event
-        ApplicationService.create_audit_event(
+        await ApplicationService.create_audit_event(
             application_id, actor_role, actor_id, AuditAction.REQUEST_INFO, {"message": message}
         )
         
@@ -468,17 +540,13 @@ class ApplicationService:
             return 0.0
 
     @staticmethod
-    def mark_ready_for_scoring(
+    async def mark_ready_for_scoring(
         application_id: str,
         input_ready: bool,
         actor_role: UserRole,
         actor_id: str
     ) -> Application:
         """Mark application ready for scoring (Analyst only)"""
-        app = applications_collection.find_one({"id": application_id})
-        if not app:
-            raise ValueError("Application not found")
-        
         if actor_role != UserRole.ANALYST:
             raise ValueError("Only analysts can mark ready for scoring")
         
@@ -487,20 +555,22 @@ class ApplicationService:
             "updated_at": datetime.now()
         }
         
-        applications_collection.update_one(
-            {"id": application_id}, {"$set": update_data}
+        updated_app = await ApplicationService._transition(
+            application_id,
+            {},
+            update_data,
+            "Application cannot be marked ready in its current state"
         )
         
         # Create audit event
-        ApplicationService.create_audit_event(
+        await ApplicationService.create_audit_event(
             application_id, actor_role, actor_id, AuditAction.MARK_READY, {"input_ready": input_ready}
         )
         
-        updated_app = applications_collection.find_one({"id": application_id})
         return Application(**updated_app)
     
     @staticmethod
-    def make_decision(
+    async def make_decision(
         application_id: str,
         decision: str,
         reason: str,
@@ -509,10 +579,6 @@ class ApplicationService:
         actor_id: str = None
     ) -> Application:
         """Make decision on application (Underwriter only)"""
-        app = applications_collection.find_one({"id": application_id})
-        if not app:
-            raise ValueError("Application not found")
-        
         if actor_role != UserRole.UNDERWRITER:
             raise ValueError("Only underwriters can make decisions")
         
@@ -541,8 +607,12 @@ class ApplicationService:
             update_data["premium_range"] = {"min": premium_amount * 0.9, "max": premium_amount * 1.1}
             update_data["final_premium"] = round(float(premium_amount), 2)
         
-        applications_collection.update_one(
-            {"id": application_id}, {"$set": update_data}
+        # Only undecided applications can be decided (no double approve/decline)
+        updated_app = await ApplicationService._transition(
+            application_id,
+            {"status": {"$in": UNDERWRITER_DECIDABLE_STATUSES}},
+            update_data,
+            "Application has already been decided"
         )
         
         # Create audit event
@@ -550,28 +620,25 @@ class ApplicationService:
             AuditAction.DECLINED if decision == "decline" else AuditAction.PENDED
         )
         
-        ApplicationService.create_audit_event(
+        await ApplicationService.create_audit_event(
             application_id, actor_role, actor_id, audit_action, 
             {"reason": reason, "premium_amount": premium_amount}
         )
         
-        updated_app = applications_collection.find_one({"id": application_id})
-        if updated_app and "_id" in updated_app:
-            updated_app.pop("_id", None)
         return Application(**updated_app)
     
     @staticmethod
-    def get_customer_applications(customer_id: str) -> Dict[str, Any]:
+    async def get_customer_applications(customer_id: str) -> Dict[str, Any]:
         """Get applications for customer"""
-        draft = applications_collection.find_one({
+        draft = await applications_collection.find_one({
             "customer_id": customer_id, 
             "status": ApplicationStatus.DRAFT
         })
         
-        submitted = list(applications_collection.find({
+        submitted = await applications_collection.find({
             "customer_id": customer_id,
             "status": {"$ne": ApplicationStatus.DRAFT}
-        }))
+        }).to_list(length=None)
 
         # Sanitize Mongo-specific fields
         def _sanitize_app(a: Dict[str, Any]) -> Dict[str, Any]:
@@ -583,10 +650,10 @@ class ApplicationService:
         draft = _sanitize_app(draft) if draft else None
         submitted = [_sanitize_app(a) for a in submitted]
         
-        raw_messages = list(messages_collection.find({
+        raw_messages = await messages_collection.find({
             "application_id": {"$in": [app["id"] for app in submitted]},
             "to_role": UserRole.CUSTOMER
-        }))
+        }).to_list(length=None)
         # Remove Mongo-specific _id for safe serialization into Pydantic models
         messages = []
         for m in raw_messages:
@@ -601,13 +668,13 @@ class ApplicationService:
         }
     
     @staticmethod
-    def get_analyst_applications() -> Dict[str, Any]:
+    async def get_analyst_applications() -> Dict[str, Any]:
         """Get applications for analyst"""
         # Only show submitted applications that haven't been approved yet
-        submitted = list(applications_collection.find({
+        submitted = await applications_collection.find({
             "status": ApplicationStatus.SUBMITTED,
             "input_ready": {"$ne": True}  # Exclude applications already approved by analyst
-        }))
+        }).to_list(length=None)
 
         # Remove Mongo _id for safe serialization
         submitted = [
@@ -625,27 +692,33 @@ class ApplicationService:
         }
     
     @staticmethod
-    def get_underwriter_applications() -> Dict[str, Any]:
+    async def get_underwriter_applications() -> Dict[str, Any]:
         """Get applications for underwriter"""
         # Case queue should include:
         # - Applications explicitly approved by analyst (status=analyst_approved)
         # - Applications in state 'underwriter_review'
         # - Submitted applications marked input_ready by analyst (legacy path)
-        case_queue = list(applications_collection.find({
+        case_queue_cursor = applications_collection.find({
             "$or": [
                 {"status": ApplicationStatus.ANALYST_APPROVED},
                 {"state": "underwriter_review"},
                 {"status": ApplicationStatus.SUBMITTED, "input_ready": True}
             ]
-        }))
+        })
 
         # Under review should include status or state indicating active underwriter review
-        under_review_apps = list(applications_collection.find({
+        under_review_cursor = applications_collection.find({
             "$or": [
                 {"status": ApplicationStatus.UNDER_REVIEW},
                 {"state": "under_review"}
             ]
-        }))
+        })
+
+        # Both queries are independent; run them concurrently
+        case_queue, under_review_apps = await asyncio.gather(
+            case_queue_cursor.to_list(length=None),
+            under_review_cursor.to_list(length=None),
+        )
         
         # Combine both lists and de-duplicate by application id
         combined = case_queue + under_review_apps
@@ -671,9 +744,57 @@ class ApplicationService:
         }
     
     @staticmethod
-    def get_application_details(application_id: str, user_role: UserRole) -> Dict[str, Any]:
+    async def list_document_metadata(application_id: str) -> List[Dict[str, Any]]:
+        """Documents of an application without their file content"""
+        return await documents_collection.find(
+            {"application_id": application_id}, DOCUMENT_METADATA_PROJECTION
+        ).to_list(length=None)
+
+    @staticmethod
+    async def get_document_metadata(application_id: str, document_id: str) -> Optional[Dict[str, Any]]:
+        """One document of an application, without content"""
+        return await documents_collection.find_one(
+            {"id": document_id, "application_id": application_id}, DOCUMENT_METADATA_PROJECTION
+        )
+
+    @staticmethod
+    async def get_latest_document_metadata(application_id: str) -> Optional[Dict[str, Any]]:
+        """Most recently uploaded document of an application, without content"""
+        return await documents_collection.find_one(
+            {"application_id": application_id},
+            DOCUMENT_METADATA_PROJECTION,
+            sort=[("uploaded_at", -1)]
+        )
+
+    @staticmethod
+    async def get_document_content(document: Dict[str, Any]) -> Optional[bytes]:
+        """Fetch the bytes of a document whose metadata was read without content.
+
+        Blob-store records are read from their backend; legacy records that
+        still keep the bytes inline are re-read with a ``content``-only
+        projection. Returns None when nothing is stored.
+        """
+        ref = blob_ref(document)
+        if ref:
+            try:
+                return await get_blob_store(ref["backend"]).get(ref["key"])
+            except BlobNotFound as e:
+                print(f"Warning: Could not retrieve document blob: {str(e)}")
+                return None
+
+        if document.get("id"):
+            query = {"id": document["id"]}
+        elif document.get("_id") is not None:
+            query = {"_id": document["_id"]}
+        else:
+            return None
+        stored = await documents_collection.find_one(query, {"_id": 0, "content": 1})
+        return stored.get("content") if stored else None
+
+    @staticmethod
+    async def get_application_details(application_id: str, user_role: UserRole) -> Dict[str, Any]:
         """Get detailed application information with role-based access"""
-        app = applications_collection.find_one({"id": application_id})
+        app = await applications_collection.find_one({"id": application_id})
         if not app:
             raise ValueError("Application not found")
         # Remove Mongo _id which is not JSON serializable
@@ -684,9 +805,11 @@ class ApplicationService:
             # Customers can only see their own applications
             pass  # Add customer validation if needed
 
-        documents = list(documents_collection.find({"application_id": application_id}))
-        messages = list(messages_collection.find({"application_id": application_id}))
-        audit_events = list(audit_events_collection.find({"application_id": application_id}))
+        documents, messages, audit_events = await asyncio.gather(
+            ApplicationService.list_document_metadata(application_id),
+            messages_collection.find({"application_id": application_id}).to_list(length=None),
+            audit_events_collection.find({"application_id": application_id}).to_list(length=None),
+        )
 
         # Convert documents to handle database format
         converted_documents = []
@@ -733,50 +856,93 @@ class ApplicationService:
         }
 
     @staticmethod
-    def upload_document(
+    async def upload_document(
         application_id: str,
         filename: str,
         content_type: str,
-        file_content: bytes,
+        file_content: Union[bytes, Any],
         actor_role: UserRole,
         actor_id: str
     ) -> str:
-        """Upload document for application"""
+        """Upload document for application.
+
+        ``file_content`` is either bytes or an ``UploadFile``; uploads are
+        streamed into the blob store (raises ``UploadTooLarge`` past the
+        per-file limit).
+        """
         # Verify application exists
-        app = applications_collection.find_one({"id": application_id})
+        app = await applications_collection.find_one({"id": application_id})
         if not app:
             raise ValueError("Application not found")
         
         # Generate document ID
         doc_id = ApplicationService.generate_id("DOC")
         
-        # Create document record
+        # Bytes go to the blob store; the record only references them
+        # (file_size and sha256 come back with the blob fields)
+        metadata = {"application_id": application_id, "document_id": doc_id, "uploaded_by": actor_id}
+        if isinstance(file_content, (bytes, bytearray)):
+            blob_fields = await store_document_blob(bytes(file_content), filename, content_type, metadata=metadata)
+        else:
+            blob_fields = await store_document_upload(file_content, metadata=metadata)
+        staged = {"id": doc_id, "filename": filename, "content_type": content_type, **blob_fields}
+        await ApplicationService.record_document(application_id, staged, actor_role, actor_id)
+        return doc_id
+
+    @staticmethod
+    async def stage_document_uploads(application_id: str, files: List[Any], actor_id: str,
+                                     budget: Optional[UploadBudget] = None) -> List[Dict[str, Any]]:
+        """Stream several uploads into the blob store under one request budget.
+
+        Nothing is recorded yet: pass each staged entry to ``record_document``
+        once the application exists. If any file fails (e.g. ``UploadTooLarge``)
+        the blobs already stored are deleted and the error is re-raised.
+        """
+        budget = budget or UploadBudget()
+        staged: List[Dict[str, Any]] = []
+        try:
+            for file in files:
+                doc_id = ApplicationService.generate_id("DOC")
+                metadata = {"application_id": application_id, "document_id": doc_id, "uploaded_by": actor_id}
+                blob_fields = await store_document_upload(file, metadata=metadata, budget=budget)
+                staged.append({"id": doc_id, "filename": file.filename,
+                               "content_type": file.content_type or "application/octet-stream", **blob_fields})
+        except Exception:
+            await ApplicationService.discard_staged_documents(staged)
+            raise
+        return staged
+
+    @staticmethod
+    async def discard_staged_documents(staged: List[Dict[str, Any]]) -> None:
+        """Delete the blobs of staged uploads that will not be recorded"""
+        for entry in staged:
+            try:
+                await delete_document_blob(entry)
+            except Exception as e:
+                print(f"⚠️ Could not delete staged blob {entry.get('blob_key')}: {e}")
+
+    @staticmethod
+    async def record_document(application_id: str, staged: Dict[str, Any], actor_role: UserRole,
+                              actor_id: str) -> None:
+        """Insert the document record for a stored blob (+ counters, audit event)"""
         document = {
-            "id": doc_id,
+            "id": staged["id"],
             "application_id": application_id,
-            "filename": filename,
-            "content_type": content_type,
-            "file_size": len(file_content),
+            "filename": staged["filename"],
+            "content_type": staged["content_type"],
             "uploaded_by": actor_id,
             "uploaded_at": datetime.now(),
-            "type": DocumentType.REQUESTED_DOCS
+            "type": DocumentType.REQUESTED_DOCS,
+            "blob_backend": staged["blob_backend"],
+            "blob_key": staged["blob_key"],
+            "file_size": staged["file_size"],
+            "sha256": staged["sha256"],
         }
-        
-        # Store document metadata in database
-        documents_collection.insert_one(document)
-        
-        # Store file content (in a real app, you'd store this in a file system or cloud storage)
-        # For now, we'll store it in the database as well
-        document["content"] = file_content
-        documents_collection.update_one(
-            {"id": doc_id}, 
-            {"$set": {"content": file_content}}
-        )
+        await documents_collection.insert_one(document)
+        await counters.documents_added()
         
         # Create audit event
-        ApplicationService.create_audit_event(
+        await ApplicationService.create_audit_event(
             application_id, actor_role, actor_id, AuditAction.UPLOADED_DOCUMENT, 
-            {"filename": filename, "document_id": doc_id}
+            {"filename": staged["filename"], "document_id": staged["id"]}
         )
-        
-        return doc_id
@@ -0,0 +1,202 @@
+"""
+Write-behind audit logger.
+
+Audit events used to be written with one ``insert_one`` round trip each on
+the request path. ``audit_writer.write()`` now appends the event to an
+in-process buffer and a background task flushes it with ``insert_many`` when
+``AUDIT_BATCH_SIZE`` events are pending or every ``AUDIT_FLUSH_INTERVAL_MS``.
+
+- Bounded memory: once ``AUDIT_MAX_PENDING`` events are buffered, writers wait
+  for a flush instead of growing the buffer (events are never dropped).
+- Failed flushes are put back at the head of the buffer and retried. A
+  retried event gets a fresh ``_id`` (after checking an ambiguous failure did
+  not store it), so it never lands behind the compliance scanner's watermark.
+- The FastAPI lifespan starts the flusher and drains the buffer on shutdown.
+- ``AUDIT_WRITE_MODE=sync`` (tests, scripts) writes each event immediately;
+  so does ``write()`` when the flusher is not running.
+
+Readers that need every event written so far (auditor views, timelines) call
+``await audit_writer.flush()`` first. It returns once every event buffered
+before the call is stored, including a batch the flusher is writing at that
+moment, and is free when nothing is buffered or in flight.
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from config.async_db import audit_events_collection
+from services import counters
+
+AUDIT_WRITE_MODE = os.getenv("AUDIT_WRITE_MODE", "async").strip().lower()
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "200"))
+AUDIT_MAX_PENDING = int(os.getenv("AUDIT_MAX_PENDING", "10000"))
+
+
+class AuditWriter:
+    """Buffers audit events and writes them in batches"""
+
+    def __init__(self, collection, mode: str = AUDIT_WRITE_MODE, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS, max_pending: int = AUDIT_MAX_PENDING):
+        self.collection = collection
+        self.mode = mode
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(1, flush_interval_ms) / 1000.0
+        self.max_pending = max(self.batch_size, max_pending)
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # _ids of events whose failed write may have been stored anyway
+        self._unknown: set = set()
+        self._stopping = False
+        self.stats = {"written": 0, "batches": 0, "failed_flushes": 0, "backpressure_waits": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop"""
+        if self.mode == "sync" or self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="audit-writer")
+        print(f"📝 Audit writer started (batch={self.batch_size}, interval={int(self.flush_interval * 1000)}ms)")
+
+    async def stop(self) -> None:
+        """Stop the flusher and write everything still buffered"""
+        if self._task is not None:
+            # Let an in-progress insert_many finish instead of cancelling it
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._pending:
+            print(f"❌ Audit writer stopped with {len(self._pending)} unwritten event(s)")
+
+    async def write(self, event: Dict[str, Any]) -> None:
+        """Record one audit event (buffered unless in sync mode)"""
+        if self.mode == "sync" or not self.running:
+            await self.collection.insert_one(event)
+            self.stats["written"] += 1
+            await counters.audit_events_added(1)
+            return
+        if len(self._pending) >= self.max_pending:
+            # Backpressure: make room by flushing on the caller's time
+            self.stats["backpressure_waits"] += 1
+            await self.flush()
+            if len(self._pending) >= self.max_pending:
+                await self.collection.insert_one(event)
+                self.stats["written"] += 1
+                await counters.audit_events_added(1)
+                return
+        self._pending.append(event)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write all buffered events; returns how many were written"""
+        # Events are popped before their insert_many returns, so an empty buffer
+        # alone does not mean everything is written: wait out an in-flight batch.
+        if not self._pending and not (self._flush_lock is not None and self._flush_lock.locked()):
+            return 0
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch: List[Dict[str, Any]] = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popleft())
+                try:
+                    already = await self._settle_unknown(batch)
+                    written += already
+                    self.stats["written"] += already
+                    if batch:
+                        await self.collection.insert_many(batch, ordered=False)
+                except Exception as e:
+                    self._pending.extendleft(reversed(self._retryable(e, batch)))
+                    self.stats["failed_flushes"] += 1
+                    print(f"❌ Audit flush failed ({len(self._pending)} event(s) pending): {e}")
+                    break
+                written += len(batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+        if written:
+            await counters.audit_events_added(written)
+        return written
+
+    def _retryable(self, error: Exception, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Events of a failed batch that still need writing, in order.
+
+        pymongo stamps ``_id`` on the first attempt, and the compliance scanner
+        walks ``_id`` order behind a short lag, so a retry must not reuse an
+        old ``_id`` or the event would land behind the scanner's watermark.
+
+        For a BulkWriteError only the events reported as write errors are kept
+        and they get a fresh ``_id`` (they were definitely not stored);
+        duplicate-key errors mean an earlier attempt already stored the event.
+        Any other error (network, timeout) keeps the whole batch with its ids:
+        whether it was stored is unknown, so the next flush checks first
+        (``_settle_unknown``).
+        """
+        details = getattr(error, "details", None)
+        if not isinstance(details, dict) or "writeErrors" not in details:
+            self._unknown.update(ev["_id"] for ev in batch if "_id" in ev)
+            return batch
+        retry_ids = {
+            err.get("op", {}).get("_id")
+            for err in details["writeErrors"]
+            if err.get("code") != 11000
+        }
+        retry = [ev for ev in batch if ev.get("_id") in retry_ids]
+        for ev in retry:
+            ev.pop("_id", None)
+        return retry
+
+    async def _settle_unknown(self, batch: List[Dict[str, Any]]) -> int:
+        """Resolve events whose earlier write may or may not have landed.
+
+        Stored ones are removed from ``batch`` (returns how many); the rest lose
+        their stale ``_id`` so ``insert_many`` assigns a current one.
+        """
+        ids = [ev["_id"] for ev in batch if ev.get("_id") in self._unknown]
+        if not ids:
+            return 0
+        stored = {doc["_id"] for doc in await self.collection.find({"_id": {"$in": ids}}, {"_id": 1})
+                  .to_list(length=None)}
+        self._unknown.difference_update(ids)
+        kept = []
+        for ev in batch:
+            if ev.get("_id") in stored:
+                continue
+            if ev.get("_id") in ids:
+                ev.pop("_id")
+            kept.append(ev)
+        batch[:] = kept
+        return len(stored)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Audit writer error: {e}")
+
+
+audit_writer = AuditWriter(audit_events_collection)
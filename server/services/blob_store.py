@@ -0,0 +1,351 @@
+"""
+Blob storage for application documents.
+
+Document records in the ``documents`` collection only carry metadata plus a
+``blob_backend``/``blob_key`` pair; the bytes live in one of the backends below.
+
+- ``GridFSBlobStore``: GridFS bucket in the application database (default)
+- ``LocalBlobStore``: files under ``BLOB_STORE_DIR``; all file I/O runs in
+  worker threads. The download route serves whole files through
+  ``local_path()`` and ``FileResponse`` (pathsend where the server supports it)
+
+Uploads are streamed (``store_document_upload``): ``UploadFile`` chunks are
+piped into a GridFS upload stream or a temporary local file while their size
+and SHA-256 are computed, so memory per upload is bounded by the chunk size.
+
+Select the backend for new uploads with ``BLOB_STORE_BACKEND=gridfs|local``.
+Older records are still readable: ``file_id`` (GridFS) and inline ``content``
+until ``migrate_document_blobs.py`` has moved them.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from config.async_db import db, get_gridfs_bucket
+from services.uploads import UploadBudget, iter_upload
+
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "gridfs").strip().lower()
+BLOB_STORE_DIR = Path(os.getenv("BLOB_STORE_DIR", Path(__file__).resolve().parents[1] / "blob_store"))
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+
+class BlobNotFound(Exception):
+    """Raised when a blob key does not resolve to stored bytes"""
+
+
+class BlobStore(ABC):
+    """Interface shared by the storage backends (keys are opaque strings)"""
+
+    name = "base"
+
+    @abstractmethod
+    async def put(self, data: bytes, filename: str, content_type: Optional[str] = None,
+                  metadata: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> str:
+        """Store bytes and return the blob key; ``key`` requests a fixed key (idempotent writes)"""
+
+    @abstractmethod
+    async def put_stream(self, chunks: AsyncIterator[bytes], filename: str, content_type: Optional[str] = None,
+                         metadata: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> str:
+        """Store bytes from an async chunk iterator; nothing is kept if it raises"""
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """All bytes of a blob"""
+
+    @abstractmethod
+    def stream(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield bytes ``start`` to ``end`` (exclusive, default: all) in chunks without holding them in memory"""
+
+    @abstractmethod
+    async def size(self, key: str) -> int:
+        """Blob length in bytes"""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether the key resolves to stored bytes"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove a blob (``BlobNotFound`` if it is already gone)"""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of a blob when the backend has one (for FileResponse)"""
+        return None
+
+
+class GridFSBlobStore(BlobStore):
+    """Blobs in the GridFS bucket; keys are the file ObjectIds as hex strings"""
+
+    name = "gridfs"
+
+    @staticmethod
+    def _oid(key: Any) -> ObjectId:
+        try:
+            return key if isinstance(key, ObjectId) else ObjectId(str(key))
+        except (InvalidId, TypeError):
+            raise BlobNotFound(f"Invalid GridFS blob key: {key!r}")
+
+    async def put(self, data: bytes, filename: str, content_type: Optional[str] = None,
+                  metadata: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> str:
+        meta = dict(metadata or {})
+        if content_type:
+            meta.setdefault("content_type", content_type)
+        bucket = get_gridfs_bucket()
+        if key is not None:
+            file_id = self._oid(key)
+            if await self.exists(key):
+                return str(file_id)
+            stream = bucket.open_upload_stream_with_id(file_id, filename, metadata=meta)
+        else:
+            stream = bucket.open_upload_stream(filename, metadata=meta)
+        await stream.write(data)
+        await stream.close()
+        return str(stream._id)
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], filename: str, content_type: Optional[str] = None,
+                         metadata: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> str:
+        meta = dict(metadata or {})
+        if content_type:
+            meta.setdefault("content_type", content_type)
+        bucket = get_gridfs_bucket()
+        if key is not None:
+            stream = bucket.open_upload_stream_with_id(self._oid(key), filename, metadata=meta)
+        else:
+            stream = bucket.open_upload_stream(filename, metadata=meta)
+        try:
+            async for chunk in chunks:
+                # GridIn flushes full chunk_size pieces to fs.chunks as they fill
+                await stream.write(chunk)
+        except BaseException:
+            # Removes the chunks already written for this file
+            await stream.abort()
+            raise
+        await stream.close()
+        return str(stream._id)
+
+    async def _open(self, key: str):
+        try:
+            return await get_gridfs_bucket().open_download_stream(self._oid(key))
+        except BlobNotFound:
+            raise
+        except Exception as e:
+            raise BlobNotFound(f"GridFS blob {key} not found: {e}")
+
+    async def get(self, key: str) -> bytes:
+        grid_out = await self._open(key)
+        return await grid_out.read()
+
+    async def stream(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        grid_out = await self._open(key)
+        remaining = (grid_out.length if end is None else min(end, grid_out.length)) - start
+        if start:
+            # GridOut seeks by chunk number, so only the chunks in range are fetched
+            grid_out.seek(start)
+        while remaining > 0:
+            chunk = await grid_out.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def size(self, key: str) -> int:
+        grid_out = await self._open(key)
+        return grid_out.length
+
+    async def exists(self, key: str) -> bool:
+        try:
+            oid = self._oid(key)
+        except BlobNotFound:
+            return False
+        return await db["fs.files"].find_one({"_id": oid}, {"_id": 1}) is not None
+
+    async def delete(self, key: str) -> None:
+        try:
+            await get_gridfs_bucket().delete(self._oid(key))
+        except BlobNotFound:
+            raise
+        except Exception as e:
+            raise BlobNotFound(f"GridFS blob {key} not found: {e}")
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under a root directory, sharded by key prefix"""
+
+    name = "local"
+    _KEY_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+    def __init__(self, root: Path = BLOB_STORE_DIR):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        # Keys are generated here or are document ids; never allow path traversal
+        if not self._KEY_RE.match(key or ""):
+            raise BlobNotFound(f"Invalid local blob key: {key!r}")
+        return self.root / key[-2:] / key
+
+    def local_path(self, key: str) -> Optional[Path]:
+        # Existence is not checked here (callers have already sized the blob)
+        return self._path(key)
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".part")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # Atomic rename: readers never observe a partially written blob
+        os.replace(tmp, path)
+
+    async def put(self, data: bytes, filename: str, content_type: Optional[str] = None,
+                  metadata: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> str:
+        key = key or str(ObjectId())
+        await asyncio.to_thread(self._write, self._path(key), bytes(data))
+        return key
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], filename: str, content_type: Optional[str] = None,
+                         metadata: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> str:
+        key = key or str(ObjectId())
+        path = self._path(key)
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + f".{ObjectId()}.part")
+        f = await asyncio.to_thread(open, tmp, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+            await asyncio.to_thread(f.flush)
+            await asyncio.to_thread(os.fsync, f.fileno())
+            f.close()
+            await asyncio.to_thread(os.replace, tmp, path)
+        except BaseException:
+            f.close()
+            tmp.unlink(missing_ok=True)
+            raise
+        return key
+
+    async def get(self, key: str) -> bytes:
+        path = self._path(key)
+        try:
+            return await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            raise BlobNotFound(f"Local blob {key} not found")
+
+    @staticmethod
+    def _read_at(f, offset: int, n: int) -> bytes:
+        f.seek(offset)
+        return f.read(n)
+
+    async def stream(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        path = self._path(key)
+        try:
+            f = await asyncio.to_thread(open, path, "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(f"Local blob {key} not found")
+        try:
+            size = (await asyncio.to_thread(os.fstat, f.fileno())).st_size
+            stop = size if end is None else min(end, size)
+            offset = start
+            while offset < stop:
+                # Disk reads run in a worker thread so they never block the event loop
+                chunk = await asyncio.to_thread(self._read_at, f, offset, min(chunk_size, stop - offset))
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def size(self, key: str) -> int:
+        path = self._path(key)
+        try:
+            return (await asyncio.to_thread(path.stat)).st_size
+        except FileNotFoundError:
+            raise BlobNotFound(f"Local blob {key} not found")
+
+    async def exists(self, key: str) -> bool:
+        try:
+            path = self._path(key)
+        except BlobNotFound:
+            return False
+        return await asyncio.to_thread(path.is_file)
+
+    async def delete(self, key: str) -> None:
+        path = self._path(key)
+        try:
+            await asyncio.to_thread(path.unlink)
+        except FileNotFoundError:
+            raise BlobNotFound(f"Local blob {key} not found")
+
+
+_STORES: Dict[str, BlobStore] = {}
+
+
+def get_blob_store(backend: Optional[str] = None) -> BlobStore:
+    """Backend by name; defaults to BLOB_STORE_BACKEND for new uploads"""
+    backend = (backend or BLOB_STORE_BACKEND).lower()
+    if backend not in _STORES:
+        if backend == GridFSBlobStore.name:
+            _STORES[backend] = GridFSBlobStore()
+        elif backend == LocalBlobStore.name:
+            _STORES[backend] = LocalBlobStore()
+        else:
+            raise ValueError(f"Unknown blob store backend: {backend}")
+    return _STORES[backend]
+
+
+def blob_ref(document: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """``{"backend", "key"}`` for a document record, or None for inline/no content"""
+    if document.get("blob_key"):
+        return {"backend": document.get("blob_backend") or GridFSBlobStore.name, "key": str(document["blob_key"])}
+    if document.get("file_id"):
+        # Records written before the blob store referenced GridFS directly
+        return {"backend": GridFSBlobStore.name, "key": str(document["file_id"])}
+    return None
+
+
+async def delete_document_blob(fields: Dict[str, Any]) -> None:
+    """Delete a blob given the fields ``store_document_*`` returned"""
+    await get_blob_store(fields["blob_backend"]).delete(fields["blob_key"])
+
+
+async def store_document_blob(data: bytes, filename: str, content_type: Optional[str],
+                              metadata: Optional[Dict[str, Any]] = None,
+                              backend: Optional[str] = None, key: Optional[str] = None) -> Dict[str, Any]:
+    """Store document bytes and return the fields to put on the document record"""
+    store = get_blob_store(backend)
+    blob_key = await store.put(data, filename, content_type, metadata, key=key)
+    return {"blob_backend": store.name, "blob_key": blob_key, "file_size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest()}
+
+
+async def store_document_upload(file, metadata: Optional[Dict[str, Any]] = None,
+                                backend: Optional[str] = None, key: Optional[str] = None,
+                                budget: Optional[UploadBudget] = None) -> Dict[str, Any]:
+    """Stream an UploadFile into the blob store; same fields as ``store_document_blob``.
+
+    Raises ``UploadTooLarge`` (nothing stored) when the budget is exceeded.
+    """
+    store = get_blob_store(backend)
+    digest = hashlib.sha256()
+    size = 0
+
+    async def hashed_chunks() -> AsyncIterator[bytes]:
+        nonlocal size
+        async for chunk in iter_upload(file, budget, chunk_size=DEFAULT_CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+            yield chunk
+
+    blob_key = await store.put_stream(hashed_chunks(), file.filename, file.content_type, metadata, key=key)
+    return {"blob_backend": store.name, "blob_key": blob_key, "file_size": size, "sha256": digest.hexdigest()}
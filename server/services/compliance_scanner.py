@@ -0,0 +1,178 @@
+"""
+Incremental compliance scanner for audit events.
+
+The auditor views used to re-validate required fields on the newest 200/500
+audit events on every page load. A background task now walks
+``audit_events`` in ``_id`` order from a persisted watermark, validates each
+event exactly once and stores what it finds in the ``compliance_issues``
+collection (one record per event and field, unique on ``event_oid, field``).
+
+State lives in a single ``counters`` document:
+
+    {"_id": "compliance_scanner", "last_event_id": ObjectId(...),
+     "events_scanned": 1234, "issues_total": 3, "scanned_at": ...}
+
+so the dashboard reads compliance in one lookup, and coverage is every event.
+
+- Events newer than ``COMPLIANCE_SCAN_LAG_S`` are left for the next pass, so
+  ids allocated by another worker a moment earlier are not skipped. The audit
+  writer gives retried events a fresh ``_id``, so a write that took several
+  attempts is not left behind the watermark either.
+- Issues are upserted and the watermark is advanced after each batch; a crash
+  in between re-scans at most one batch without duplicating issue records.
+- ``pending_issues()`` validates the not-yet-scanned tail on demand for the
+  explicit integrity-check endpoint, which never runs ``scan()`` itself.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from config.async_db import audit_events_collection, compliance_issues_collection, counters_collection
+
+STATE_ID = "compliance_scanner"
+COMPLIANCE_SCAN_INTERVAL_S = int(os.getenv("COMPLIANCE_SCAN_INTERVAL_S", "30"))
+COMPLIANCE_SCAN_BATCH_SIZE = int(os.getenv("COMPLIANCE_SCAN_BATCH_SIZE", "1000"))
+COMPLIANCE_SCAN_LAG_S = int(os.getenv("COMPLIANCE_SCAN_LAG_S", "5"))
+
+# Fields every audit event must carry (falsy value = missing)
+REQUIRED_EVENT_FIELDS = ["action", "actor_role", "created_at"]
+
+_EVENT_PROJECTION = {"_id": 1, "id": 1, "application_id": 1, **{f: 1 for f in REQUIRED_EVENT_FIELDS}}
+
+
+def event_issues(event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Compliance issues of a single audit event"""
+    issues = []
+    for field in REQUIRED_EVENT_FIELDS:
+        value = event.get(field)
+        if value is None or (field != "created_at" and not value):
+            issues.append({
+                "type": "missing_field",
+                "field": field,
+                "id": event.get("id"),
+                "event_oid": event.get("_id"),
+                "application_id": event.get("application_id"),
+            })
+    return issues
+
+
+def public_issue(issue: Dict[str, Any]) -> Dict[str, Any]:
+    """Issue record in the shape returned by the auditor endpoints"""
+    return {"type": issue.get("type", "missing_field"), "field": issue.get("field"), "id": issue.get("id")}
+
+
+class ComplianceScanner:
+    """Background task validating audit events past the watermark"""
+
+    def __init__(self, interval_s: int = COMPLIANCE_SCAN_INTERVAL_S,
+                 batch_size: int = COMPLIANCE_SCAN_BATCH_SIZE, lag_s: int = COMPLIANCE_SCAN_LAG_S):
+        self.interval_s = interval_s
+        self.batch_size = max(1, batch_size)
+        self.lag_s = max(0, lag_s)
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def get_state(self) -> Dict[str, Any]:
+        """Scanner state document (one read)"""
+        state = await counters_collection.find_one({"_id": STATE_ID})
+        return state or {"_id": STATE_ID, "last_event_id": None, "events_scanned": 0, "issues_total": 0}
+
+    async def scan(self) -> int:
+        """Validate every settled event past the watermark; returns how many were scanned"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            state = await self.get_state()
+            watermark = state.get("last_event_id")
+            upper = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=self.lag_s))
+            scanned = 0
+            while True:
+                id_range: Dict[str, Any] = {}
+                if self.lag_s:
+                    id_range["$lt"] = upper
+                if watermark is not None:
+                    id_range["$gt"] = watermark
+                batch = await audit_events_collection.find(
+                    {"_id": id_range} if id_range else {}, _EVENT_PROJECTION
+                ).sort("_id", 1).limit(self.batch_size).to_list(length=self.batch_size)
+                if not batch:
+                    break
+
+                now = datetime.now()
+                ops = []
+                for event in batch:
+                    for issue in event_issues(event):
+                        ops.append(UpdateOne(
+                            {"event_oid": issue["event_oid"], "field": issue["field"]},
+                            {"$setOnInsert": {**issue, "detected_at": now}},
+                            upsert=True,
+                        ))
+                new_issues = 0
+                if ops:
+                    result = await compliance_issues_collection.bulk_write(ops, ordered=False)
+                    new_issues = result.upserted_count
+
+                watermark = batch[-1]["_id"]
+                scanned += len(batch)
+                await counters_collection.update_one(
+                    {"_id": STATE_ID},
+                    {"$set": {"last_event_id": watermark, "scanned_at": now},
+                     "$inc": {"events_scanned": len(batch), "issues_total": new_issues}},
+                    upsert=True,
+                )
+                if len(batch) < self.batch_size:
+                    break
+            return scanned
+
+    async def pending_issues(self) -> List[Dict[str, Any]]:
+        """Validate events past the watermark without recording them"""
+        state = await self.get_state()
+        query: Dict[str, Any] = {}
+        if state.get("last_event_id") is not None:
+            query["_id"] = {"$gt": state["last_event_id"]}
+        events = await audit_events_collection.find(query, _EVENT_PROJECTION).to_list(length=None)
+        return [issue for event in events for issue in event_issues(event)]
+
+    async def list_issues(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recorded issues, newest first"""
+        cursor = compliance_issues_collection.find({}, {"_id": 0}).sort("detected_at", -1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def reset(self) -> None:
+        """Forget all recorded issues and rescan from the beginning"""
+        await compliance_issues_collection.delete_many({})
+        await counters_collection.delete_one({"_id": STATE_ID})
+
+    def start(self) -> None:
+        if self.interval_s <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(), name="compliance-scanner")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                scanned = await self.scan()
+                if scanned:
+                    print(f"🔎 Compliance scanner checked {scanned} audit event(s)")
+            except Exception as e:
+                print(f"❌ Compliance scan failed: {e}")
+            await asyncio.sleep(self.interval_s)
+
+
+compliance_scanner = ComplianceScanner()
@@ -0,0 +1,274 @@
+"""
+Materialized dashboard counters.
+
+Two documents in the ``counters`` collection hold per-status application
+tallies, per-role user tallies and a few collection totals, so dashboards read
+them instead of issuing a ``count_documents`` per bucket:
+
+    {"_id": "dashboard",
+     "applications": {"submitted": 12, "approved": 4, ...}, "applications_total": 30,
+     "users": {"customer": 20, ...}, "users_total": 25, "documents_total": 41,
+     "approved_by_day": {"2024-05-01": 3, ...},
+     "reconciled_at": ..., "updated_at": ...}
+    {"_id": "dashboard_audit", "audit_events_total": 310, ...}
+
+The audit total lives apart because the audit writer bumps it on every flush;
+``get_counters()`` returns both merged into one dict.
+
+Writers call the ``*_changed``/``*_created`` helpers next to the mutation they
+describe ($inc on the same document, one round trip). ``reconcile()``
+recomputes everything with one ``$group`` per collection; the lifespan runs it
+at startup and then every ``COUNTERS_RECONCILE_INTERVAL_S`` seconds to correct
+drift (scripts that write directly, crashes between a mutation and its counter
+update).
+
+Every ``$inc`` also bumps the document's ``version``. Reconciliation snapshots
+a document before counting and writes its correction as ``$inc`` deltas
+against that snapshot, only if the version is unchanged, so an increment made
+while it was counting is never overwritten; it retries a few times and
+otherwise leaves the counters to the next run. A mutation whose ``$inc`` is
+still in flight when the correction lands is counted twice until the next
+run corrects it.
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from config.async_db import (
+    applications_collection, users_collection, documents_collection,
+    audit_events_collection, counters_collection
+)
+from models import ApplicationStatus, UserRole
+
+COUNTERS_ID = "dashboard"
+# Audit flushes $inc their total several times a second; a separate document
+# keeps them from invalidating the dashboard document's version guard
+AUDIT_COUNTERS_ID = "dashboard_audit"
+COUNTERS_RECONCILE_INTERVAL_S = int(os.getenv("COUNTERS_RECONCILE_INTERVAL_S", "300"))
+# Recount attempts when concurrent increments keep changing the version
+COUNTERS_RECONCILE_ATTEMPTS = 3
+
+# Buckets always present in responses, even when zero
+APPLICATION_STATUSES = [status.value for status in ApplicationStatus]
+USER_ROLES = [role.value for role in UserRole]
+
+
+def _key(value: Any) -> str:
+    """Counter field name for a status/role value (enums, None, dots)"""
+    value = getattr(value, "value", value)
+    if value is None or value == "":
+        return "unknown"
+    return str(value).replace(".", "_").replace("$", "_")
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+async def _inc(increments: Dict[str, int], counter_id: str = COUNTERS_ID) -> None:
+    increments = {k: v for k, v in increments.items() if v}
+    if not increments:
+        return
+    try:
+        await counters_collection.update_one(
+            {"_id": counter_id},
+            {"$inc": {**increments, "version": 1}, "$set": {"updated_at": datetime.now()}},
+            upsert=True
+        )
+    except Exception as e:
+        # Counters are advisory; reconciliation repairs a missed update
+        print(f"Warning: failed to update dashboard counters: {e}")
+
+
+async def application_created(status: Any) -> None:
+    await _inc({f"applications.{_key(status)}": 1, "applications_total": 1})
+
+
+async def application_status_changed(old_status: Any, new_status: Any) -> None:
+    old_key, new_key = _key(old_status), _key(new_status)
+    if old_key == new_key:
+        return
+    increments = {f"applications.{old_key}": -1, f"applications.{new_key}": 1}
+    if new_key == "approved":
+        increments[f"approved_by_day.{_today()}"] = 1
+    await _inc(increments)
+
+
+async def user_created(role: Any) -> None:
+    await _inc({f"users.{_key(role)}": 1, "users_total": 1})
+
+
+async def user_role_changed(old_role: Any, new_role: Any) -> None:
+    old_key, new_key = _key(old_role), _key(new_role)
+    if old_key != new_key:
+        await _inc({f"users.{old_key}": -1, f"users.{new_key}": 1})
+
+
+async def documents_added(count: int = 1) -> None:
+    await _inc({"documents_total": count})
+
+
+async def audit_events_added(count: int = 1) -> None:
+    await _inc({"audit_events_total": count}, AUDIT_COUNTERS_ID)
+
+
+def _leaves(doc: Dict[str, Any], fields: Iterable[str]) -> Dict[str, int]:
+    """Numeric counter values of ``fields`` as dotted paths (``applications.submitted``)"""
+    out: Dict[str, int] = {}
+    for field in fields:
+        value = doc.get(field)
+        if isinstance(value, dict):
+            for key, count in value.items():
+                if isinstance(count, (int, float)):
+                    out[f"{field}.{key}"] = count
+        elif isinstance(value, (int, float)):
+            out[field] = value
+    return out
+
+
+async def _reconcile_document(counter_id: str, recount: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Bring one counters document in line with ``recount()``.
+
+    The correction is written as ``$inc`` deltas against a snapshot read before
+    counting, and only while the version still matches that snapshot. Counter
+    fields outside the recount (e.g. earlier days of ``approved_by_day``) are
+    left untouched.
+    """
+    totals: Dict[str, Any] = {}
+    for _ in range(COUNTERS_RECONCILE_ATTEMPTS):
+        snapshot = await counters_collection.find_one({"_id": counter_id})
+        totals = await recount()
+        now = datetime.now()
+        if snapshot is None:
+            try:
+                await counters_collection.insert_one(
+                    {"_id": counter_id, "version": 0, **totals, "reconciled_at": now, "updated_at": now}
+                )
+                return {**totals, "reconciled_at": now}
+            except DuplicateKeyError:
+                # A writer created the document meanwhile: recount against it
+                continue
+        target = _leaves(totals, totals)
+        # Buckets that no longer exist drop to zero; other days of approved_by_day are kept
+        current = _leaves(snapshot, [field for field in totals if field != "approved_by_day"])
+        current.update({path: count for path, count in _leaves(snapshot, ["approved_by_day"]).items()
+                        if path in target})
+        deltas = {path: target.get(path, 0) - current.get(path, 0) for path in set(target) | set(current)}
+        update: Dict[str, Any] = {"$set": {"reconciled_at": now, "updated_at": now}}
+        deltas = {path: delta for path, delta in deltas.items() if delta}
+        if deltas:
+            update["$inc"] = deltas
+        # Only if no $inc landed since the snapshot (a missing version matches None)
+        result = await counters_collection.update_one({"_id": counter_id, "version": snapshot.get("version")}, update)
+        if result.matched_count:
+            return {**totals, "reconciled_at": now}
+    print(f"Warning: {counter_id} counters changed during every reconciliation attempt; will retry later")
+    return totals
+
+
+async def reconcile() -> Dict[str, Any]:
+    """Recompute every counter from the collections and store the result"""
+    start_of_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    async def group_counts(collection, field: str) -> Dict[str, int]:
+        rows = await collection.aggregate([
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+        ]).to_list(length=None)
+        counts: Dict[str, int] = {}
+        for row in rows:
+            key = _key(row["_id"])
+            counts[key] = counts.get(key, 0) + row["count"]
+        return counts
+
+    async def recount_dashboard() -> Dict[str, Any]:
+        app_counts, user_counts, documents_total, approved_today = await asyncio.gather(
+            group_counts(applications_collection, "status"),
+            group_counts(users_collection, "role"),
+            documents_collection.count_documents({}),
+            applications_collection.count_documents({"status": "approved", "decided_at": {"$gte": start_of_day}}),
+        )
+        return {
+            "applications": app_counts,
+            "applications_total": sum(app_counts.values()),
+            "users": user_counts,
+            "users_total": sum(user_counts.values()),
+            "documents_total": documents_total,
+            "approved_by_day": {start_of_day.strftime("%Y-%m-%d"): approved_today},
+        }
+
+    async def recount_audit() -> Dict[str, Any]:
+        return {"audit_events_total": await audit_events_collection.count_documents({})}
+
+    dashboard, audit = await asyncio.gather(
+        _reconcile_document(COUNTERS_ID, recount_dashboard),
+        _reconcile_document(AUDIT_COUNTERS_ID, recount_audit),
+    )
+    return _merge(dashboard, audit)
+
+
+def _merge(dashboard: Dict[str, Any], audit: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Dashboard counters with the audit total from its own document"""
+    return {**dashboard, "_id": COUNTERS_ID, "audit_events_total": (audit or {}).get("audit_events_total", 0)}
+
+
+async def get_counters() -> Dict[str, Any]:
+    """Current counters (one query for both documents; reconciles on first use)"""
+    docs = await counters_collection.find({"_id": {"$in": [COUNTERS_ID, AUDIT_COUNTERS_ID]}}).to_list(length=None)
+    by_id = {doc["_id"]: doc for doc in docs}
+    dashboard, audit = by_id.get(COUNTERS_ID), by_id.get(AUDIT_COUNTERS_ID)
+    if dashboard is None or audit is None or "reconciled_at" not in dashboard or "reconciled_at" not in audit:
+        return await reconcile()
+    return _merge(dashboard, audit)
+
+
+def application_stats(counters: Dict[str, Any]) -> Dict[str, int]:
+    """Per-status counts with every known status present"""
+    counts = counters.get("applications") or {}
+    return {s: max(0, int(counts.get(s, 0))) for s in APPLICATION_STATUSES}
+
+
+def user_stats(counters: Dict[str, Any]) -> Dict[str, int]:
+    """Per-role counts keyed the way the dashboards expect (plural names)"""
+    counts = counters.get("users") or {}
+    return {f"{role}s": max(0, int(counts.get(role, 0))) for role in USER_ROLES}
+
+
+def approved_today(counters: Dict[str, Any]) -> int:
+    return max(0, int((counters.get("approved_by_day") or {}).get(_today(), 0)))
+
+
+class CounterReconciler:
+    """Background task that periodically runs reconcile()"""
+
+    def __init__(self, interval_s: int = COUNTERS_RECONCILE_INTERVAL_S):
+        self.interval_s = interval_s
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval_s <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(), name="counter-reconciler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await reconcile()
+            except Exception as e:
+                print(f"❌ Counter reconciliation failed: {e}")
+            await asyncio.sleep(self.interval_s)
+
+
+counter_reconciler = CounterReconciler()
@@ -12,6 +12,10 @@ import io
 
 class DocumentVerificationService:
     """Service for LLM-based document verification"""
+
+    # Bump whenever extract_document_info's output changes: cached
+    # extractions (services/extraction_cache.py) are keyed by it
+    EXTRACTOR_VERSION = "simulated-1"
     
     @staticmethod
     def extract_document_info(file_content: bytes, filename: str, content_type: str) -> Dict[str, Any]:
@@ -248,6 +252,70 @@ class DocumentVerificationService:
         
         return verification_results
     
+    @staticmethod
+    def aggregate_verification_results(document_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merge per-document cross-check results into one application-level verdict
+        
+        Args:
+            document_results: One entry per document with ``document_id``,
+                ``filename``, ``extracted_info`` and ``verification_results``
+                (or ``error`` when the document could not be processed)
+            
+        Returns:
+            Verification results in the cross_check_information shape, with
+            matches/mismatches tagged by document and a per-document breakdown
+        """
+        aggregate = {
+            "verification_timestamp": datetime.now().isoformat(),
+            "overall_status": "verified",
+            "matches": [],
+            "mismatches": [],
+            "warnings": [],
+            "confidence_score": 0.0,
+            "documents": []
+        }
+        
+        for entry in document_results:
+            filename = entry.get("filename")
+            results = entry.get("verification_results")
+            if results is None:
+                aggregate["warnings"].append(f"{filename}: could not be verified ({entry.get('error', 'unknown error')})")
+                aggregate["overall_status"] = "needs_review"
+                aggregate["documents"].append({
+                    "document_id": entry.get("document_id"),
+                    "filename": filename,
+                    "overall_status": "error",
+                    "error": entry.get("error")
+                })
+                continue
+            
+            aggregate["matches"].extend({**m, "document": filename} for m in results["matches"])
+            aggregate["mismatches"].extend({**m, "document": filename} for m in results["mismatches"])
+            aggregate["warnings"].extend(f"{filename}: {w}" for w in results["warnings"])
+            if results["overall_status"] != "verified":
+                aggregate["overall_status"] = "needs_review"
+            aggregate["documents"].append({
+                "document_id": entry.get("document_id"),
+                "filename": filename,
+                "document_type": (entry.get("extracted_info") or {}).get("document_type"),
+                "overall_status": results["overall_status"],
+                "confidence_score": results["confidence_score"],
+                "matches": len(results["matches"]),
+                "mismatches": len(results["mismatches"])
+            })
+        
+        # Every field check counts equally, whichever document it came from
+        total_checks = len(aggregate["matches"]) + len(aggregate["mismatches"])
+        if total_checks > 0:
+            aggregate["confidence_score"] = len(aggregate["matches"]) / total_checks
+        else:
+            aggregate["confidence_score"] = 0.5
+            if not aggregate["warnings"]:
+                aggregate["warnings"].append("No verifiable fields found in documents")
+        
+        return aggregate
+    
     @staticmethod
     def _names_match(name1: str, name2: str) -> bool:
         """Simple name matching logic"""
@@ -269,12 +337,16 @@ class DocumentVerificationService:
         
         summary = f"Verification Status: {status.upper()}\n"
         summary += f"Confidence Score: {confidence:.1%}\n"
-        summary += f"Matches: {matches} | Mismatches: {mismatches}\n\n"
+        summary += f"Matches: {matches} | Mismatches: {mismatches}\n"
+        if "documents" in verification_results:
+            summary += f"Documents Checked: {len(verification_results['documents'])}\n"
+        summary += "\n"
         
         if mismatches > 0:
             summary += "⚠️ Issues Found:\n"
             for mismatch in verification_results["mismatches"]:
-                summary += f"  • {mismatch['field']}: {mismatch['message']}\n"
+                source = f" ({mismatch['document']})" if mismatch.get("document") else ""
+                summary += f"  • {mismatch['field']}{source}: {mismatch['message']}\n"
                 summary += f"    Application: {mismatch['application_value']}\n"
                 summary += f"    Document: {mismatch['document_value']}\n"
         
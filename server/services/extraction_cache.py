@@ -0,0 +1,119 @@
+"""
+Cache of document extraction results.
+
+Verification re-ran ``extract_document_info`` on identical bytes every time an
+application was (re)verified; with real OCR that is seconds of CPU per
+document. Extraction results are now cached so re-verification after an
+analyst edits form data only repeats the cheap ``cross_check_information``.
+
+- Key: SHA-256 of the content + ``DocumentVerificationService.EXTRACTOR_VERSION``
+  + filename and content type (classification depends on the filename).
+  Bumping the extractor version invalidates every entry.
+- Tiers: an in-process LRU (``EXTRACTION_CACHE_SIZE`` entries) in front of
+  the ``extraction_cache`` collection, which every worker shares and which
+  survives restarts.
+- Best effort: database errors are logged and treated as a miss (reads) or
+  skipped (writes), so a cache outage never fails a verification.
+
+Only used from the event loop (verification jobs), so the LRU has no lock.
+"""
+
+import copy
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from config.async_db import extraction_cache_collection
+from services.document_verification import DocumentVerificationService
+
+# In-process entries (0 disables the front tier)
+EXTRACTION_CACHE_SIZE = int(os.getenv("EXTRACTION_CACHE_SIZE", "1024"))
+
+
+def extraction_cache_key(sha256: str, filename: str, content_type: str, version: Optional[str] = None) -> str:
+    """``<content sha256>:<extractor version>:<digest of filename and type>``"""
+    version = version or DocumentVerificationService.EXTRACTOR_VERSION
+    naming = hashlib.sha256(f"{filename or ''}\n{content_type or ''}".encode("utf-8")).hexdigest()[:16]
+    return f"{sha256}:{version}:{naming}"
+
+
+class ExtractionCache:
+    """LRU front tier over the ``extraction_cache`` collection"""
+
+    def __init__(self, max_size: int = EXTRACTION_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stored": 0, "errors": 0}
+
+    def _remember(self, key: str, extracted_info: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = extracted_info
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, sha256: str, filename: str, content_type: str) -> Optional[Dict[str, Any]]:
+        """Cached extraction for this content, or None"""
+        key = extraction_cache_key(sha256, filename, content_type)
+        extracted_info = self._entries.get(key)
+        if extracted_info is not None:
+            self._entries.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return copy.deepcopy(extracted_info)
+        try:
+            entry = await extraction_cache_collection.find_one({"key": key}, {"_id": 0, "extracted_info": 1})
+        except Exception as e:
+            # Treat an unreachable shared tier as a miss
+            self.stats["errors"] += 1
+            print(f"⚠️ Extraction cache read failed for {sha256[:12]}: {e}")
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["db_hits"] += 1
+        self._remember(key, entry["extracted_info"])
+        return copy.deepcopy(entry["extracted_info"])
+
+    async def put(self, sha256: str, filename: str, content_type: str, extracted_info: Dict[str, Any]) -> None:
+        """Store a successful extraction in both tiers"""
+        if extracted_info.get("error"):
+            # Failed extractions are retried next time
+            return
+        key = extraction_cache_key(sha256, filename, content_type)
+        self._remember(key, copy.deepcopy(extracted_info))
+        try:
+            await extraction_cache_collection.update_one(
+                {"key": key},
+                {"$setOnInsert": {
+                    "sha256": sha256,
+                    "extractor_version": DocumentVerificationService.EXTRACTOR_VERSION,
+                    "filename": filename,
+                    "content_type": content_type,
+                    "extracted_info": extracted_info,
+                    "created_at": datetime.now(),
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Another worker stored the same extraction first
+            return
+        except Exception as e:
+            # Best effort: the caller already has its result
+            self.stats["errors"] += 1
+            print(f"⚠️ Extraction cache write failed for {sha256[:12]}: {e}")
+            return
+        self.stats["stored"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,119 @@
+"""
+Audit integrity checks.
+
+"Applications without an audit trail" used to be computed by loading the
+newest 500 applications and issuing one ``find_one`` per application. It is
+now a set difference over the whole collection:
+
+    all application ids  -  distinct(audit_events.application_id)
+
+Both sides are served by indexes (``id`` and ``application_id_1_created_at_1``).
+The result is cached per process and refreshed incrementally using a
+high-water mark on ``applications.created_at`` plus the collection count:
+
+- nothing new (same high-water mark and count): cached result, 2 cheap reads
+- new applications: only ids at/after the mark are fetched; the count must
+  then add up, otherwise (deletes, back-dated inserts) a full recompute runs
+- applications currently without a trail are re-checked with one indexed
+  ``distinct`` limited to those ids, so a late audit write clears them
+
+Audit events missing required fields are tracked separately by the background
+compliance scanner (services/compliance_scanner.py).
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from config.async_db import applications_collection, audit_events_collection
+
+
+class IntegrityChecker:
+    """Process-wide cached integrity report"""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._app_ids: Set[str] = set()
+        self._missing: Set[str] = set()
+        self._app_count: Optional[int] = None
+        self._app_hwm: Any = None
+        self.checked_at: Optional[datetime] = None
+        self.stats = {"full_scans": 0, "incremental_refreshes": 0, "cache_hits": 0}
+
+    @staticmethod
+    async def _high_water_mark(collection) -> Any:
+        latest = await collection.find_one(
+            {"created_at": {"$ne": None}}, {"_id": 0, "created_at": 1}, sort=[("created_at", -1)]
+        )
+        return latest.get("created_at") if latest else None
+
+    @staticmethod
+    async def _ids_with_trail(app_ids: Optional[Set[str]] = None) -> Set[str]:
+        query: Dict[str, Any] = {"application_id": {"$ne": None}}
+        if app_ids is not None:
+            query = {"application_id": {"$in": list(app_ids)}}
+        return set(await audit_events_collection.distinct("application_id", query))
+
+    async def _full_scan(self, app_count: int, app_hwm: Any) -> None:
+        app_ids, with_trail = await asyncio.gather(
+            applications_collection.distinct("id", {"id": {"$ne": None}}),
+            self._ids_with_trail(),
+        )
+        self._app_ids = set(app_ids)
+        self._missing = self._app_ids - with_trail
+        self._app_count = app_count
+        self._app_hwm = app_hwm
+        self.stats["full_scans"] += 1
+
+    async def _refresh_trails(self, app_count: int, app_hwm: Any) -> None:
+        if self._app_count is None or app_count < self._app_count or self._app_hwm is None:
+            await self._full_scan(app_count, app_hwm)
+            return
+
+        if app_count != self._app_count or app_hwm != self._app_hwm:
+            # $gte: applications sharing the previous mark may have arrived since
+            new_ids = set(await applications_collection.distinct(
+                "id", {"created_at": {"$gte": self._app_hwm}}
+            )) - self._app_ids
+            if len(self._app_ids) + len(new_ids) != app_count:
+                # Something was deleted or inserted behind the mark
+                await self._full_scan(app_count, app_hwm)
+                return
+            self._app_ids |= new_ids
+            self._missing |= new_ids
+            self._app_count = app_count
+            self._app_hwm = app_hwm
+            self.stats["incremental_refreshes"] += 1
+        else:
+            self.stats["cache_hits"] += 1
+
+        if self._missing:
+            # Trails written since the last check (e.g. buffered audit events)
+            self._missing -= await self._ids_with_trail(self._missing)
+
+    async def check(self) -> Dict[str, Any]:
+        """Bring the cached report up to date and return it"""
+        async with self._lock:
+            app_count, app_hwm = await asyncio.gather(
+                applications_collection.estimated_document_count(),
+                self._high_water_mark(applications_collection),
+            )
+            await self._refresh_trails(app_count, app_hwm)
+            self.checked_at = datetime.now()
+            return {
+                "applications_checked": len(self._app_ids),
+                "applications_missing_audit_trail": sorted(self._missing),
+                "high_water_mark": self._app_hwm,
+                "checked_at": self.checked_at,
+            }
+
+
+integrity_checker = IntegrityChecker()
+
+
+def report_issues(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Issue records for applications without an audit trail"""
+    return [
+        {"type": "missing_audit_trail", "application_id": app_id}
+        for app_id in report["applications_missing_audit_trail"]
+    ]
@@ -0,0 +1,345 @@
+"""
+Persistent background jobs.
+
+Slow work (document verification first) used to run inside the HTTP request.
+Handlers now enqueue a job and return its id; an in-process runner executes
+it and clients poll ``GET /jobs/{job_id}`` for the status and result.
+
+Jobs live in the ``jobs`` collection, so they survive restarts and every API
+worker shares the queue:
+
+    {"id": "JOB-1A2B3C4D", "type": "verify_document", "payload": {...},
+     "status": "queued" | "running" | "succeeded" | "failed",
+     "attempts": 1, "max_attempts": 3, "run_after": ..., "lease_until": ...,
+     "idempotency_key": "...", "created_by": "analyst1",
+     "result": {...}, "error": "...", "created_at": ..., "finished_at": ...}
+
+- Claiming is a single ``find_one_and_update`` from ``queued`` to
+  ``running``, so a job runs on one worker at a time. A running job holds a
+  lease that its worker renews; a job whose worker died is picked up again
+  once the lease expires. Outcomes are written only while the attempt still
+  holds the job (status running, same ``attempts``), so a worker whose lease
+  was taken over cannot overwrite the new attempt; its renewal loop notices
+  and cancels the handler. An expired lease consumes an attempt: once none
+  are left the job fails with "lease expired" instead of being re-claimed.
+- ``JOB_WORKERS`` jobs run concurrently per process. CPU-heavy steps go
+  through ``run_cpu`` to a process pool (``JOB_CPU_WORKERS``) so they never
+  block the event loop.
+- Failures are retried with exponential backoff (``JOB_RETRY_BASE_S`` *
+  2^(attempt-1)) up to ``max_attempts``; ``PermanentJobError`` fails at once.
+- An ``idempotency_key`` maps repeated submissions to the same job while it
+  is queued, running or succeeded; submitting again after it failed starts a
+  new job (the failed one keeps the key as ``retired_idempotency_key``).
+- Long jobs publish ``progress`` (``report_progress``) for pollers.
+"""
+
+import asyncio
+import os
+import random
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config.async_db import jobs_collection
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_CPU_WORKERS = int(os.getenv("JOB_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+# "process" (default) or "thread"; threads suit I/O-bound handlers and tests
+JOB_CPU_POOL = os.getenv("JOB_CPU_POOL", "process").strip().lower()
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_S = float(os.getenv("JOB_RETRY_BASE_S", "2"))
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "120"))
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL_S", "1"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+# max_attempts of the stored job, for $expr filters
+_MAX_ATTEMPTS = {"$ifNull": ["$max_attempts", JOB_MAX_ATTEMPTS]}
+
+JobHandler = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help (e.g. the target is gone)"""
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job record in the shape returned by the API"""
+    return {
+        "job_id": job["id"],
+        "type": job.get("type"),
+        "status": job.get("status"),
+        "attempts": job.get("attempts", 0),
+        "max_attempts": job.get("max_attempts"),
+        "progress": job.get("progress"),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_by": job.get("created_by"),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
+
+
+class JobRunner:
+    """Claims queued jobs from the ``jobs`` collection and runs their handlers"""
+
+    def __init__(self, workers: int = JOB_WORKERS, cpu_workers: int = JOB_CPU_WORKERS,
+                 cpu_pool: str = JOB_CPU_POOL, lease_s: float = JOB_LEASE_S,
+                 poll_interval_s: float = JOB_POLL_INTERVAL_S):
+        self.workers = workers
+        self.cpu_workers = max(1, cpu_workers)
+        self.cpu_pool = cpu_pool
+        self.lease_s = lease_s
+        self.poll_interval_s = poll_interval_s
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: list = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._executor: Optional[Executor] = None
+        self.stats = {"succeeded": 0, "failed": 0, "retried": 0}
+
+    # ---- registration / submission ----
+
+    def register(self, job_type: str, handler: JobHandler) -> None:
+        self._handlers[job_type] = handler
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], created_by: Optional[str] = None,
+                      idempotency_key: Optional[str] = None,
+                      max_attempts: int = JOB_MAX_ATTEMPTS) -> Dict[str, Any]:
+        """Insert a queued job, or return the live or succeeded job for ``idempotency_key``"""
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        if idempotency_key:
+            existing = await jobs_collection.find_one({"idempotency_key": idempotency_key}, {"_id": 0})
+            if existing and existing.get("status") != FAILED:
+                return existing
+            if existing:
+                # A failed job must not absorb retries; release its key so a fresh job can take it
+                await jobs_collection.update_one(
+                    {"id": existing["id"], "status": FAILED, "idempotency_key": idempotency_key},
+                    {"$set": {"retired_idempotency_key": idempotency_key},
+                     "$unset": {"idempotency_key": ""}},
+                )
+        now = datetime.now()
+        job = {
+            "id": f"JOB-{str(uuid.uuid4())[:8].upper()}",
+            "type": job_type,
+            "payload": payload,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": max(1, max_attempts),
+            "run_after": now,
+            "created_by": created_by,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if idempotency_key:
+            job["idempotency_key"] = idempotency_key
+        try:
+            await jobs_collection.insert_one(job)
+        except DuplicateKeyError:
+            # Lost a race with an identical submission
+            return await jobs_collection.find_one({"idempotency_key": idempotency_key}, {"_id": 0})
+        job.pop("_id", None)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await jobs_collection.find_one({"id": job_id}, {"_id": 0})
+
+    async def report_progress(self, job: Dict[str, Any], progress: Dict[str, Any]) -> None:
+        """Publish a claimed job's progress for pollers (also renews its lease)"""
+        now = datetime.now()
+        # Fenced: a worker that lost the job must not touch the new attempt
+        await jobs_collection.update_one(
+            self._fence(job),
+            {"$set": {"progress": progress, "updated_at": now,
+                      "lease_until": now + timedelta(seconds=self.lease_s)}},
+        )
+
+    # ---- CPU pool ----
+
+    async def run_cpu(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a picklable module-level function in the CPU pool"""
+        if self._executor is None:
+            if self.cpu_pool == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix="jobs-cpu")
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # ---- execution ----
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now()
+        claim = {
+            "$set": {"status": RUNNING, "lease_until": now + timedelta(seconds=self.lease_s),
+                     "started_at": now, "updated_at": now},
+            "$inc": {"attempts": 1},
+        }
+        job = await jobs_collection.find_one_and_update(
+            {"status": QUEUED, "run_after": {"$lte": now}}, claim,
+            sort=[("run_after", 1)], return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            # A worker that died mid-job stops renewing its lease; the attempt it
+            # burned counts, so a job that keeps killing workers eventually fails
+            await self._fail_exhausted_leases(now)
+            job = await jobs_collection.find_one_and_update(
+                {"status": RUNNING, "lease_until": {"$lt": now}, "$expr": {"$lt": ["$attempts", _MAX_ATTEMPTS]}},
+                claim, sort=[("lease_until", 1)], return_document=ReturnDocument.AFTER,
+            )
+        return job
+
+    async def _fail_exhausted_leases(self, now: datetime) -> None:
+        """Fail expired running jobs that have no attempts left"""
+        outcome = await jobs_collection.update_many(
+            {"status": RUNNING, "lease_until": {"$lt": now}, "$expr": {"$gte": ["$attempts", _MAX_ATTEMPTS]}},
+            {"$set": {"status": FAILED, "error": "lease expired", "finished_at": now, "updated_at": now},
+             "$unset": {"lease_until": ""}},
+        )
+        if outcome.modified_count:
+            self.stats["failed"] += outcome.modified_count
+            print(f"❌ {outcome.modified_count} job(s) failed: lease expired with no attempts left")
+
+    @staticmethod
+    def _fence(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Matches the job only while this claim (attempt) still holds it"""
+        return {"id": job["id"], "status": RUNNING, "attempts": job.get("attempts", 0)}
+
+    @staticmethod
+    def _lost_lease(job: Dict[str, Any]) -> None:
+        print(f"⚠️ Job {job['id']} ({job['type']}) attempt {job.get('attempts')} lost its lease; "
+              "outcome discarded")
+
+    async def _renew_lease(self, job: Dict[str, Any], work: "asyncio.Future") -> None:
+        """Keep the claim alive; cancels ``work`` once the claim is lost"""
+        while True:
+            await asyncio.sleep(self.lease_s / 3)
+            try:
+                outcome = await jobs_collection.update_one(
+                    self._fence(job),
+                    {"$set": {"lease_until": datetime.now() + timedelta(seconds=self.lease_s)}},
+                )
+            except Exception as e:
+                # Transient: the lease outlives a few missed renewals
+                print(f"⚠️ Job {job['id']} ({job['type']}): lease renewal failed: {e}")
+                continue
+            if outcome.matched_count == 0:
+                # Another worker reclaimed the job (or it was failed): stop duplicate work
+                work.cancel()
+                return
+
+    async def run_job(self, job: Dict[str, Any]) -> None:
+        """Execute a claimed job and record its outcome (never raises)"""
+        handler = self._handlers.get(job["type"])
+        work: Optional[asyncio.Future] = None
+        lease: Optional[asyncio.Task] = None
+        try:
+            if handler is None:
+                raise PermanentJobError(f"No handler for job type {job['type']}")
+            work = asyncio.ensure_future(handler(job.get("payload") or {}, job))
+            lease = asyncio.create_task(self._renew_lease(job, work))
+            try:
+                result = await work
+            except asyncio.CancelledError:
+                if lease.done() and not lease.cancelled():
+                    # _renew_lease found the claim gone and cancelled the handler
+                    self._lost_lease(job)
+                    return
+                raise
+            now = datetime.now()
+            # A result that cannot be stored fails the attempt like a handler error
+            outcome = await jobs_collection.update_one(
+                self._fence(job),
+                {"$set": {"status": SUCCEEDED, "result": result, "error": None,
+                          "finished_at": now, "updated_at": now},
+                 "$unset": {"lease_until": ""}},
+            )
+        except Exception as e:
+            try:
+                await self._record_failure(job, e)
+            except Exception as record_error:
+                # The job stays running and is re-claimed once its lease expires
+                print(f"❌ Job {job['id']} ({job['type']}): could not record failure: {record_error}")
+            return
+        finally:
+            if lease is not None:
+                lease.cancel()
+        if outcome.matched_count == 0:
+            self._lost_lease(job)
+            return
+        self.stats["succeeded"] += 1
+
+    async def _record_failure(self, job: Dict[str, Any], error: Exception) -> None:
+        now = datetime.now()
+        attempts = job.get("attempts", 1)
+        message = str(error) or error.__class__.__name__
+        if isinstance(error, PermanentJobError) or attempts >= job.get("max_attempts", JOB_MAX_ATTEMPTS):
+            outcome = await jobs_collection.update_one(
+                self._fence(job),
+                {"$set": {"status": FAILED, "error": message, "finished_at": now, "updated_at": now},
+                 "$unset": {"lease_until": ""}},
+            )
+            if outcome.matched_count == 0:
+                self._lost_lease(job)
+                return
+            self.stats["failed"] += 1
+            print(f"❌ Job {job['id']} ({job['type']}) failed: {message}")
+            return
+        # Exponential backoff with jitter
+        delay = JOB_RETRY_BASE_S * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+        outcome = await jobs_collection.update_one(
+            self._fence(job),
+            {"$set": {"status": QUEUED, "error": message, "run_after": now + timedelta(seconds=delay),
+                      "updated_at": now},
+             "$unset": {"lease_until": ""}},
+        )
+        if outcome.matched_count == 0:
+            self._lost_lease(job)
+            return
+        self.stats["retried"] += 1
+        print(f"🔄 Job {job['id']} ({job['type']}) attempt {attempts} failed, retrying in {delay:.1f}s: {message}")
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                print(f"❌ Job claim failed: {e}")
+                job = None
+            if job is not None:
+                await self.run_job(job)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_s)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self.workers <= 0 or self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._wakeup = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+job_runner = JobRunner()
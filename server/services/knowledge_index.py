@@ -0,0 +1,317 @@
+"""
+Local vector index for admin-uploaded knowledge documents.
+
+Uploads through ``/admin/upload-documents`` and ``/docs/upload_docs`` used to
+be saved to ``uploaded_docs/`` and never searched. They are now chunked,
+embedded on the CPU and stored in an on-disk index that support chat queries
+with role filtering. No external vector database or model download is needed:
+
+- Embedding: signed feature hashing of word unigrams and bigrams into
+  ``KNOWLEDGE_INDEX_DIM`` buckets, sublinear term frequency, L2-normalized.
+  Queries are weighted by an IDF computed from per-bucket document counts, so
+  the score is an IDF-weighted cosine similarity.
+- Storage (``KNOWLEDGE_INDEX_DIR``): ``vectors.f32`` (float32, rows x dim) and
+  ``roles.u8`` (role code per row, 0 = deleted) are memory-mapped and grow by
+  doubling; ``chunks.jsonl`` holds chunk text and document ids; ``df.i32``
+  holds bucket document counts; ``header.json`` records the committed row
+  count and is replaced atomically last, so a crash mid-append is ignored.
+- Access: a chunk uploaded for role R is returned to users with role R;
+  ``general`` chunks go to everyone and admins see everything.
+- Other workers' uploads are picked up by checking ``header.json`` at most
+  every ``KNOWLEDGE_INDEX_CHECK_S`` seconds.
+- Several uvicorn workers may write: mutations hold an exclusive
+  ``fcntl.flock`` on ``.lock`` in the index directory and reload the
+  committed state before appending; reloads hold a shared lock. Without
+  fcntl (Windows) the index is single-process only.
+
+Top-k over tens of thousands of chunks is one matrix-vector product.
+"""
+
+import io
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+KNOWLEDGE_INDEX_DIR = Path(os.getenv(
+    "KNOWLEDGE_INDEX_DIR", str(Path(__file__).resolve().parents[1] / "knowledge_index")
+))
+KNOWLEDGE_INDEX_DIM = int(os.getenv("KNOWLEDGE_INDEX_DIM", "1024"))
+KNOWLEDGE_INDEX_CHECK_S = float(os.getenv("KNOWLEDGE_INDEX_CHECK_S", "5"))
+CHUNK_CHARS = int(os.getenv("KNOWLEDGE_CHUNK_CHARS", "800"))
+CHUNK_OVERLAP = 100
+MIN_SCORE = 0.05
+
+ROLE_CODES = {"general": 1, "customer": 2, "analyst": 3, "underwriter": 4, "admin": 5, "auditor": 6}
+DELETED = 0
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+TEXT_EXTENSIONS = {".txt", ".md", ".csv", ".json", ".log", ".html", ".htm", ".xml", ".yaml", ".yml"}
+
+
+def extract_text(filename: str, content: bytes) -> str:
+    """Best-effort plain text of an uploaded file ("" if unsupported)"""
+    suffix = Path(filename or "").suffix.lower()
+    if suffix == ".pdf":
+        try:
+            from pypdf import PdfReader  # optional dependency
+        except ImportError:
+            print(f"Warning: pypdf not installed, {filename} not indexed")
+            return ""
+        try:
+            reader = PdfReader(io.BytesIO(content))
+            return "\n\n".join((page.extract_text() or "") for page in reader.pages)
+        except Exception as e:
+            print(f"Warning: could not read PDF {filename}: {e}")
+            return ""
+    if suffix in TEXT_EXTENSIONS or b"\x00" not in content[:4096]:
+        return content.decode("utf-8", errors="ignore")
+    return ""
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Split text into ~size-character chunks, preferring paragraph breaks"""
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text or "") if p.strip()]
+    chunks: List[str] = []
+    current = ""
+    for para in paragraphs:
+        while len(para) > size:
+            # Hard-split long paragraphs at a word boundary
+            cut = para.rfind(" ", 0, size)
+            cut = cut if cut > size // 2 else size
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(para[:cut].strip())
+            para = para[max(0, cut - overlap):].strip()
+        if current and len(current) + len(para) + 2 > size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{para}" if current else para
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _features(text: str) -> List[str]:
+    tokens = [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) > 1]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def embed(text: str, dim: int = KNOWLEDGE_INDEX_DIM) -> np.ndarray:
+    """Signed hashed bag of unigrams+bigrams, sublinear tf, L2-normalized"""
+    counts: Dict[int, float] = {}
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode("utf-8"))
+        bucket = h % dim
+        counts[bucket] = counts.get(bucket, 0.0) + (1.0 if (h >> 31) & 1 else -1.0)
+    vec = np.zeros(dim, dtype=np.float32)
+    for bucket, value in counts.items():
+        vec[bucket] = np.sign(value) * (1.0 + np.log(abs(value))) if value else 0.0
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class KnowledgeIndex:
+    """Append-only memory-mapped chunk index with role tags and tombstones"""
+
+    def __init__(self, directory: Path = KNOWLEDGE_INDEX_DIR, dim: int = KNOWLEDGE_INDEX_DIM,
+                 check_interval_s: float = KNOWLEDGE_INDEX_CHECK_S):
+        self.directory = Path(directory)
+        self.dim = dim
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._count = 0
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._roles: Optional[np.memmap] = None
+        self._df = np.zeros(dim, dtype=np.int32)
+        self._chunks: List[Dict[str, str]] = []
+        self._chunks_bytes = 0
+        self._header_mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._loaded = False
+
+    # ---- storage ----
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """Cross-process lock on the index directory (held with ``self._lock``)"""
+        if fcntl is None:
+            yield
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self._path(".lock"), "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _map(self, capacity: int) -> None:
+        """(Re)map the vector and role files with room for ``capacity`` rows"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name, row_bytes in (("vectors.f32", self.dim * 4), ("roles.u8", 1)):
+            path = self._path(name)
+            with open(path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self._capacity = capacity
+        if capacity:
+            self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+",
+                                      shape=(capacity, self.dim))
+            self._roles = np.memmap(self._path("roles.u8"), dtype=np.uint8, mode="r+", shape=(capacity,))
+
+    def _load(self) -> None:
+        header_path = self._path("header.json")
+        try:
+            header = json.loads(header_path.read_text())
+            self._header_mtime = header_path.stat().st_mtime
+        except (OSError, ValueError):
+            header = {"dim": self.dim, "count": 0, "capacity": 0, "chunks_bytes": 0}
+            self._header_mtime = None
+        if header.get("dim", self.dim) != self.dim:
+            raise ValueError(f"Knowledge index dimension {header['dim']} != KNOWLEDGE_INDEX_DIM {self.dim}")
+        self._count = int(header.get("count", 0))
+        self._map(max(int(header.get("capacity", 0)), self._count))
+        try:
+            self._df = np.fromfile(self._path("df.i32"), dtype=np.int32)
+        except OSError:
+            self._df = np.zeros(self.dim, dtype=np.int32)
+        if self._df.shape != (self.dim,):
+            self._df = np.zeros(self.dim, dtype=np.int32)
+        # Only the committed prefix counts; anything after it is a torn append
+        self._chunks_bytes = int(header.get("chunks_bytes", 0))
+        try:
+            with open(self._path("chunks.jsonl"), "rb") as f:
+                data = f.read(self._chunks_bytes)
+            self._chunks = [json.loads(line) for line in data.splitlines() if line.strip()]
+        except OSError:
+            self._chunks = []
+        self._count = min(self._count, len(self._chunks))
+        self._loaded = True
+        self._checked_at = time.monotonic()
+
+    def _commit(self) -> None:
+        self._vectors.flush()
+        self._roles.flush()
+        self._df.tofile(self._path("df.i32"))
+        header_path = self._path("header.json")
+        tmp = header_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"dim": self.dim, "count": self._count, "capacity": self._capacity,
+                                   "chunks_bytes": self._chunks_bytes}))
+        os.replace(tmp, header_path)
+        self._header_mtime = header_path.stat().st_mtime
+
+    def _ensure_loaded(self) -> None:
+        stale = time.monotonic() - self._checked_at >= self.check_interval_s
+        if self._loaded and not stale:
+            return
+        if self._loaded:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = self._path("header.json").stat().st_mtime
+            except OSError:
+                mtime = None
+            if mtime == self._header_mtime:
+                return
+        with self._file_lock(exclusive=False):
+            self._load()
+
+    # ---- mutations ----
+
+    def add_document(self, doc_id: str, filename: str, role: str, text: str) -> int:
+        """Chunk, embed and append a document; returns the number of chunks"""
+        chunks = chunk_text(text)
+        if not chunks:
+            return 0
+        code = ROLE_CODES.get(role, ROLE_CODES["general"])
+        vectors = np.vstack([embed(c, self.dim) for c in chunks])
+        with self._lock, self._file_lock(exclusive=True):
+            # Another worker may have appended since our last load
+            self._load()
+            start, end = self._count, self._count + len(chunks)
+            if end > self._capacity:
+                self._map(max(end, self._capacity * 2, 256))
+            self._vectors[start:end] = vectors
+            self._roles[start:end] = code
+            self._df += (vectors != 0).sum(axis=0).astype(np.int32)
+            records = [{"doc_id": doc_id, "filename": filename, "text": c} for c in chunks]
+            payload = "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+            with open(self._path("chunks.jsonl"), "ab") as f:
+                # Drop uncommitted bytes left by an interrupted append
+                f.truncate(self._chunks_bytes)
+                f.write(payload)
+            self._chunks.extend(records)
+            self._chunks_bytes += len(payload)
+            self._count = end
+            self._commit()
+        return len(chunks)
+
+    def delete_document(self, doc_id: str) -> int:
+        """Tombstone every chunk of a document; returns how many were removed"""
+        with self._lock, self._file_lock(exclusive=True):
+            self._load()
+            rows = [i for i, c in enumerate(self._chunks[:self._count]) if c["doc_id"] == doc_id]
+            for i in rows:
+                if self._roles[i] != DELETED:
+                    self._df -= (np.asarray(self._vectors[i]) != 0).astype(np.int32)
+                    self._roles[i] = DELETED
+            if rows:
+                self._commit()
+            return len(rows)
+
+    # ---- queries ----
+
+    def search(self, query: str, role: str, k: int = 3) -> List[Tuple[float, str]]:
+        """Top-k (score, snippet) chunks visible to ``role``"""
+        q = embed(query, self.dim)
+        if not q.any():
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            n = self._count
+            if not n:
+                return []
+            live = int((np.asarray(self._roles[:n]) != DELETED).sum())
+            idf = np.log((1 + live) / (1 + self._df.astype(np.float32))) + 1.0
+            scores = np.asarray(self._vectors[:n]) @ (q * idf)
+            roles = np.asarray(self._roles[:n])
+            if role == "admin":
+                visible = roles != DELETED
+            else:
+                allowed = [ROLE_CODES["general"]] + ([ROLE_CODES[role]] if role in ROLE_CODES else [])
+                visible = np.isin(roles, allowed)
+            scores = np.where(visible, scores, -np.inf)
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for i in top:
+                if not np.isfinite(scores[i]) or scores[i] < MIN_SCORE:
+                    continue
+                chunk = self._chunks[i]
+                results.append((float(scores[i]), f"From uploaded {chunk['filename']}:\n{chunk['text']}"))
+            return results
+
+    @property
+    def size(self) -> int:
+        return self._count
+
+
+knowledge_index = KnowledgeIndex()
@@ -0,0 +1,374 @@
+"""
+LLM gateway for support chat.
+
+``support_chat`` used to reload ``server/.env`` and build a new ``Groq``
+client for every message, with no timeout, no limit on concurrent calls and
+no reuse of answers. All LLM traffic now goes through ``llm_gateway``:
+
+- One pooled async client per configuration (``AsyncGroq`` keeps its HTTP
+  connection pool); a watcher task polls ``server/.env`` every
+  ``LLM_CONFIG_POLL_S`` seconds and swaps the client only when the key,
+  model or backend actually changed.
+- At most ``LLM_MAX_CONCURRENCY`` calls are in flight; waiting for a slot and
+  the call itself share one ``LLM_TIMEOUT_S`` deadline.
+- Answers are cached for ``LLM_CACHE_TTL_S`` keyed by normalized message,
+  role, model and a hash of the retrieved context; identical requests that
+  arrive while one is in flight share its result.
+- ``stream()`` yields the answer as it is generated (SSE support chat); it
+  shares the cap, deadline (applied per chunk) and cache, but streams are not
+  coalesced since each caller needs its own token feed.
+- ``LLM_BACKEND=fake`` answers locally after ``LLM_FAKE_LATENCY_MS`` so the
+  gateway can be benchmarked offline (see benchmark_llm_gateway.py).
+
+``complete()`` returns None when the LLM is disabled, times out or fails;
+callers fall back to rule-based replies.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+ENV_PATH = Path(__file__).resolve().parents[1] / ".env"
+DEFAULT_MODEL = "llama-3.1-70b-versatile"
+
+
+class LLMConfig:
+    """Snapshot of the LLM settings read from the environment"""
+
+    def __init__(self):
+        self.api_key = os.getenv("GROQ_API_KEY") or ""
+        self.model = os.getenv("GROQ_MODEL", DEFAULT_MODEL)
+        self.backend = os.getenv("LLM_BACKEND", "groq").strip().lower()
+        self.timeout_s = float(os.getenv("LLM_TIMEOUT_S", "10"))
+        self.max_concurrency = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+        self.cache_ttl_s = float(os.getenv("LLM_CACHE_TTL_S", "300"))
+        self.cache_size = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+        self.fake_latency_ms = float(os.getenv("LLM_FAKE_LATENCY_MS", "300"))
+        self.temperature = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+        self.max_tokens = int(os.getenv("LLM_MAX_TOKENS", "256"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend == "fake" or bool(self.api_key)
+
+    def client_key(self) -> Tuple[str, str, str]:
+        return (self.backend, self.api_key, self.model)
+
+
+class GroqBackend:
+    """Pooled AsyncGroq client"""
+
+    def __init__(self, config: LLMConfig):
+        from groq import AsyncGroq  # type: ignore
+        self.model = config.model
+        self.temperature = config.temperature
+        self.max_tokens = config.max_tokens
+        # Retries would outlive the gateway deadline; fail fast and fall back
+        self.client = AsyncGroq(api_key=config.api_key, timeout=config.timeout_s, max_retries=0)
+
+    async def complete(self, system_prompt: str, message: str) -> str:
+        resp = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message},
+            ],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+        )
+        return (resp.choices[0].message.content or "").strip()
+
+    async def stream(self, system_prompt: str, message: str) -> AsyncIterator[str]:
+        resp = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message},
+            ],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True,
+        )
+        try:
+            async for chunk in resp:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await resp.close()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class FakeBackend:
+    """Offline stand-in with a fixed latency, for benchmarks and local runs"""
+
+    def __init__(self, config: LLMConfig):
+        self.model = "fake"
+        self.latency_s = config.fake_latency_ms / 1000.0
+        self.calls = 0
+
+    async def complete(self, system_prompt: str, message: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency_s)
+        return f"(fake) You asked: {message.strip()[:200]}"
+
+    async def stream(self, system_prompt: str, message: str) -> AsyncIterator[str]:
+        self.calls += 1
+        words = f"(fake) You asked: {message.strip()[:200]}".split(" ")
+        # First token after a tenth of the latency, the rest spread over the remainder
+        await asyncio.sleep(self.latency_s / 10)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.latency_s * 0.9 / max(1, len(words) - 1))
+            yield word if i == 0 else " " + word
+
+    async def close(self) -> None:
+        pass
+
+
+def normalize_message(message: str) -> str:
+    return re.sub(r"\s+", " ", (message or "").strip().lower())
+
+
+class LLMGateway:
+    """Shared client, concurrency cap, response cache and in-flight coalescing"""
+
+    def __init__(self, env_path: Path = ENV_PATH):
+        self.env_path = env_path
+        self.config: Optional[LLMConfig] = None
+        self._env_mtime: Optional[float] = None
+        self._backend: Any = None
+        self._backend_key: Optional[Tuple[str, str, str]] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_size = 0
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        self.stats = {"calls": 0, "cache_hits": 0, "coalesced": 0, "timeouts": 0, "errors": 0, "reloads": 0}
+
+    # ---- configuration ----
+
+    def reload_config(self, force: bool = False) -> LLMConfig:
+        """Re-read server/.env if it changed since the last load"""
+        try:
+            mtime = self.env_path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if self.config is None or force or mtime != self._env_mtime:
+            if mtime is not None:
+                load_dotenv(dotenv_path=self.env_path, override=True)
+            self._env_mtime = mtime
+            self.config = LLMConfig()
+            self.stats["reloads"] += 1
+        return self.config
+
+    def get_config(self) -> LLMConfig:
+        return self.config or self.reload_config()
+
+    async def _get_backend(self, config: LLMConfig):
+        if self._backend_key != config.client_key():
+            old = self._backend
+            self._backend = FakeBackend(config) if config.backend == "fake" else GroqBackend(config)
+            self._backend_key = config.client_key()
+            self._cache.clear()
+            if old is not None:
+                try:
+                    await old.close()
+                except Exception as e:
+                    print(f"Warning: failed to close LLM client: {e}")
+        if self._semaphore is None or self._semaphore_size != config.max_concurrency:
+            self._semaphore = asyncio.Semaphore(config.max_concurrency)
+            self._semaphore_size = config.max_concurrency
+        return self._backend
+
+    # ---- completion ----
+
+    @staticmethod
+    def cache_key(message: str, role: str, model: str, context: str) -> str:
+        context_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+        raw = "\x1f".join([normalize_message(message), role or "", model, context_hash])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str, ttl_s: float) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        answer, stored_at = entry
+        if time.monotonic() - stored_at > ttl_s:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return answer
+
+    def _cache_put(self, key: str, answer: str, max_size: int) -> None:
+        if max_size <= 0:
+            return
+        self._cache[key] = (answer, time.monotonic())
+        self._cache.move_to_end(key)
+        while len(self._cache) > max_size:
+            self._cache.popitem(last=False)
+
+    async def _call(self, backend, config: LLMConfig, system_prompt: str, message: str) -> Optional[str]:
+        deadline = config.timeout_s
+
+        async def bounded() -> str:
+            async with self._semaphore:
+                self.stats["calls"] += 1
+                return await backend.complete(system_prompt, message)
+
+        try:
+            return await asyncio.wait_for(bounded(), timeout=deadline) or None
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            print(f"⏱️ LLM call exceeded {deadline:.1f}s deadline")
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"❌ LLM call failed: {e}")
+        return None
+
+    async def complete(self, message: str, role: str, system_prompt: str, context: str = "") -> Optional[str]:
+        """Answer a support message, or None to use the rule-based fallback"""
+        config = self.get_config()
+        if not config.enabled:
+            return None
+        try:
+            backend = await self._get_backend(config)
+        except Exception as e:
+            print(f"❌ LLM backend unavailable: {e}")
+            return None
+
+        key = self.cache_key(message, role, backend.model, context)
+        cached = self._cache_get(key, config.cache_ttl_s)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            answer = await self._call(backend, config, system_prompt, message.strip())
+            if answer:
+                self._cache_put(key, answer, config.cache_size)
+            future.set_result(answer)
+            return answer
+        except BaseException:
+            # Cancelled caller: followers fall back instead of waiting forever
+            future.set_result(None)
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def stream(self, message: str, role: str, system_prompt: str, context: str = "",
+                     outcome: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Yield answer chunks as they arrive; yields nothing if the LLM is unavailable.
+
+        A failure after the first chunk ends the stream early; the partial
+        answer is not cached. ``outcome``, if given, receives ``complete``
+        (the answer finished normally) and ``error`` (why it did not).
+        """
+        outcome = outcome if outcome is not None else {}
+        outcome.update(complete=False, error=None)
+        config = self.get_config()
+        if not config.enabled:
+            return
+        try:
+            backend = await self._get_backend(config)
+        except Exception as e:
+            print(f"❌ LLM backend unavailable: {e}")
+            return
+
+        key = self.cache_key(message, role, backend.model, context)
+        cached = self._cache_get(key, config.cache_ttl_s)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            outcome["complete"] = True
+            yield cached
+            return
+
+        semaphore = self._semaphore
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=config.timeout_s)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            print(f"⏱️ No LLM slot within {config.timeout_s:.1f}s")
+            return
+
+        parts: List[str] = []
+        chunks = backend.stream(system_prompt, message.strip())
+        complete = False
+        try:
+            self.stats["calls"] += 1
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=config.timeout_s)
+                except StopAsyncIteration:
+                    complete = True
+                    break
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            outcome["error"] = "timeout"
+            print(f"⏱️ LLM stream stalled for {config.timeout_s:.1f}s")
+        except Exception as e:
+            self.stats["errors"] += 1
+            outcome["error"] = str(e) or e.__class__.__name__
+            print(f"❌ LLM stream failed: {e}")
+        finally:
+            semaphore.release()
+            try:
+                await chunks.aclose()
+            except Exception:
+                pass
+        outcome["complete"] = complete
+        answer = "".join(parts).strip()
+        if complete and answer:
+            # Interrupted streams are never cached as if they were whole answers
+            self._cache_put(key, answer, config.cache_size)
+
+    # ---- lifecycle ----
+
+    def start(self, poll_s: Optional[float] = None) -> None:
+        """Load config and start the .env watcher on the running loop"""
+        self.reload_config(force=True)
+        poll_s = poll_s if poll_s is not None else float(os.getenv("LLM_CONFIG_POLL_S", "2"))
+        if poll_s > 0 and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.create_task(self._watch(poll_s), name="llm-config-watcher")
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        if self._backend is not None:
+            await self._backend.close()
+            self._backend = None
+            self._backend_key = None
+
+    async def _watch(self, poll_s: float) -> None:
+        while True:
+            await asyncio.sleep(poll_s)
+            try:
+                self.reload_config()
+            except Exception as e:
+                print(f"❌ LLM config reload failed: {e}")
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,196 @@
+"""
+In-memory BM25 index over the project's markdown guides for support chat.
+
+``get_context_snippets`` used to re-read and re-split every guide and score
+sections by raw substring counts on each ``/support/chat`` request. The guides
+are now split into sections once, tokenized into an inverted index
+(term -> {section: term frequency}) and ranked with Okapi BM25, which weighs
+rare terms above common ones and normalizes for section length.
+
+- Built at startup by the FastAPI lifespan (``support_index.refresh()``).
+- Requests never touch the disk; at most every ``SUPPORT_INDEX_CHECK_S``
+  seconds a request stats the guide files and re-indexes only the ones whose
+  mtime or size changed (or that appeared/disappeared).
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+SUPPORT_INDEX_CHECK_S = float(os.getenv("SUPPORT_INDEX_CHECK_S", "5"))
+
+# BM25 parameters (standard defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+GUIDE_FILES = [
+    "README.md",
+    "QUICK_START_GUIDE.md",
+    "JWT_AUTHENTICATION_GUIDE.md",
+    "JWT_QUICK_START.md",
+    "AUTHENTICATION_FIX.md",
+    "AUTH_FIX_GUIDE.md",
+    "REVIEW_BUTTON_FIX.md",
+    "REVIEW_BUTTON_DEBUGGING.md",
+    "ANALYST_WORKFLOW_IMPLEMENTATION.md",
+    "ANALYST_REVIEW_WORKFLOW.md",
+    "REALTIME_STATUS_TRACKING.md",
+    "IMPLEMENTATION_SUMMARY.md",
+    "PROJECT_SUMMARY.md",
+    "TROUBLESHOOTING_GUIDE.md",
+    "DOCUMENTATION_INDEX.md",
+    "ADMIN_SETUP.md",
+    "MONGODB_QUICK_REFERENCE.md",
+    "MONGODB_ATLAS_COLLECTIONS.md",
+    "HIGH_VALUE_INSURANCE_IMPLEMENTATION.md",
+    "TEST_REVIEW_BUTTON.md",
+    "TEST_DATA_SAMPLES.md",
+    "WORKFLOW_DIAGRAMS.md",
+]
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens longer than two characters"""
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) > 2]
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Split markdown into (heading, body) pairs"""
+    lines = text.splitlines()
+    sections: List[Tuple[str, str]] = []
+    buf: List[str] = []
+    title = "Intro"
+    for ln in lines:
+        if ln.strip().startswith("#"):
+            if buf:
+                sections.append((title, "\n".join(buf).strip()))
+                buf = []
+            title = ln.strip().lstrip("# ")
+        else:
+            buf.append(ln)
+    if buf:
+        sections.append((title, "\n".join(buf).strip()))
+    return sections
+
+
+class SupportIndex:
+    """Inverted index of guide sections with incremental per-file updates"""
+
+    def __init__(self, root: Path = PROJECT_ROOT, files: Optional[List[str]] = None,
+                 check_interval_s: float = SUPPORT_INDEX_CHECK_S):
+        self.root = root
+        self.files = list(files or GUIDE_FILES)
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_len: Dict[int, int] = {}
+        self._snippets: Dict[int, str] = {}
+        self._doc_terms: Dict[int, List[str]] = {}
+        self._file_docs: Dict[str, List[int]] = {}
+        self._file_sig: Dict[str, Tuple[float, int]] = {}
+        self._total_len = 0
+        self._next_id = 0
+        self._checked_at = 0.0
+        self.stats = {"files_indexed": 0, "refreshes": 0}
+
+    def _remove_file(self, name: str) -> None:
+        for doc_id in self._file_docs.pop(name, []):
+            self._total_len -= self._doc_len.pop(doc_id)
+            self._snippets.pop(doc_id)
+            for term in self._doc_terms.pop(doc_id):
+                docs = self._postings[term]
+                del docs[doc_id]
+                if not docs:
+                    del self._postings[term]
+
+    def _add_file(self, name: str, content: str) -> None:
+        doc_ids = []
+        for title, body in split_sections(content):
+            counts = Counter(tokenize(title) + tokenize(body))
+            if not counts:
+                continue
+            doc_id = self._next_id
+            self._next_id += 1
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            length = sum(counts.values())
+            self._doc_len[doc_id] = length
+            self._total_len += length
+            self._snippets[doc_id] = f"From {name} > {title}:\n{body}"
+            self._doc_terms[doc_id] = list(counts)
+            doc_ids.append(doc_id)
+        self._file_docs[name] = doc_ids
+
+    def refresh(self) -> int:
+        """Re-index guides whose mtime/size changed; returns how many files changed"""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        current: Dict[str, Tuple[float, int]] = {}
+        for name in self.files:
+            try:
+                st = (self.root / name).stat()
+            except OSError:
+                continue
+            current[name] = (st.st_mtime, st.st_size)
+
+        changed = [n for n, sig in current.items() if self._file_sig.get(n) != sig]
+        removed = [n for n in self._file_sig if n not in current]
+        contents: Dict[str, str] = {}
+        for name in changed:
+            try:
+                contents[name] = (self.root / name).read_text(encoding="utf-8", errors="ignore")
+            except Exception:
+                contents[name] = ""
+
+        with self._lock:
+            for name in changed + removed:
+                if name in self._file_docs:
+                    self._remove_file(name)
+                self._file_sig.pop(name, None)
+            for name in changed:
+                self._add_file(name, contents[name])
+                self._file_sig[name] = current[name]
+            self._checked_at = time.monotonic()
+            if changed or removed:
+                self.stats["refreshes"] += 1
+                self.stats["files_indexed"] = len(self._file_docs)
+        return len(changed) + len(removed)
+
+    def search(self, query: str, limit: int) -> List[Tuple[float, str]]:
+        """Top ``limit`` (score, snippet) pairs for a query"""
+        stale = time.monotonic() - self._checked_at >= self.check_interval_s
+        if stale and not self._refresh_lock.locked():
+            self.refresh()
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+            scores: Dict[int, float] = {}
+            for term in terms:
+                docs = self._postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+            return [(score, self._snippets[doc_id]) for doc_id, score in top]
+
+
+support_index = SupportIndex()
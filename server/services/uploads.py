@@ -0,0 +1,125 @@
+"""
+Streaming ingestion of multipart uploads.
+
+Handlers used to call ``file.read()`` and write the bytes synchronously, so a
+large upload sat in memory and the disk write blocked the event loop. Uploads
+are now copied in ``UPLOAD_CHUNK_SIZE`` pieces: each chunk is hashed
+(SHA-256) as it arrives and written from a worker thread, so memory stays
+constant regardless of file size.
+
+- Limits: ``MAX_UPLOAD_FILE_BYTES`` per file and ``MAX_UPLOAD_REQUEST_BYTES``
+  across all files of one request (``UploadBudget``) are checked after every
+  chunk; the copy stops as soon as one is exceeded (``UploadTooLarge``).
+- Storage: ``store_content_addressed`` writes to a temporary file and renames
+  it to ``<dir>/<sha256[:2]>/<sha256><suffix>``. Files with the same name no
+  longer overwrite each other, and identical content is stored once.
+
+Starlette has already spooled the request body to a temporary file by the
+time a handler runs; a hard cap on the raw body belongs in the reverse proxy.
+"""
+
+import asyncio
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+MAX_UPLOAD_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_BYTES", str(25 * 1024 * 1024)))
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """Raised mid-stream when a file or request exceeds its size limit"""
+
+    def __init__(self, message: str, limit: int):
+        super().__init__(message)
+        self.limit = limit
+
+
+class UploadBudget:
+    """Bytes still allowed for one request, shared by all of its files"""
+
+    def __init__(self, max_request_bytes: int = MAX_UPLOAD_REQUEST_BYTES,
+                 max_file_bytes: int = MAX_UPLOAD_FILE_BYTES):
+        self.max_request_bytes = max_request_bytes
+        self.max_file_bytes = max_file_bytes
+        self.used = 0
+
+    def consume(self, filename: str, file_bytes: int, n: int) -> None:
+        self.used += n
+        if file_bytes > self.max_file_bytes:
+            raise UploadTooLarge(
+                f"{filename} exceeds the {self.max_file_bytes} byte per-file limit", self.max_file_bytes
+            )
+        if self.used > self.max_request_bytes:
+            raise UploadTooLarge(
+                f"Upload exceeds the {self.max_request_bytes} byte per-request limit", self.max_request_bytes
+            )
+
+
+async def iter_upload(file, budget: Optional[UploadBudget] = None,
+                      chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield an UploadFile's bytes chunk by chunk, enforcing the budget"""
+    budget = budget or UploadBudget()
+    await file.seek(0)
+    size = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        budget.consume(file.filename or "upload", size, len(chunk))
+        yield chunk
+
+
+def _safe_suffix(filename: str) -> str:
+    suffix = Path(filename or "").suffix.lower()
+    return suffix if suffix[1:].isalnum() and len(suffix) <= 10 else ""
+
+
+async def store_content_addressed(file, directory: Path, budget: Optional[UploadBudget] = None) -> Dict[str, Any]:
+    """Stream an upload to ``directory`` under its SHA-256 and describe the result.
+
+    Returns ``{filename, content_type, sha256, size, path, created}``;
+    ``created`` is False when identical content was already stored.
+    """
+    directory = Path(directory)
+    incoming = directory / ".incoming"
+    await asyncio.to_thread(incoming.mkdir, parents=True, exist_ok=True)
+    tmp = incoming / f"{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+    f = await asyncio.to_thread(open, tmp, "wb")
+    try:
+        async for chunk in iter_upload(file, budget):
+            digest.update(chunk)
+            size += len(chunk)
+            await asyncio.to_thread(f.write, chunk)
+        await asyncio.to_thread(f.close)
+        sha = digest.hexdigest()
+        path = directory / sha[:2] / f"{sha}{_safe_suffix(file.filename)}"
+        created = await asyncio.to_thread(_commit, tmp, path)
+    except BaseException:
+        f.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    return {
+        "filename": file.filename,
+        "content_type": file.content_type,
+        "sha256": sha,
+        "size": size,
+        "path": path,
+        "created": created,
+    }
+
+
+def _commit(tmp: Path, path: Path) -> bool:
+    if path.exists():
+        # Same content already stored: keep the existing copy
+        tmp.unlink()
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, path)
+    return True
@@ -0,0 +1,285 @@
+"""
+Document verification as background jobs (see services/jobs.py).
+
+- ``verify_document``: ``POST /analyst/applications/{id}/verify-document``
+  enqueues one job per application. Every document of the application is
+  extracted concurrently in the CPU pool, so the job takes about as long as
+  its slowest document. Extractions are cached by content hash
+  (services/extraction_cache.py): re-verifying unchanged documents only
+  redoes the cross-check against the current form data. The per-document
+  results are merged into one verdict and confidence score
+  (``DocumentVerificationService.aggregate_verification_results``), stored
+  as ``verification_data`` and audited. The job result carries the same
+  fields the endpoint used to return inline (``extracted_info`` is now a
+  list, one entry per document).
+- ``verification_sweep``: ``POST /analyst/verification-sweep`` verifies every
+  application matching a filter (by default submitted and not yet verified).
+  Applications are processed in batches of ``VERIFICATION_SWEEP_BATCH_SIZE``:
+  documents are looked up with one ``$in`` query, contents fetched
+  concurrently, every document fanned out across the CPU pool and the results
+  written with one ``bulk_write`` per batch. Rows verified meanwhile by
+  another job are left alone, and only the rows this attempt stored (tagged
+  with ``verification_data.job_id``) are audited and counted. Progress and
+  throughput are published on the job after each batch.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from config.async_db import applications_collection, documents_collection
+from services.application_service import DOCUMENT_METADATA_PROJECTION, ApplicationService
+from services.audit_writer import audit_writer
+from services.document_verification import DocumentVerificationService
+from services.extraction_cache import extraction_cache
+from services.jobs import PermanentJobError, job_runner
+
+VERIFY_DOCUMENT_JOB = "verify_document"
+VERIFICATION_SWEEP_JOB = "verification_sweep"
+VERIFICATION_SWEEP_BATCH_SIZE = int(os.getenv("VERIFICATION_SWEEP_BATCH_SIZE", "200"))
+# Concurrent blob reads while a sweep batch loads document contents
+VERIFICATION_SWEEP_FETCH_CONCURRENCY = 16
+
+MOCK_CONTENT = b"Mock document content for testing purposes"
+
+
+async def _document_content(document: Dict[str, Any]) -> bytes:
+    """Document bytes (blob store or legacy inline storage), mock content if none"""
+    file_content = await ApplicationService.get_document_content(document)
+    if not file_content:
+        print(f"Warning: No retrievable content for document {document.get('_id')}, using mock content")
+        return MOCK_CONTENT
+    return file_content
+
+
+async def extract_document(document: Dict[str, Any],
+                           fetch: Callable[[Dict[str, Any]], Awaitable[bytes]]) -> Dict[str, Any]:
+    """Extracted info of one document, from the extraction cache when possible.
+
+    Documents stored with a ``sha256`` are looked up before their content is
+    even read; legacy documents are hashed after the fetch. Misses run the
+    extractor in the CPU pool and are cached.
+    """
+    filename, content_type = document["filename"], document["content_type"]
+    sha256 = document.get("sha256")
+    if sha256:
+        cached = await extraction_cache.get(sha256, filename, content_type)
+        if cached is not None:
+            return cached
+    content = await fetch(document)
+    if content == MOCK_CONTENT:
+        # Placeholder for missing content: never cache it
+        return await job_runner.run_cpu(DocumentVerificationService.extract_document_info,
+                                        content, filename, content_type)
+    if not sha256:
+        sha256 = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+        cached = await extraction_cache.get(sha256, filename, content_type)
+        if cached is not None:
+            return cached
+    extracted_info = await job_runner.run_cpu(DocumentVerificationService.extract_document_info,
+                                              content, filename, content_type)
+    await extraction_cache.put(sha256, filename, content_type, extracted_info)
+    return extracted_info
+
+
+async def verify_application_documents(application_data: Dict[str, Any], documents: List[Dict[str, Any]],
+                                      fetch: Optional[Callable[[Dict[str, Any]], Awaitable[bytes]]] = None
+                                      ) -> Tuple[List[Dict[str, Any]], Dict[str, Any], str]:
+    """Verify all documents concurrently; returns (extracted infos, merged results, summary)"""
+    fetch = fetch or _document_content
+    extractions = await asyncio.gather(*(extract_document(document, fetch) for document in documents),
+                                       return_exceptions=True)
+    entries = []
+    for document, extracted_info in zip(documents, extractions):
+        entry = {"document_id": document.get("id"), "filename": document.get("filename")}
+        try:
+            if isinstance(extracted_info, BaseException):
+                raise extracted_info
+            # Cross-checking is cheap and depends on the current form data: always redone
+            entry["verification_results"] = DocumentVerificationService.cross_check_information(
+                application_data, extracted_info
+            )
+            entry["extracted_info"] = extracted_info
+        except Exception as e:
+            print(f"❌ Could not verify document {entry['document_id']}: {e}")
+            entry["error"] = str(e) or e.__class__.__name__
+        entries.append(entry)
+    verification_results = DocumentVerificationService.aggregate_verification_results(entries)
+    verification_summary = DocumentVerificationService.generate_verification_summary(verification_results)
+    extracted_info = [entry["extracted_info"] for entry in entries if "extracted_info" in entry]
+    return extracted_info, verification_results, verification_summary
+
+
+def _verification_set(verification: Tuple[List[Dict[str, Any]], Dict[str, Any], str], actor_id: str,
+                      now: datetime, job_id: str) -> Dict[str, Any]:
+    extracted_info, verification_results, verification_summary = verification
+    return {
+        "verification_data": {
+            "extracted_info": extracted_info,
+            "verification_results": verification_results,
+            "verification_summary": verification_summary,
+            "verified_by": actor_id,
+            "verified_at": now,
+            "job_id": job_id
+        },
+        "updated_at": now
+    }
+
+
+def _audit_event(application_id: str, actor_id: str, overall_status: str, now: datetime,
+                 via: str = "") -> Dict[str, Any]:
+    return {
+        "id": f"AUDIT-{str(uuid.uuid4())[:8].upper()}",
+        "application_id": application_id,
+        "action": "document_verified",
+        "actor_role": "analyst",
+        "actor_id": actor_id,
+        "details": f"Document verification completed{via}. Status: {overall_status}",
+        "created_at": now
+    }
+
+
+async def run_verify_document(payload: Dict[str, Any], job: Dict[str, Any]) -> Dict[str, Any]:
+    application_id = payload["application_id"]
+    actor_id = payload.get("actor_id") or job.get("created_by")
+
+    application = await applications_collection.find_one({"id": application_id})
+    if not application:
+        raise PermanentJobError("Application not found")
+    if payload.get("document_id"):
+        document = await ApplicationService.get_document_metadata(application_id, payload["document_id"])
+        documents = [document] if document else []
+    else:
+        documents = await ApplicationService.list_document_metadata(application_id)
+    if not documents:
+        raise PermanentJobError("No document found for verification")
+    documents.sort(key=lambda d: d.get("uploaded_at") or datetime.min)
+
+    verification = await verify_application_documents(application["data"], documents)
+    extracted_info, verification_results, verification_summary = verification
+
+    now = datetime.now()
+    await applications_collection.update_one(
+        {"id": application_id}, {"$set": _verification_set(verification, actor_id, now, job["id"])}
+    )
+    await audit_writer.write(_audit_event(application_id, actor_id, verification_results["overall_status"], now))
+
+    return {
+        "application_id": application_id,
+        "document_ids": [document.get("id") for document in documents],
+        "extracted_info": extracted_info,
+        "verification_results": verification_results,
+        "verification_summary": verification_summary
+    }
+
+
+def sweep_filter(statuses: List[str], unverified_only: bool = True) -> Dict[str, Any]:
+    """Applications selected by a verification sweep"""
+    query: Dict[str, Any] = {"status": {"$in": list(statuses)}}
+    if unverified_only:
+        query["verification_data"] = {"$exists": False}
+    return query
+
+
+async def _documents_by_application(application_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """All documents per application (oldest first), one query for the whole batch"""
+    documents = await documents_collection.find(
+        {"application_id": {"$in": application_ids}}, DOCUMENT_METADATA_PROJECTION
+    ).to_list(length=None)
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for document in documents:
+        grouped.setdefault(document["application_id"], []).append(document)
+    for docs in grouped.values():
+        docs.sort(key=lambda d: d.get("uploaded_at") or datetime.min)
+    return grouped
+
+
+async def run_verification_sweep(payload: Dict[str, Any], job: Dict[str, Any]) -> Dict[str, Any]:
+    actor_id = payload.get("actor_id") or job.get("created_by")
+    unverified_only = payload.get("unverified_only", True)
+    query = sweep_filter(payload.get("statuses") or ["submitted"], unverified_only)
+    limit: Optional[int] = payload.get("limit")
+    batch_size = max(1, int(payload.get("batch_size") or VERIFICATION_SWEEP_BATCH_SIZE))
+
+    # Snapshot the matching ids up front: results change the filter as we go
+    cursor = applications_collection.find(query, {"_id": 1})
+    if limit:
+        cursor = cursor.limit(limit)
+    oids = [doc["_id"] for doc in await cursor.to_list(length=limit)]
+
+    started = time.perf_counter()
+    counts = {"total": len(oids), "processed": 0, "verified": 0, "no_document": 0, "failed": 0}
+    statuses: Dict[str, int] = {}
+    fetch_limit = asyncio.Semaphore(VERIFICATION_SWEEP_FETCH_CONCURRENCY)
+
+    async def fetch(document: Dict[str, Any]) -> bytes:
+        async with fetch_limit:
+            return await _document_content(document)
+
+    async def progress() -> Dict[str, Any]:
+        elapsed = time.perf_counter() - started
+        report = {**counts, "elapsed_s": round(elapsed, 2),
+                  "per_second": round(counts["processed"] / elapsed, 1) if elapsed else 0.0}
+        await job_runner.report_progress(job, report)
+        return report
+
+    await progress()
+    for offset in range(0, len(oids), batch_size):
+        applications = await applications_collection.find(
+            {"_id": {"$in": oids[offset:offset + batch_size]}}, {"_id": 1, "id": 1, "data": 1}
+        ).to_list(length=None)
+        grouped = await _documents_by_application([app["id"] for app in applications])
+        todo = [(app, grouped[app["id"]]) for app in applications if app["id"] in grouped]
+        counts["no_document"] += len(applications) - len(todo)
+
+        verifications = await asyncio.gather(
+            *(verify_application_documents(app.get("data") or {}, documents, fetch) for app, documents in todo),
+            return_exceptions=True,
+        )
+
+        # BSON dates keep milliseconds: truncate so the re-read below matches the stored value
+        now = datetime.now()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        ops = []
+        written: Dict[Any, Tuple[str, str]] = {}
+        for (app, _), verification in zip(todo, verifications):
+            if isinstance(verification, BaseException):
+                counts["failed"] += 1
+                print(f"❌ Sweep could not verify {app['id']}: {verification}")
+                continue
+            target = {"_id": app["_id"]}
+            if unverified_only:
+                # Never overwrite a verification recorded meanwhile (single job or another sweep)
+                target["verification_data"] = {"$exists": False}
+            ops.append(UpdateOne(target, {"$set": _verification_set(verification, actor_id, now, job["id"])}))
+            written[app["_id"]] = (app["id"], verification[1]["overall_status"])
+        if ops:
+            await applications_collection.bulk_write(ops, ordered=False)
+            # The guard may have skipped rows: report only what this attempt stored
+            applied = await applications_collection.find(
+                {"_id": {"$in": list(written)}, "verification_data.job_id": job["id"],
+                 "verification_data.verified_at": now},
+                {"_id": 1},
+            ).to_list(length=None)
+            for doc in applied:
+                application_id, overall = written[doc["_id"]]
+                statuses[overall] = statuses.get(overall, 0) + 1
+                await audit_writer.write(_audit_event(application_id, actor_id, overall, now, via=" (bulk sweep)"))
+            counts["verified"] += len(applied)
+
+        counts["processed"] += len(applications)
+        report = await progress()
+        print(f"🧾 Verification sweep {job['id']}: {counts['processed']}/{counts['total']} "
+              f"({report['per_second']}/s)")
+
+    return {**(await progress()), "status_counts": statuses}
+
+
+job_runner.register(VERIFY_DOCUMENT_JOB, run_verify_document)
+job_runner.register(VERIFICATION_SWEEP_JOB, run_verification_sweep)
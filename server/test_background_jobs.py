@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Concurrency checks for the job runner, the audit writer and the in-memory engine
+
+Runs against the in-process MongoDB engine (USE_MOCK_DB=1), no server needed:
+
+    python test_background_jobs.py      (or: python -m pytest test_background_jobs.py)
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+# Never point these checks at a real database
+os.environ["USE_MOCK_DB"] = "1"
+os.environ.setdefault("JOB_CPU_POOL", "thread")
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from config.async_db import db, jobs_collection
+from services import counters
+from services.audit_writer import AuditWriter
+from services.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobRunner, PermanentJobError
+
+
+async def _fresh_runner(**kwargs) -> JobRunner:
+    """Runner without background workers over an empty jobs collection"""
+    await jobs_collection.delete_many({})
+    await jobs_collection.create_index([("idempotency_key", ASCENDING)], unique=True, sparse=True)
+    runner = JobRunner(workers=0, **kwargs)
+    return runner
+
+
+async def _expire_lease(job_id: str) -> None:
+    await jobs_collection.update_one({"id": job_id},
+                                     {"$set": {"lease_until": datetime.now() - timedelta(seconds=1)}})
+
+
+def test_reclaim_respects_max_attempts():
+    """An expired lease is reclaimed only while attempts remain, then the job fails"""
+    async def check():
+        runner = await _fresh_runner()
+        runner.register("noop", lambda payload, job: asyncio.sleep(0))
+
+        job = await runner.enqueue("noop", {}, max_attempts=2)
+        first = await runner._claim()
+        assert first["attempts"] == 1
+        await _expire_lease(job["id"])
+        second = await runner._claim()
+        assert second is not None and second["attempts"] == 2
+        await _expire_lease(job["id"])
+        assert await runner._claim() is None
+        stored = await runner.get(job["id"])
+        assert stored["status"] == FAILED and stored["error"] == "lease expired"
+        assert stored["attempts"] == 2
+
+        # max_attempts=1 means a crashed worker's job is never run again
+        once = await runner.enqueue("noop", {}, max_attempts=1)
+        await runner._claim()
+        await _expire_lease(once["id"])
+        assert await runner._claim() is None
+        assert (await runner.get(once["id"]))["status"] == FAILED
+    asyncio.run(check())
+
+
+def test_lost_lease_outcome_is_fenced():
+    """A worker whose job was reclaimed cannot overwrite the new attempt"""
+    async def check():
+        runner = await _fresh_runner(lease_s=60)
+        release = asyncio.Event()
+
+        async def slow(payload, job):
+            await release.wait()
+            await runner.report_progress(job, {"from_attempt": job["attempts"]})
+            return {"from_attempt": job["attempts"]}
+        runner.register("slow", slow)
+
+        job = await runner.enqueue("slow", {})
+        stale = await runner._claim()
+        running = asyncio.create_task(runner.run_job(stale))
+        await asyncio.sleep(0)
+        await _expire_lease(job["id"])
+        current = await runner._claim()
+        assert current["attempts"] == 2
+
+        release.set()
+        await running
+        stored = await runner.get(job["id"])
+        assert stored["status"] == RUNNING and stored["attempts"] == 2
+        assert stored.get("result") is None and stored.get("progress") is None
+        assert runner.stats["succeeded"] == 0
+    asyncio.run(check())
+
+
+def test_lost_lease_cancels_handler():
+    """Lease renewal stops the handler once another attempt holds the job"""
+    async def check():
+        runner = await _fresh_runner(lease_s=0.3)
+        runner.register("forever", lambda payload, job: asyncio.sleep(30))
+
+        job = await runner.enqueue("forever", {})
+        claimed = await runner._claim()
+        await jobs_collection.update_one({"id": job["id"]}, {"$inc": {"attempts": 1}})
+        await asyncio.wait_for(runner.run_job(claimed), timeout=5)
+        assert (await runner.get(job["id"]))["status"] == RUNNING
+    asyncio.run(check())
+
+
+def test_failure_backs_off_then_succeeds():
+    """A transient failure re-queues the job with a delay; the next attempt succeeds"""
+    async def check():
+        runner = await _fresh_runner()
+        calls = []
+
+        async def flaky(payload, job):
+            calls.append(job["attempts"])
+            if len(calls) == 1:
+                raise RuntimeError("transient")
+            return {"ok": True}
+        runner.register("flaky", flaky)
+
+        job = await runner.enqueue("flaky", {}, max_attempts=3)
+        await runner.run_job(await runner._claim())
+        stored = await runner.get(job["id"])
+        assert stored["status"] == QUEUED and stored["error"] == "transient"
+        assert stored["run_after"] > datetime.now()
+        assert await runner._claim() is None
+
+        await jobs_collection.update_one({"id": job["id"]}, {"$set": {"run_after": datetime.now()}})
+        await runner.run_job(await runner._claim())
+        stored = await runner.get(job["id"])
+        assert stored["status"] == SUCCEEDED and stored["result"] == {"ok": True}
+        assert calls == [1, 2]
+    asyncio.run(check())
+
+
+def test_idempotency_key_retired_after_failure():
+    """Resubmitting after a failure starts a new job; otherwise the same job is returned"""
+    async def check():
+        runner = await _fresh_runner()
+        outcomes = [PermanentJobError("boom"), None]
+
+        async def once_broken(payload, job):
+            outcome = outcomes.pop(0)
+            if outcome is not None:
+                raise outcome
+            return {"ok": True}
+        runner.register("once_broken", once_broken)
+
+        failed = await runner.enqueue("once_broken", {}, idempotency_key="k")
+        assert (await runner.enqueue("once_broken", {}, idempotency_key="k"))["id"] == failed["id"]
+        await runner.run_job(await runner._claim())
+        assert (await runner.get(failed["id"]))["status"] == FAILED
+
+        retry = await runner.enqueue("once_broken", {}, idempotency_key="k")
+        assert retry["id"] != failed["id"]
+        assert (await runner.get(failed["id"]))["retired_idempotency_key"] == "k"
+        await runner.run_job(await runner._claim())
+        assert (await runner.enqueue("once_broken", {}, idempotency_key="k"))["id"] == retry["id"]
+    asyncio.run(check())
+
+
+class _SlowCollection:
+    """Audit collection whose insert_many takes a while"""
+
+    def __init__(self):
+        self.docs = []
+
+    async def insert_many(self, batch, ordered=False):
+        await asyncio.sleep(0.2)
+        self.docs.extend(batch)
+
+    async def insert_one(self, event):
+        self.docs.append(event)
+
+
+def test_flush_waits_for_in_flight_batch():
+    """flush() returns only after the batch the flusher already popped is written"""
+    async def check():
+        collection = _SlowCollection()
+        writer = AuditWriter(collection, mode="async", batch_size=10, flush_interval_ms=10)
+        writer.start()
+        try:
+            await writer.write({"action": "submitted"})
+            await asyncio.sleep(0.05)
+            assert writer.pending == 0 and not collection.docs
+            await writer.flush()
+            assert len(collection.docs) == 1
+        finally:
+            await writer.stop()
+    audit_events_added = counters.audit_events_added
+    counters.audit_events_added = lambda count=1: asyncio.sleep(0)
+    try:
+        asyncio.run(check())
+    finally:
+        counters.audit_events_added = audit_events_added
+
+
+def test_memory_db_unique_sparse_and_expr():
+    """Sparse unique indexes ignore missing keys; $expr compares fields"""
+    async def check():
+        collection = db["engine_checks"]
+        await collection.delete_many({})
+        await collection.create_index([("key", ASCENDING)], unique=True, sparse=True)
+        await collection.insert_many([{"n": 1, "limit": 2}, {"n": 2, "limit": 2}, {"key": "a", "n": 3, "limit": 1}])
+        try:
+            await collection.insert_one({"key": "a"})
+            raise AssertionError("duplicate key accepted")
+        except DuplicateKeyError:
+            pass
+        below = await collection.find({"$expr": {"$lt": ["$n", "$limit"]}}).to_list(length=None)
+        assert [doc["n"] for doc in below] == [1]
+    asyncio.run(check())
+
+
+def main():
+    """Run all checks"""
+    print("🧪 Background job, audit writer and engine checks")
+    print("=" * 50)
+    failures = 0
+    for name, check in list(globals().items()):
+        if not name.startswith("test_") or not callable(check):
+            continue
+        try:
+            check()
+            print(f"✅ {name}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {name}: {e!r}")
+    print("=" * 50)
+    print("🎉 All checks passed" if not failures else f"❌ {failures} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())